@@ -4,10 +4,80 @@ Kiro Automation Agent Status Dashboard
 Shows real-time status of the automation agent
 """
 
+import argparse
+import asyncio
 import json
+import socket
+import sys
 import time
 import os
+from collections import OrderedDict, deque
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+CONTROL_SOCKET = os.environ.get('KIRO_AGENT_CONTROL_SOCKET') or ".kiro/automation/agent.sock"
+SPEC_PATH = ".kiro/specs/ai-powered-integrations/tasks.md"
+
+def _rpc(method: str, request_id: int, params: Optional[Dict] = None) -> bytes:
+    message = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+    return json.dumps(message).encode('utf-8') + b'\n'
+
+def _tool_result(response: Dict) -> Dict:
+    """Decode the JSON text of a tools/call response"""
+    return json.loads(response["result"]["content"][0]["text"])
+
+def query_agent_status(socket_path: str = CONTROL_SOCKET, timeout: float = 2.0) -> Optional[Dict]:
+    """get_status from a running agent over its control socket, or None if no agent is listening"""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(_rpc("tools/call", 1, {"name": "get_status", "arguments": {}}))
+            data = b''
+            while not data.endswith(b'\n'):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    return None
+                data += chunk
+        return _tool_result(json.loads(data)).get("data")
+    except (OSError, ValueError, KeyError):
+        return None
+
+def progress_bar(percentage: float, bar_length: int = 30) -> str:
+    filled_length = int(bar_length * percentage / 100)
+    return '█' * filled_length + '░' * (bar_length - filled_length)
+
+def show_spec_counts(spec_path: str):
+    """Count checkboxes in the spec file (used when no agent is running)"""
+    if os.path.exists(spec_path):
+        print("✅ Spec File: FOUND")
+        
+        try:
+            with open(spec_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            # Count tasks
+            completed_tasks = content.count('- [x]')
+            pending_tasks = content.count('- [ ]')
+            total_tasks = completed_tasks + pending_tasks
+            
+            print(f"📊 Total Tasks: {total_tasks}")
+            print(f"✅ Completed: {completed_tasks}")
+            print(f"⏳ Pending: {pending_tasks}")
+            
+            if total_tasks > 0:
+                completion_rate = (completed_tasks / total_tasks) * 100
+                print(f"📈 Progress: {completion_rate:.1f}%")
+                
+                # Progress bar
+                print(f"📊 [{progress_bar(completion_rate)}] {completion_rate:.1f}%")
+            
+        except Exception as e:
+            print(f"❌ Error reading spec file: {e}")
+    else:
+        print("❌ Spec File: NOT FOUND")
 
 def show_status_dashboard():
     """Display a real-time status dashboard"""
@@ -40,38 +110,27 @@ def show_status_dashboard():
     
     print()
     
-    # Check if spec files exist
-    spec_path = ".kiro/specs/ai-powered-integrations/tasks.md"
-    if os.path.exists(spec_path):
-        print("✅ Spec File: FOUND")
-        
-        try:
-            with open(spec_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Count tasks
-            total_tasks = content.count('- [ ]') + content.count('- [x]')
-            completed_tasks = content.count('- [x]')
-            pending_tasks = content.count('- [ ]')
-            
-            print(f"📊 Total Tasks: {total_tasks}")
-            print(f"✅ Completed: {completed_tasks}")
-            print(f"⏳ Pending: {pending_tasks}")
-            
-            if total_tasks > 0:
-                completion_rate = (completed_tasks / total_tasks) * 100
-                print(f"📈 Progress: {completion_rate:.1f}%")
-                
-                # Progress bar
-                bar_length = 30
-                filled_length = int(bar_length * completion_rate / 100)
-                bar = '█' * filled_length + '░' * (bar_length - filled_length)
-                print(f"📊 [{bar}] {completion_rate:.1f}%")
-            
-        except Exception as e:
-            print(f"❌ Error reading spec file: {e}")
+    # Ask a running agent first; it knows about in-progress work the file can't show
+    live = query_agent_status()
+    if live is not None:
+        print(f"🟢 Agent: {'RUNNING' if live.get('running') else 'IDLE'} (control socket {CONTROL_SOCKET})")
+        print(f"📊 Total Tasks: {live['total_tasks']}")
+        print(f"✅ Completed: {live['completed_tasks']}")
+        print(f"🔄 In Progress: {live['in_progress_tasks']}")
+        print(f"⏳ Pending: {live['pending_tasks']}")
+        print(f"❌ Failed: {live['failed_tasks']}")
+        print(f"📈 Progress: {live['completion_percentage']:.1f}%")
+        print(f"📊 [{progress_bar(live['completion_percentage'])}] {live['completion_percentage']:.1f}%")
+        sections = live.get('sections') or []
+        if sections:
+            print(f"📂 Sections ({live.get('section_count', len(sections))}):")
+            for section in sections[:10]:
+                print(f"   [{progress_bar(section['completion_percentage'], 20)}] "
+                      f"{section['completion_percentage']:5.1f}%  {section['name']}")
+        print("👀 Watch live: python automation-status.py --watch")
     else:
-        print("❌ Spec File: NOT FOUND")
+        print("⚪ Agent: NOT RUNNING (no control socket)")
+        show_spec_counts(SPEC_PATH)
     
     print()
     
@@ -93,15 +152,203 @@ def show_status_dashboard():
     print("  • Test connection: python test-mcp-connection.py")
     print("  • Run standalone: python kiro-automation-agent.py --standalone")
     print("  • Test agent: python kiro-automation-agent.py --test")
+    print("  • Watch live: python automation-status.py --watch")
     print()
     print("📋 MCP Tools Available:")
     print("  • start_continuous_execution - Start automation")
     print("  • stop_execution - Stop automation")
+    print("  • list_sessions / stop_session - See or stop one run")
     print("  • get_status - Get current status")
     print("  • execute_single_task - Run one task")
     print("  • connection_health_check - Test connection")
     print()
     print(f"🕒 Status checked at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+class LiveStatus:
+    """Dashboard's copy of the agent state, kept current from taskState deltas"""
+
+    RECENT = 10
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.connected = False
+        self.running = False
+        self.spec_path: Optional[str] = None
+        self.max_workers = 1
+        self.counts: Dict[str, int] = {}
+        self.in_progress: 'OrderedDict[str, str]' = OrderedDict()  # task_id -> name
+        self.recent: deque = deque(maxlen=self.RECENT)
+        self.changed_at: Optional[datetime] = None
+        self.dirty = True
+
+    def load_status(self, status: Dict):
+        """Start from a full get_status snapshot"""
+        self.running = status.get('running', False)
+        self.spec_path = status.get('spec_path')
+        self.max_workers = status.get('max_workers', 1)
+        self.counts = {
+            'completed': status.get('completed_tasks', 0),
+            'in_progress': status.get('in_progress_tasks', 0),
+            'not_started': status.get('pending_tasks', 0),
+            'failed': status.get('failed_tasks', 0)
+        }
+        self.in_progress.clear()
+        for worker in status.get('workers', []):
+            if worker.get('current_task'):
+                self.in_progress[worker['current_task']] = worker['current_task']
+        self.touch()
+
+    def apply(self, params: Dict):
+        """Apply one notifications/kiro/taskState batch"""
+        if 'counts' in params:
+            self.counts = params['counts']
+        if 'running' in params:
+            self.running = params['running']
+        for change in params.get('changes', []):
+            name = change.get('name', change['task_id'])
+            if change['status'] == 'in_progress':
+                self.in_progress[change['task_id']] = name
+            else:
+                self.in_progress.pop(change['task_id'], None)
+            stamp = change.get('timestamp', '')[11:19]
+            self.recent.appendleft(f"{stamp} {change.get('event', change['status']):<9} {name}")
+        self.touch()
+
+    def touch(self):
+        self.changed_at = datetime.now()
+        self.dirty = True
+
+    def render(self, width: int) -> List[str]:
+        """Screen lines; the layout has a fixed height so unchanged rows stay put"""
+        total = sum(self.counts.values())
+        completed = self.counts.get('completed', 0)
+        percentage = completed / total * 100 if total else 0.0
+        if not self.connected:
+            state = f"⚪ Agent: NOT CONNECTED (waiting for {self.socket_path})"
+        else:
+            state = f"{'🟢' if self.running else '🟡'} Agent: {'RUNNING' if self.running else 'IDLE'}"
+            if self.spec_path:
+                state += f"  📁 {self.spec_path}"
+        lines = [
+            "🚀 Kiro Automation Agent Live Status (Ctrl+C to quit)",
+            "=" * 60,
+            state,
+            f"📊 Total: {total}  ✅ Completed: {completed}  🔄 Running: {self.counts.get('in_progress', 0)}  "
+            f"⏳ Pending: {self.counts.get('not_started', 0)}  ❌ Failed: {self.counts.get('failed', 0)}",
+            f"📈 [{progress_bar(percentage)}] {percentage:.1f}%",
+            "",
+            f"🔄 In progress ({len(self.in_progress)}):"
+        ]
+        rows = max(1, min(self.max_workers, 10))
+        running = list(self.in_progress.values())[:rows]
+        lines += [f"   • {name}" for name in running] + [""] * (rows - len(running))
+        lines += ["", "📝 Recent changes:"]
+        lines += [f"   {entry}" for entry in self.recent] + [""] * (self.RECENT - len(self.recent))
+        lines += ["", f"🕒 Last change: {self.changed_at.strftime('%H:%M:%S') if self.changed_at else '-'}"]
+        return [line[:width] for line in lines]
+
+class LineRenderer:
+    """Rewrites only the terminal rows whose text changed since the last frame"""
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+        self.previous: List[str] = []
+
+    def start(self):
+        self.stream.write("\x1b[?25l\x1b[2J")  # hide cursor, clear screen
+        self.stream.flush()
+
+    def draw(self, lines: List[str]):
+        parts = []
+        for row, line in enumerate(lines):
+            if row >= len(self.previous) or self.previous[row] != line:
+                parts.append(f"\x1b[{row + 1};1H{line}\x1b[K")
+        for row in range(len(lines), len(self.previous)):
+            parts.append(f"\x1b[{row + 1};1H\x1b[K")
+        if parts:
+            self.stream.write(''.join(parts))
+            self.stream.flush()
+        self.previous = lines
+
+    def stop(self):
+        self.stream.write(f"\x1b[{len(self.previous) + 1};1H\x1b[?25h\n")
+        self.stream.flush()
+
+async def follow_agent(status: LiveStatus, interval: float):
+    """Subscribe to a running agent's state deltas until it disconnects"""
+    reader, writer = await asyncio.open_unix_connection(status.socket_path, limit=64 * 1024 * 1024)
+    try:
+        writer.write(_rpc("initialize", 1, {
+            "protocolVersion": "2024-11-05", "capabilities": {},
+            "clientInfo": {"name": "automation-status", "version": "1.0.0"}
+        }))
+        writer.write(_rpc("tools/call", 2, {"name": "get_status", "arguments": {}}))
+        writer.write(_rpc("tools/call", 3, {"name": "subscribe_notifications", "arguments": {
+            "progress_token": "automation-status", "max_rate": 1.0 / interval
+        }}))
+        await writer.drain()
+        status.connected = True
+        status.touch()
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("id") == 2 and "result" in message:
+                status.load_status(_tool_result(message).get("data", {}))
+            elif message.get("method") == "notifications/kiro/taskState":
+                status.apply(message.get("params", {}))
+    finally:
+        status.connected = False
+        status.touch()
+        writer.close()
+
+async def watch_status(socket_path: str, interval: float, reconnect: float = 2.0):
+    """Live dashboard: redraws changed lines at most once per interval, reconnecting as needed"""
+    status = LiveStatus(socket_path)
+    renderer = LineRenderer()
+
+    async def redraw():
+        while True:
+            if status.dirty:
+                status.dirty = False
+                renderer.draw(status.render(os.get_terminal_size().columns if sys.stdout.isatty() else 200))
+            await asyncio.sleep(interval)
+
+    renderer.start()
+    painter = asyncio.ensure_future(redraw())
+    try:
+        while True:
+            try:
+                await follow_agent(status, interval)
+            except (OSError, ConnectionError):
+                pass
+            await asyncio.sleep(reconnect)
+    finally:
+        painter.cancel()
+        renderer.stop()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Kiro Automation Agent status dashboard")
+    parser.add_argument('--watch', action='store_true',
+                        help='Follow a running agent live over its control socket')
+    parser.add_argument('--socket', default=CONTROL_SOCKET,
+                        help=f'Agent control socket (default {CONTROL_SOCKET}, env: KIRO_AGENT_CONTROL_SOCKET)')
+    parser.add_argument('--interval', type=float, default=0.5, help='Seconds between screen refreshes (default 0.5)')
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    show_status_dashboard()
\ No newline at end of file
+    args = parse_args()
+    if args.watch:
+        if not hasattr(socket, 'AF_UNIX'):
+            print("❌ --watch needs Unix domain sockets, which this platform does not support")
+            sys.exit(1)
+        try:
+            asyncio.run(watch_status(args.socket, max(0.05, args.interval)))
+        except KeyboardInterrupt:
+            pass
+    else:
+        show_status_dashboard()
\ No newline at end of file
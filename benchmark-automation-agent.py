@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Kiro Automation Agent Benchmarks
+Times spec parsing, scheduler dispatch and get_status on synthetic tasks.md files
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kiro-automation-agent.py")
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Results whose value goes up when things get worse; everything else is a rate
+LOWER_IS_BETTER = ('_seconds', '_us', '_bytes')
+
+def load_agent_module(path: str = AGENT_SCRIPT):
+    """Import kiro-automation-agent.py (its file name is not a valid module name)"""
+    spec = importlib.util.spec_from_file_location("kiro_automation_agent", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def generate_spec(path: str, count: int, max_depth: int = 3, nesting: float = 0.3,
+                  completed: float = 0.0, section_size: int = 200, seed: int = 0) -> Dict[str, Any]:
+    """Write a synthetic tasks.md with count checklist items
+
+    Each item is nested one level under the previous one with probability
+    nesting (up to max_depth levels), otherwise it returns to a random
+    shallower level. Nesting is what creates dependencies: a parent depends
+    on every item indented beneath it. A heading starts a new section every
+    section_size items, and a completed share of items is pre-ticked.
+    """
+    rng = random.Random(seed)
+    depth = 0
+    numbers: List[int] = []
+    nested = 0
+    deepest = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# Implementation Plan\n")
+        for i in range(count):
+            if i % section_size == 0:
+                f.write(f"\n## Section {i // section_size + 1}\n\n")
+                depth = 0
+                numbers = []
+            elif numbers and depth < max_depth and rng.random() < nesting:
+                depth += 1
+            elif depth > 0:
+                depth = rng.randint(0, depth - 1)
+
+            numbers = numbers[:depth + 1]
+            if len(numbers) <= depth:
+                numbers.append(0)
+            numbers[depth] += 1
+            nested += depth > 0
+            deepest = max(deepest, depth)
+
+            indent = "  " * depth
+            mark = 'x' if rng.random() < completed else ' '
+            label = '.'.join(map(str, numbers))
+            f.write(f"{indent}- [{mark}] {label} Synthetic task {i + 1}\n")
+            f.write(f"{indent}  - _Requirements: {rng.randint(1, 9)}.{rng.randint(1, 9)}_\n")
+    return {
+        'tasks': count,
+        'bytes': os.path.getsize(path),
+        'nested_tasks': nested,
+        'max_depth': deepest
+    }
+
+def make_agent(module, workers: int, task_store: str = 'dict'):
+    """Agent with every side effect (journal, history, result cache, write-back, watching, control socket) switched off"""
+    config = module.AgentConfig(
+        workers=workers,
+        task_store=task_store,
+        history_path=None,
+        cache_dir=None,
+        watch_spec=False,
+        write_back=False,
+        journal_dir=None,
+        control_socket=None,
+        executor='simulated'
+    )
+    agent = module.KiroAutomationAgent(config)
+
+    async def execute_kiro_task(task) -> bool:
+        return True
+
+    # Zero-latency stand-in so only the agent's own bookkeeping is measured
+    agent.execute_kiro_task = execute_kiro_task
+    return agent
+
+async def bench_load(module, spec_path: str, workers: int, task_store: str) -> Dict[str, Any]:
+    """Time load_tasks_from_spec and the scheduler index built on top of it"""
+    agent = make_agent(module, workers, task_store)
+    started = time.perf_counter()
+    tasks = await agent.load_tasks_from_spec(spec_path)
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    agent.scheduler.rebuild()
+    index_seconds = time.perf_counter() - started
+    return {
+        'load_seconds': load_seconds,
+        'load_tasks_per_second': len(tasks) / load_seconds if load_seconds else None,
+        'index_seconds': index_seconds
+    }
+
+async def bench_next_task(module, spec_path: str, workers: int, task_store: str) -> Dict[str, Any]:
+    """Claim and finish every task through get_next_task, without execute_task around it"""
+    agent = make_agent(module, workers, task_store)
+    await agent.load_tasks_from_spec(spec_path)
+    agent.scheduler.rebuild()
+    claimed = 0
+    started = time.perf_counter()
+    while True:
+        task_id = await agent.get_next_task()
+        if task_id is None:
+            break
+        agent._set_status(agent.tasks[task_id], 'completed')
+        agent.scheduler.task_finished(task_id, True)
+        claimed += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'next_task_claimed': claimed,
+        'next_task_seconds': elapsed,
+        'next_task_per_second': claimed / elapsed if elapsed else None
+    }
+
+async def bench_dispatch(module, spec_path: str, workers: int, task_store: str) -> Dict[str, Any]:
+    """Run the worker pool over the whole spec with zero-latency tasks"""
+    agent = make_agent(module, workers, task_store)
+    await agent.load_tasks_from_spec(spec_path)
+    agent.scheduler.rebuild()
+    pending = agent.scheduler.counts['not_started']
+    agent.running = True
+    agent.workers = {
+        worker_id: module.WorkerState(worker_id)
+        for worker_id in range(1, workers + 1)
+    }
+    started = time.perf_counter()
+    await asyncio.gather(*(agent.run_worker(worker) for worker in agent.workers.values()))
+    elapsed = time.perf_counter() - started
+    agent.running = False
+    executed = sum(w.tasks_completed for w in agent.workers.values())
+    return {
+        'dispatch_workers': workers,
+        'dispatch_pending': pending,
+        'dispatch_executed': executed,
+        'dispatch_seconds': elapsed,
+        'dispatch_tasks_per_second': executed / elapsed if elapsed else None
+    }
+
+async def bench_status(module, spec_path: str, workers: int, task_store: str, calls: int) -> Dict[str, Any]:
+    """Time get_status when nothing changed between calls, and right after a task finished"""
+    agent = make_agent(module, workers, task_store)
+    await agent.load_tasks_from_spec(spec_path)
+    agent.scheduler.rebuild()
+    agent.get_status()
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        agent.get_status()
+    unchanged = (time.perf_counter() - started) / calls
+
+    # Each finished task invalidates the cached critical path and remaining work
+    changed = 0.0
+    measured = 0
+    for _ in range(calls):
+        task_id = agent.scheduler.pop_ready()
+        if task_id is None:
+            break
+        agent._set_status(agent.tasks[task_id], 'completed')
+        agent.scheduler.task_finished(task_id, True)
+        started = time.perf_counter()
+        agent.get_status()
+        changed += time.perf_counter() - started
+        measured += 1
+    return {
+        'status_calls': calls,
+        'status_unchanged_us': unchanged * 1e6,
+        'status_after_change_us': changed / measured * 1e6 if measured else None
+    }
+
+async def best_of(repeat: int, key: str, bench: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Run a benchmark repeat times and keep the fastest run by key"""
+    best = None
+    for _ in range(max(1, repeat)):
+        result = await bench()
+        if best is None or (result[key] or 0) < (best[key] or 0):
+            best = result
+    return best
+
+async def bench_memory(module, spec_path: str, workers: int, task_store: str) -> Dict[str, Any]:
+    """Memory held by the task table and scheduler index after loading (traced, so run separately)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        agent = make_agent(module, workers, task_store)
+        await agent.load_tasks_from_spec(spec_path)
+        loaded = tracemalloc.get_traced_memory()[0]
+        agent.scheduler.rebuild()
+        indexed = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {
+        'tasks_memory_bytes': loaded - before,
+        'scheduler_memory_bytes': indexed - loaded
+    }
+
+def peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def file_sha1(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Describe every metric that is more than tolerance worse than in the baseline"""
+    previous = {run['tasks']: run for run in baseline.get('results', [])}
+    regressions = []
+    for run in results:
+        before = previous.get(run['tasks'])
+        if before is None:
+            continue
+        for key, value in run.items():
+            old = before.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if key.endswith(LOWER_IS_BETTER):
+                change = value / old - 1
+            elif key.endswith('_per_second'):
+                change = old / value - 1 if value else float('inf')
+            else:
+                continue
+            if change > tolerance:
+                regressions.append(f"{run['tasks']} tasks: {key} {old:.6g} -> {value:.6g} ({change:+.0%} worse)")
+    return regressions
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    module = load_agent_module(args.agent)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='kiro-bench-') as tmp_dir:
+        spec_dir = args.spec_dir or tmp_dir
+        for size in args.sizes:
+            spec_path = os.path.join(spec_dir, f"tasks-{size}.md")
+            print(f"📝 Generating {size} tasks...", file=sys.stderr)
+            run = generate_spec(spec_path, size, args.depth, args.nesting, args.completed,
+                                args.section_size, args.seed)
+            print(f"⏱️  Benchmarking {size} tasks...", file=sys.stderr)
+            store = args.task_store
+            run.update(await best_of(args.repeat, 'load_seconds',
+                                     lambda: bench_load(module, spec_path, args.workers, store)))
+            run.update(await best_of(args.repeat, 'next_task_seconds',
+                                     lambda: bench_next_task(module, spec_path, args.workers, store)))
+            run.update(await best_of(args.repeat, 'dispatch_seconds',
+                                     lambda: bench_dispatch(module, spec_path, args.workers, store)))
+            run.update(await best_of(args.repeat, 'status_after_change_us',
+                                     lambda: bench_status(module, spec_path, args.workers, store, args.status_calls)))
+            if args.memory:
+                run.update(await bench_memory(module, spec_path, args.workers, store))
+            run['peak_rss_bytes'] = peak_rss_bytes()
+            results.append(run)
+            print(
+                f"   load {run['load_seconds']:.3f}s ({run['load_tasks_per_second']:.0f} tasks/s), "
+                f"dispatch {run['dispatch_tasks_per_second']:.0f} tasks/s, "
+                f"get_status {run['status_after_change_us']:.0f} µs",
+                file=sys.stderr
+            )
+    return {
+        'version': 1,
+        'created_at': datetime.now().isoformat(),
+        'agent_sha1': file_sha1(args.agent),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'json_backend': module.JSON_BACKEND,
+        'parameters': {
+            'sizes': args.sizes,
+            'depth': args.depth,
+            'nesting': args.nesting,
+            'completed': args.completed,
+            'section_size': args.section_size,
+            'workers': args.workers,
+            'task_store': args.task_store,
+            'repeat': args.repeat,
+            'seed': args.seed
+        },
+        'results': results
+    }
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the Kiro Automation Agent on synthetic specs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Spec sizes (checklist items) to benchmark, e.g. 1000 100000 1000000')
+    parser.add_argument('--depth', type=int, default=3, help='Maximum nesting depth of subtasks (default 3)')
+    parser.add_argument('--nesting', type=float, default=0.3,
+                        help='Probability an item is nested under the previous one, i.e. dependency density (default 0.3)')
+    parser.add_argument('--completed', type=float, default=0.0, help='Share of items already ticked (default 0)')
+    parser.add_argument('--section-size', type=int, default=200, help='Items per ## section (default 200)')
+    parser.add_argument('--workers', type=int, default=4, help='Worker pool size for the dispatch benchmark (default 4)')
+    parser.add_argument('--task-store', choices=('dict', 'compact'), default='dict',
+                        help="Agent task table to benchmark (default dict)")
+    parser.add_argument('--memory', action='store_true',
+                        help='Also measure the memory held by the loaded tasks (slow: uses tracemalloc)')
+    parser.add_argument('--status-calls', type=int, default=200, help='get_status calls per measurement (default 200)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the fastest is kept (default 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the spec generator')
+    parser.add_argument('--spec-dir', help='Keep the generated specs in this directory')
+    parser.add_argument('--agent', default=AGENT_SCRIPT, help='Agent script to benchmark')
+    parser.add_argument('--output', '-o', help='Write the results as JSON to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Results JSON of a previous version to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Slowdown relative to the baseline reported as a regression (default 0.2 = 20%%)')
+    parser.add_argument('--verbose', action='store_true', help="Keep the agent's INFO logging (slows everything down)")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    report = asyncio.run(run_benchmarks(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report['results'], json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Regressions against the baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  • {line}", file=sys.stderr)
+            return 1
+        print("✅ No regressions against the baseline", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,72 +4,3177 @@ Kiro Automation Agent - Continuous Task Execution MCP Server
 This MCP server enables continuous task execution without stopping
 """
 
+import abc
+import argparse
 import asyncio
+import bisect
+import concurrent.futures
+import contextlib
+import cProfile
+import ctypes
+import ctypes.util
+import functools
+import glob
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import math
+import random
+import re
+import shlex
+import shutil
+import signal
+import socket
+import sqlite3
+import stat
+import struct
 import sys
+import tempfile
+import textwrap
+import threading
+import time
+import tracemalloc
+import uuid
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Collection, Dict, Iterator, List, Optional, Any, Set, Tuple
+from dataclasses import dataclass, asdict, field
 import os
 import subprocess
 
+try:
+    import orjson  # Optional faster JSON backend
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+JSON_BACKEND = 'orjson' if orjson is not None and os.environ.get('KIRO_MCP_JSON_BACKEND', 'auto') != 'json' else 'json'
+
+def encode_json(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (compact unless indent), using orjson when available"""
+    if JSON_BACKEND == 'orjson':
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def decode_json(data: Any) -> Any:
+    """Parse JSON text or bytes with the configured backend"""
+    if JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+DEFAULT_SPEC_PATH = ".kiro/specs/ai-powered-integrations/tasks.md"
+DEFAULT_SPECS_DIR = ".kiro/specs"
+DEFAULT_HISTORY_PATH = ".kiro/automation/durations.json"
+DEFAULT_JOURNAL_DIR = ".kiro/automation/journal"
+DEFAULT_PROFILE_DIR = ".kiro/automation/profile"
+DEFAULT_CONTROL_SOCKET = ".kiro/automation/agent.sock"
+DEFAULT_CLUSTER_DB = ".kiro/automation/cluster.db"
+DEFAULT_CACHE_DIR = ".kiro/automation/cache"
+RECOVERY_POLICIES = ('rerun', 'complete')
+DEFAULT_ESTIMATED_TIME = 30  # minutes, used until a task has run at least once
+SCHEDULE_MODES = ('priority', 'critical_path')
+TASK_STATUSES = ('not_started', 'in_progress', 'completed', 'failed')
+EXECUTORS = ('subprocess', 'simulated')
+TASK_STORES = ('dict', 'compact')
+CLUSTER_ROLES = ('coordinator', 'worker')
+
+def _env_flag(name: str, default: bool) -> bool:
+    """Read an on/off setting from the environment"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off')
+
+def _env_float(name: str, default: float) -> float:
+    """Read a numeric setting from the environment, falling back to the default"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}, using {default}")
+        return default
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment, falling back to the default"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}, using {default}")
+        return default
+
+def parse_spec_weights(value: str) -> Dict[str, float]:
+    """Parse "name=weight,name=weight" into fair-share weights per spec"""
+    weights = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if not name.strip():
+            continue
+        try:
+            weights[name.strip()] = max(0.01, float(weight))
+        except ValueError:
+            logger.warning(f"Ignoring invalid spec weight {item.strip()!r}")
+    return weights
+
+@dataclass
+class AgentConfig:
+    """Runtime settings for the automation agent (environment + CLI overrides)"""
+    workers: int = 1  # number of concurrent execute_task coroutines
+    retry_delay: float = 30.0  # seconds before a failed task's first retry; doubles per attempt
+    retry_max_delay: float = 600.0  # cap on the backoff between attempts
+    max_attempts: int = 3  # runs before a task is marked 'failed'
+    breaker_threshold: float = 0.5  # recent failure share that pauses dispatch; 0 disables
+    breaker_window: int = 20  # recent task runs the failure share is computed over
+    breaker_cooldown: float = 60.0  # seconds dispatch stays paused once the breaker trips
+    schedule: str = 'priority'  # 'priority' or 'critical_path'
+    spec_weights: Dict[str, float] = field(default_factory=dict)  # fair-share weight per spec name; default 1
+    cluster_role: Optional[str] = None  # 'coordinator' or 'worker' to share tasks through cluster_db; None runs alone
+    cluster_db: str = DEFAULT_CLUSTER_DB  # SQLite lease table shared by the cluster's processes
+    lease_seconds: float = 60.0  # a claimed task goes back to the cluster unless renewed within this time
+    cluster_poll_interval: float = 1.0  # seconds between claim attempts while nothing is ready
+    history_path: Optional[str] = DEFAULT_HISTORY_PATH  # learned durations; None disables
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR  # results of tasks with `inputs:`; None disables
+    cache_max_entries: int = 10000  # cached results kept, least recently used evicted first
+    cache_max_bytes: int = 64 * 1024 * 1024  # size cap on the cache index
+    watch_spec: bool = True  # reload the spec when it is edited during a run
+    watch_interval: float = 2.0  # seconds between checks when inotify is unavailable
+    write_back: bool = True  # tick checkboxes in the spec as tasks complete
+    flush_interval: float = 2.0  # max seconds a status change waits before being written
+    flush_batch: int = 50  # pending status changes that force an immediate write
+    journal_dir: Optional[str] = DEFAULT_JOURNAL_DIR  # crash-recovery journal; None disables
+    snapshot_every: int = 10000  # journal records between snapshots
+    recovery_policy: str = 'rerun'  # what to do with tasks a dead run left in progress
+    mcp_max_in_flight: int = 16  # MCP requests handled concurrently
+    mcp_max_message_bytes: int = 64 * 1024 * 1024  # largest single JSON-RPC message accepted on stdin
+    mcp_compact_json: bool = False  # non-indented JSON in tool results
+    mcp_notify_rate: float = 4.0  # max notification flushes per second to subscribed clients
+    control_socket: Optional[str] = None  # local read-only Unix socket for dashboards; None disables
+    metrics_file: Optional[str] = None  # Prometheus text file rewritten periodically; None disables
+    metrics_interval: float = 15.0  # seconds between metrics file writes
+    executor: str = 'subprocess'  # run task commands as child processes, or 'simulated'
+    task_timeout: float = 600.0  # seconds before a task's command is killed
+    max_processes: int = 4  # child processes running at once across all workers
+    output_lines: int = 200  # output lines kept per task
+    task_store: str = 'dict'  # 'dict' of Task objects, or 'compact' columns for very large specs
+    profile_dir: Optional[str] = None  # Chrome trace (and profiles) written here; None disables
+    profile_cprofile_every: int = 0  # profile the event loop while every n-th task runs; 0 disables
+    profile_tracemalloc_every: int = 0  # tracemalloc snapshot every n tasks; 0 disables
+
+    @classmethod
+    def from_env(cls) -> 'AgentConfig':
+        schedule = os.environ.get('KIRO_AGENT_SCHEDULE', 'priority')
+        if schedule not in SCHEDULE_MODES:
+            logger.warning(f"Ignoring invalid KIRO_AGENT_SCHEDULE={schedule!r}, using 'priority'")
+            schedule = 'priority'
+        recovery_policy = os.environ.get('KIRO_AGENT_RECOVERY', 'rerun')
+        if recovery_policy not in RECOVERY_POLICIES:
+            logger.warning(f"Ignoring invalid KIRO_AGENT_RECOVERY={recovery_policy!r}, using 'rerun'")
+            recovery_policy = 'rerun'
+        executor = os.environ.get('KIRO_AGENT_EXECUTOR', 'subprocess')
+        task_store = os.environ.get('KIRO_AGENT_TASK_STORE', 'dict')
+        if task_store not in TASK_STORES:
+            logger.warning(f"Ignoring invalid KIRO_AGENT_TASK_STORE={task_store!r}, using 'dict'")
+            task_store = 'dict'
+        cluster_role = os.environ.get('KIRO_AGENT_CLUSTER_ROLE') or None
+        if cluster_role is not None and cluster_role not in CLUSTER_ROLES:
+            logger.warning(f"Ignoring invalid KIRO_AGENT_CLUSTER_ROLE={cluster_role!r}, running alone")
+            cluster_role = None
+        profile_dir = os.environ.get('KIRO_AGENT_PROFILE_DIR') or None
+        if profile_dir is None and _env_flag('KIRO_AGENT_PROFILE', False):
+            profile_dir = DEFAULT_PROFILE_DIR
+        if executor not in EXECUTORS:
+            logger.warning(f"Ignoring invalid KIRO_AGENT_EXECUTOR={executor!r}, using 'subprocess'")
+            executor = 'subprocess'
+        return cls(
+            workers=max(1, _env_int('KIRO_AGENT_WORKERS', 1)),
+            retry_delay=max(0.0, _env_float('KIRO_AGENT_RETRY_DELAY', 30.0)),
+            retry_max_delay=max(0.0, _env_float('KIRO_AGENT_RETRY_MAX_DELAY', 600.0)),
+            max_attempts=max(1, _env_int('KIRO_AGENT_MAX_ATTEMPTS', 3)),
+            breaker_threshold=min(1.0, max(0.0, _env_float('KIRO_AGENT_BREAKER_THRESHOLD', 0.5))),
+            breaker_window=max(1, _env_int('KIRO_AGENT_BREAKER_WINDOW', 20)),
+            breaker_cooldown=max(0.0, _env_float('KIRO_AGENT_BREAKER_COOLDOWN', 60.0)),
+            schedule=schedule,
+            spec_weights=parse_spec_weights(os.environ.get('KIRO_AGENT_SPEC_WEIGHTS', '')),
+            cluster_role=cluster_role,
+            cluster_db=os.environ.get('KIRO_AGENT_CLUSTER_DB') or DEFAULT_CLUSTER_DB,
+            lease_seconds=max(3.0, _env_float('KIRO_AGENT_LEASE_SECONDS', 60.0)),
+            cluster_poll_interval=max(0.1, _env_float('KIRO_AGENT_CLUSTER_POLL', 1.0)),
+            history_path=os.environ.get('KIRO_AGENT_HISTORY', DEFAULT_HISTORY_PATH) or None,
+            cache_dir=os.environ.get('KIRO_AGENT_CACHE_DIR', DEFAULT_CACHE_DIR) or None,
+            cache_max_entries=max(1, _env_int('KIRO_AGENT_CACHE_MAX_ENTRIES', 10000)),
+            cache_max_bytes=max(65536, _env_int('KIRO_AGENT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            watch_spec=_env_flag('KIRO_AGENT_WATCH', True),
+            watch_interval=max(1, _env_int('KIRO_AGENT_WATCH_INTERVAL', 2)),
+            write_back=_env_flag('KIRO_AGENT_WRITE_BACK', True),
+            flush_interval=max(0.0, _env_float('KIRO_AGENT_FLUSH_INTERVAL', 2.0)),
+            flush_batch=max(1, _env_int('KIRO_AGENT_FLUSH_BATCH', 50)),
+            journal_dir=os.environ.get('KIRO_AGENT_JOURNAL_DIR', DEFAULT_JOURNAL_DIR) or None,
+            snapshot_every=max(1, _env_int('KIRO_AGENT_SNAPSHOT_EVERY', 10000)),
+            recovery_policy=recovery_policy,
+            mcp_max_in_flight=max(1, _env_int('KIRO_MCP_MAX_INFLIGHT', 16)),
+            mcp_max_message_bytes=max(65536, _env_int('KIRO_MCP_MAX_MESSAGE_BYTES', 64 * 1024 * 1024)),
+            mcp_compact_json=_env_flag('KIRO_MCP_COMPACT_JSON', False),
+            mcp_notify_rate=max(0.1, _env_float('KIRO_MCP_NOTIFY_RATE', 4.0)),
+            control_socket=os.environ.get('KIRO_AGENT_CONTROL_SOCKET') or None,
+            metrics_file=os.environ.get('KIRO_AGENT_METRICS_FILE') or None,
+            metrics_interval=max(1.0, _env_float('KIRO_AGENT_METRICS_INTERVAL', 15.0)),
+            executor=executor,
+            task_timeout=max(1.0, _env_float('KIRO_AGENT_TASK_TIMEOUT', 600.0)),
+            max_processes=max(1, _env_int('KIRO_AGENT_MAX_PROCESSES', 4)),
+            output_lines=max(1, _env_int('KIRO_AGENT_OUTPUT_LINES', 200)),
+            task_store=task_store,
+            profile_dir=profile_dir,
+            profile_cprofile_every=max(0, _env_int('KIRO_AGENT_PROFILE_CPROFILE_EVERY', 0)),
+            profile_tracemalloc_every=max(0, _env_int('KIRO_AGENT_PROFILE_TRACEMALLOC_EVERY', 0))
+        )
+
+@dataclass
+class WorkerState:
+    """Live state of a single worker in the execution pool"""
+    worker_id: int
+    current_task: Optional[str] = None
+    spec: Optional[str] = None  # namespace of the current task's spec in a multi-spec run
+    started_at: Optional[datetime] = None
+    tasks_completed: int = 0
+    tasks_failed: int = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'worker_id': self.worker_id,
+            'current_task': self.current_task,
+            'spec': self.spec,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'tasks_completed': self.tasks_completed,
+            'tasks_failed': self.tasks_failed
+        }
+
+@dataclass
+class ExecutionSession:
+    """One continuous execution run started through start_continuous_execution"""
+    session_id: str
+    mode: str  # 'spec', 'multi_spec' or 'cluster'
+    spec_paths: List[str]
+    started_at: datetime
+    state: str = 'running'  # running, stopping, completed, stopped or failed
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None  # the run itself, cancelled to stop it
+
+    def matches(self, mode: str, spec_paths: List[str]) -> bool:
+        same_specs = sorted(map(os.path.abspath, self.spec_paths)) == sorted(map(os.path.abspath, spec_paths))
+        return self.mode == mode and same_specs
+
+    def to_dict(self) -> Dict:
+        return {
+            'session_id': self.session_id,
+            'mode': self.mode,
+            'spec_paths': self.spec_paths,
+            'state': self.state,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'error': self.error
+        }
+
+@dataclass
+class SpecShare:
+    """A spec's weight and its use of the shared worker pool, for fair-share dispatch
+
+    The next worker goes to the spec running the fewest tasks per unit of
+    weight; ties go to the one that has had the least worker time per unit
+    of weight, so a spec with thousands of ready tasks cannot starve the rest.
+    """
+    weight: float = 1.0
+    running: int = 0
+    served_seconds: float = 0.0
+    dispatched: int = 0
+
+    def sort_key(self) -> Tuple[float, float]:
+        return (self.running / self.weight, self.served_seconds / self.weight)
+
+@dataclass
+class Task:
+    id: str
+    name: str
+    status: str  # 'not_started', 'in_progress', 'completed', 'failed'
+    priority: int
+    dependencies: List[str]
+    estimated_time: float  # minutes
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    parent: Optional[str] = None  # enclosing checklist item in the spec
+    line_number: Optional[int] = None
+    checkbox_offset: Optional[int] = None  # byte offset of the ' '/'x' inside "[ ]"
+    command: Optional[List[str]] = None  # argv from a `cmd:` line or fenced block under the item
+    timeout: Optional[float] = None  # seconds, from a `timeout:` line; None uses the agent default
+    inputs: Optional[List[str]] = None  # glob patterns from `inputs:` lines; makes the result cacheable
+    attempts: int = 0  # failed runs so far
+
+def _epoch(value: Optional[datetime]) -> float:
+    return value.timestamp() if value is not None else math.nan
+
+def _from_epoch(value: float) -> Optional[datetime]:
+    return None if value != value else datetime.fromtimestamp(value)
+
+class TaskView:
+    """Task-shaped view of one row of a CompactTaskStore
+
+    Reads and writes go straight to the store's columns, so a view is two
+    references however many fields a task has. dependencies returns a new
+    list: assign to it instead of appending. to_task() copies the row into
+    a regular Task.
+    """
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: 'CompactTaskStore', row: int):
+        self._store = store
+        self._row = row
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, TaskView) and other._store is self._store and other._row == self._row
+
+    def __hash__(self) -> int:
+        return hash((id(self._store), self._row))
+
+    def __repr__(self) -> str:
+        return f"TaskView(id={self.id!r}, name={self.name!r}, status={self.status!r})"
+
+    @property
+    def id(self) -> str:
+        return self._store._ids[self._row]
+
+    @property
+    def name(self) -> str:
+        return self._store._names[self._row]
+
+    @name.setter
+    def name(self, value: str):
+        self._store._names[self._row] = value
+
+    @property
+    def status(self) -> str:
+        return TASK_STATUSES[self._store._status[self._row]]
+
+    @status.setter
+    def status(self, value: str):
+        self._store._status[self._row] = CompactTaskStore.STATUS_CODES[value]
+
+    @property
+    def priority(self) -> int:
+        return self._store._priority[self._row]
+
+    @priority.setter
+    def priority(self, value: int):
+        self._store._priority[self._row] = value
+
+    @property
+    def dependencies(self) -> List[str]:
+        return self._store._get_dependencies(self._row)
+
+    @dependencies.setter
+    def dependencies(self, value: List[str]):
+        self._store._set_dependencies(self._row, value)
+
+    @property
+    def estimated_time(self) -> float:
+        return self._store._estimated[self._row]
+
+    @estimated_time.setter
+    def estimated_time(self, value: float):
+        self._store._estimated[self._row] = value
+
+    @property
+    def created_at(self) -> datetime:
+        return _from_epoch(self._store._created[self._row])
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        self._store._created[self._row] = _epoch(value)
+
+    @property
+    def started_at(self) -> Optional[datetime]:
+        return _from_epoch(self._store._started[self._row])
+
+    @started_at.setter
+    def started_at(self, value: Optional[datetime]):
+        self._store._started[self._row] = _epoch(value)
+
+    @property
+    def completed_at(self) -> Optional[datetime]:
+        return _from_epoch(self._store._completed[self._row])
+
+    @completed_at.setter
+    def completed_at(self, value: Optional[datetime]):
+        self._store._completed[self._row] = _epoch(value)
+
+    @property
+    def parent(self) -> Optional[str]:
+        row = self._store._parent[self._row]
+        return self._store._ids[row] if row >= 0 else None
+
+    @parent.setter
+    def parent(self, value: Optional[str]):
+        self._store._parent[self._row] = self._store._row_for(value) if value is not None else -1
+
+    @property
+    def line_number(self) -> Optional[int]:
+        value = self._store._line[self._row]
+        return value if value >= 0 else None
+
+    @line_number.setter
+    def line_number(self, value: Optional[int]):
+        self._store._line[self._row] = value if value is not None else -1
+
+    @property
+    def checkbox_offset(self) -> Optional[int]:
+        value = self._store._offset[self._row]
+        return value if value >= 0 else None
+
+    @checkbox_offset.setter
+    def checkbox_offset(self, value: Optional[int]):
+        self._store._offset[self._row] = value if value is not None else -1
+
+    @property
+    def command(self) -> Optional[List[str]]:
+        return self._store._commands.get(self._row)
+
+    @command.setter
+    def command(self, value: Optional[List[str]]):
+        if value is None:
+            self._store._commands.pop(self._row, None)
+        else:
+            self._store._commands[self._row] = value
+
+    @property
+    def timeout(self) -> Optional[float]:
+        return self._store._timeouts.get(self._row)
+
+    @timeout.setter
+    def timeout(self, value: Optional[float]):
+        if value is None:
+            self._store._timeouts.pop(self._row, None)
+        else:
+            self._store._timeouts[self._row] = value
+
+    @property
+    def inputs(self) -> Optional[List[str]]:
+        return self._store._inputs.get(self._row)
+
+    @inputs.setter
+    def inputs(self, value: Optional[List[str]]):
+        if value is None:
+            self._store._inputs.pop(self._row, None)
+        else:
+            self._store._inputs[self._row] = value
+
+    @property
+    def attempts(self) -> int:
+        return self._store._attempts[self._row]
+
+    @attempts.setter
+    def attempts(self, value: int):
+        self._store._attempts[self._row] = value
+
+    def to_task(self) -> Task:
+        return Task(
+            id=self.id, name=self.name, status=self.status, priority=self.priority,
+            dependencies=self.dependencies, estimated_time=self.estimated_time, created_at=self.created_at,
+            completed_at=self.completed_at, started_at=self.started_at, parent=self.parent,
+            line_number=self.line_number, checkbox_offset=self.checkbox_offset, command=self.command,
+            timeout=self.timeout, inputs=self.inputs, attempts=self.attempts
+        )
+
+class CompactTaskStore(MutableMapping):
+    """Column-oriented task table for very large specs (task_store='compact')
+
+    A drop-in for the agent's Dict[str, Task]. Every task is a row with an
+    integer index: scalar fields live in typed arrays (the status as one
+    byte, times as epoch floats with NaN for unset), parents as row indices,
+    dependencies CSR-style as a start/count per row into one shared array of
+    row indices, and the rare command/timeout annotations in sparse dicts.
+    Reads return a TaskView over the row, so no per-task objects are kept
+    alive. Assigning a Task (or a view) copies it into its row.
+
+    A task referenced before it is stored (a parent, or an unknown
+    dependency) gets a placeholder row that only becomes visible once the
+    task itself is stored. Rows are never reused, so a view of a deleted
+    task stays readable. values() and items() return iterators.
+
+    This trades speed for memory, and only for the task table: the
+    scheduler's dependency index, ranks and ready queue stay keyed by task
+    id, and every field read through a view costs an array lookup, so
+    dispatch is slower than with plain Tasks. get_status and the critical
+    path work from the scheduler's counters and ranks rather than the rows,
+    so they cost about the same with either store.
+    """
+
+    STATUS_CODES = {status: code for code, status in enumerate(TASK_STATUSES)}
+
+    def __init__(self):
+        self._rows: Dict[str, int] = {}  # every id seen, stored or placeholder
+        self._ids: List[str] = []
+        self._live = bytearray()
+        self._count = 0
+        self._names: List[str] = []
+        self._status = bytearray()
+        self._priority = array('i')
+        self._estimated = array('d')
+        self._created = array('d')
+        self._started = array('d')
+        self._completed = array('d')
+        self._parent = array('i')
+        self._line = array('q')
+        self._offset = array('q')
+        self._attempts = array('I')
+        self._dep_start = array('Q')
+        self._dep_count = array('I')
+        self._dep_rows = array('I')
+        self._dep_garbage = 0  # entries of _dep_rows no row points at any more
+        self._commands: Dict[int, List[str]] = {}
+        self._timeouts: Dict[int, float] = {}
+        self._inputs: Dict[int, List[str]] = {}
+
+    def _row_for(self, task_id: str) -> int:
+        """Row of a task id, adding a placeholder row the first time it is seen"""
+        row = self._rows.get(task_id)
+        if row is None:
+            row = self._rows[task_id] = len(self._ids)
+            self._ids.append(task_id)
+            self._live.append(0)
+            self._names.append('')
+            self._status.append(0)
+            self._priority.append(0)
+            self._estimated.append(0.0)
+            self._created.append(math.nan)
+            self._started.append(math.nan)
+            self._completed.append(math.nan)
+            self._parent.append(-1)
+            self._line.append(-1)
+            self._offset.append(-1)
+            self._attempts.append(0)
+            self._dep_start.append(0)
+            self._dep_count.append(0)
+        return row
+
+    def _get_dependencies(self, row: int) -> List[str]:
+        start = self._dep_start[row]
+        ids = self._ids
+        return [ids[dep] for dep in self._dep_rows[start:start + self._dep_count[row]]]
+
+    def _set_dependencies(self, row: int, dependencies: List[str]):
+        dep_rows = [self._row_for(dep_id) for dep_id in dependencies]
+        count = self._dep_count[row]
+        if len(dep_rows) <= count:
+            start = self._dep_start[row]
+            self._dep_rows[start:start + len(dep_rows)] = array('I', dep_rows)
+            self._dep_garbage += count - len(dep_rows)
+        else:
+            self._dep_start[row] = len(self._dep_rows)
+            self._dep_rows.extend(dep_rows)
+            self._dep_garbage += count
+        self._dep_count[row] = len(dep_rows)
+        if self._dep_garbage > 65536 and self._dep_garbage > len(self._dep_rows) // 2:
+            self._compact_dependencies()
+
+    def _compact_dependencies(self):
+        packed = array('I')
+        for row in range(len(self._ids)):
+            start, count = self._dep_start[row], self._dep_count[row]
+            self._dep_start[row] = len(packed)
+            packed.extend(self._dep_rows[start:start + count])
+        self._dep_rows = packed
+        self._dep_garbage = 0
+
+    def __setitem__(self, task_id: str, task: Any):
+        if isinstance(task, TaskView) and task._store is self and task._row == self._rows.get(task_id):
+            if not self._live[task._row]:
+                self._live[task._row] = 1
+                self._count += 1
+            return
+        row = self._row_for(task_id)
+        self._names[row] = task.name
+        self._status[row] = self.STATUS_CODES[task.status]
+        self._priority[row] = task.priority
+        self._estimated[row] = task.estimated_time
+        self._created[row] = _epoch(task.created_at)
+        self._started[row] = _epoch(task.started_at)
+        self._completed[row] = _epoch(task.completed_at)
+        self._parent[row] = self._row_for(task.parent) if task.parent is not None else -1
+        self._line[row] = task.line_number if task.line_number is not None else -1
+        self._offset[row] = task.checkbox_offset if task.checkbox_offset is not None else -1
+        self._attempts[row] = task.attempts
+        self._set_dependencies(row, task.dependencies)
+        if task.command is not None:
+            self._commands[row] = task.command
+        else:
+            self._commands.pop(row, None)
+        if task.timeout is not None:
+            self._timeouts[row] = task.timeout
+        else:
+            self._timeouts.pop(row, None)
+        if task.inputs is not None:
+            self._inputs[row] = task.inputs
+        else:
+            self._inputs.pop(row, None)
+        if not self._live[row]:
+            self._live[row] = 1
+            self._count += 1
+
+    def __getitem__(self, task_id: str) -> TaskView:
+        row = self._rows.get(task_id)
+        if row is None or not self._live[row]:
+            raise KeyError(task_id)
+        return TaskView(self, row)
+
+    def get(self, task_id: str, default: Any = None) -> Any:
+        row = self._rows.get(task_id)
+        if row is None or not self._live[row]:
+            return default
+        return TaskView(self, row)
+
+    def __contains__(self, task_id: Any) -> bool:
+        row = self._rows.get(task_id)
+        return row is not None and bool(self._live[row])
+
+    def __delitem__(self, task_id: str):
+        row = self._rows.get(task_id)
+        if row is None or not self._live[row]:
+            raise KeyError(task_id)
+        self._live[row] = 0
+        self._count -= 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        live = self._live
+        for row, task_id in enumerate(self._ids):
+            if live[row]:
+                yield task_id
+
+    def values(self) -> Iterator[TaskView]:
+        live = self._live
+        for row in range(len(self._ids)):
+            if live[row]:
+                yield TaskView(self, row)
+
+    def items(self) -> Iterator[Tuple[str, TaskView]]:
+        live = self._live
+        for row, task_id in enumerate(self._ids):
+            if live[row]:
+                yield task_id, TaskView(self, row)
+
+def create_task_store(kind: str) -> Dict[str, Task]:
+    """Empty task table of the configured kind"""
+    return CompactTaskStore() if kind == 'compact' else {}
+
+NO_COMMAND_HINT = "add a `cmd:` line or a fenced sh/bash/python block under it, or tick it by hand"
+CHECKBOX_PATTERN = re.compile(rb'^([ \t]*)[-*+] \[([ xX])\][ \t]+(\S.*?)\s*$')
+ANNOTATION_PATTERN = re.compile(rb'^([ \t]+)(?:[-*+][ \t]+)?(cmd|timeout|inputs):[ \t]*`?(.*?)`?\s*$')
+FENCE_PATTERN = re.compile(rb'^([ \t]*)(`{3,}|~{3,})[ \t]*([\w+-]*)')
+FENCE_INTERPRETERS = {
+    'sh': ['sh', '-c'], 'shell': ['sh', '-c'],
+    'bash': ['bash', '-c'], 'zsh': ['zsh', '-c'], 'python': [sys.executable, '-c'], 'py': [sys.executable, '-c']
+}
+NUMBERING_PATTERN = re.compile(r'^\s*\d+(\.\d+)*\.?\s+')
+
+def discover_specs(specs_dir: str = DEFAULT_SPECS_DIR) -> List[str]:
+    """Every `<specs_dir>/*/tasks.md`, in name order"""
+    return sorted(glob.glob(os.path.join(specs_dir, '*', 'tasks.md')))
+
+def spec_namespace(spec_path: str) -> str:
+    """Short name of a spec: its directory for `<name>/tasks.md`, otherwise the file name"""
+    directory, filename = os.path.split(os.path.abspath(spec_path))
+    if filename == 'tasks.md' and os.path.basename(directory):
+        return os.path.basename(directory)
+    return os.path.splitext(filename)[0]
+
+def is_aggregate(task: Task) -> bool:
+    """A parent item with no command of its own: done once all of its subtasks are"""
+    return task.command is None and bool(task.dependencies)
+
+def normalize_task_name(name: str) -> str:
+    """Strip numbering, case and extra whitespace so a task keeps its identity across edits"""
+    return ' '.join(NUMBERING_PATTERN.sub('', name, count=1).lower().split())
+
+def make_task_id(parent_id: Optional[str], name: str) -> str:
+    """Content-derived task ID, stable when other lines are inserted or items are renumbered"""
+    key = f"{parent_id or ''}/{normalize_task_name(name)}"
+    return 'task_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+def occurrence_id(base_id: str, occurrence: int) -> str:
+    """ID of the n-th identical sibling (the first one keeps the base ID)"""
+    return base_id if occurrence == 1 else f"{base_id}-{occurrence}"
+
+def is_restart_line(line: bytes) -> bool:
+    """True for headings and top-level checklist items, where the parser's indentation stack is empty"""
+    return line.startswith(b'#') or (line[:1] in (b'-', b'*', b'+') and CHECKBOX_PATTERN.match(line) is not None)
+
+def fence_transition(fence: Optional[bytes], line: bytes) -> Optional[bytes]:
+    """Fence marker in effect after line (None outside fenced code blocks)"""
+    if b'``' not in line and b'~~' not in line:
+        return fence
+    match = FENCE_PATTERN.match(line)
+    if match is None:
+        return fence
+    marker = match.group(2)
+    if fence is None:
+        return marker
+    if marker[:1] == fence[:1] and len(marker) >= len(fence) and line.strip() == marker:
+        return None
+    return fence
+
+class SpecIndex:
+    """Per-line byte offsets, content hashes and restart points of a spec file
+
+    A reload compares line hashes against the previous index to find the
+    changed region, then re-parses it from the nearest restart line.
+    """
+    __slots__ = ('offsets', 'hashes', 'restarts', 'size', 'fence')
+
+    def __init__(self):
+        self.offsets = array('Q')
+        self.hashes = array('I')
+        self.restarts = bytearray()
+        self.size = 0
+        self.fence: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add(self, offset: int, line: bytes):
+        self.offsets.append(offset)
+        self.hashes.append(zlib.crc32(line))
+        # Nothing inside a fenced code block is a safe place to start parsing
+        fence = self.fence
+        if fence is None and b'``' not in line and b'~~' not in line:
+            self.restarts.append(is_restart_line(line))
+        else:
+            self.fence = fence_transition(fence, line)
+            self.restarts.append(False)
+        self.size = offset + len(line)
+
+    def offset_at(self, line_index: int) -> int:
+        """Byte offset of a 0-based line, or the file size past the last line"""
+        return self.offsets[line_index] if line_index < len(self.offsets) else self.size
+
+    def is_restart(self, line_index: int) -> bool:
+        return line_index >= len(self.restarts) or bool(self.restarts[line_index])
+
+    @classmethod
+    def scan(cls, spec_path: str) -> 'SpecIndex':
+        """Index a spec file without parsing its tasks"""
+        index = cls()
+        offset = 0
+        with open(spec_path, 'rb') as f:
+            for line in f:
+                index.add(offset, line)
+                offset += len(line)
+        return index
+
+class _SpecFrame:
+    """An open checklist item on the parser's indentation stack"""
+    __slots__ = ('indent', 'task', 'sibling_counts')
+
+    def __init__(self, indent: int, task: Task):
+        self.indent = indent
+        self.task = task
+        self.sibling_counts: Dict[str, int] = {}
+
+def _owning_frame(stack: List[_SpecFrame], indent: int) -> Optional[_SpecFrame]:
+    """Innermost open item that a line indented by indent belongs to"""
+    for frame in reversed(stack):
+        if frame.indent < indent:
+            return frame
+    return None
+
+def _apply_annotation(stack: List[_SpecFrame], line: bytes):
+    """Attach a `cmd:`, `timeout:` or `inputs:` line to the item it is indented under"""
+    match = ANNOTATION_PATTERN.match(line)
+    if match is None:
+        return
+    frame = _owning_frame(stack, len(match.group(1).expandtabs(4)))
+    if frame is None:
+        return
+    value = match.group(3).decode('utf-8', errors='replace')
+    try:
+        if match.group(2) == b'cmd':
+            if frame.task.command is None:
+                frame.task.command = shlex.split(value) or None
+        elif match.group(2) == b'inputs':
+            patterns = [p for p in re.split(r'[,\s]+', value) if p]
+            if patterns:
+                frame.task.inputs = (frame.task.inputs or []) + patterns
+        else:
+            frame.task.timeout = float(value.rstrip('s')) if value else None
+    except ValueError:
+        logger.warning(f"Ignoring malformed annotation under {frame.task.name!r}: {value!r}")
+
+def _fence_command(language: str, body: List[bytes]) -> Optional[List[str]]:
+    interpreter = FENCE_INTERPRETERS.get(language.lower())
+    if interpreter is None:
+        return None
+    script = textwrap.dedent(b''.join(body).decode('utf-8', errors='replace'))
+    return interpreter + [script] if script.strip() else None
+
+def iter_spec_tasks(spec_path: str, index: Optional[SpecIndex] = None, start_offset: int = 0,
+                    end_offset: Optional[int] = None, first_line: int = 1,
+                    root_counts: Optional[Dict[str, int]] = None) -> Iterator[Task]:
+    """Stream tasks from a tasks.md file in a single pass
+
+    Checklist items indented under another item become its children and the
+    parent depends on each of them, so it only runs once its subtree is done.
+    Tasks are yielded as soon as their subtree closes (children before their
+    parent), which keeps memory bounded by the nesting depth, not the file size.
+    Completed `- [x]` items are yielded with status 'completed'.
+
+    Lines indented under an item can attach a command to it: `cmd: <argv>`
+    (split shell-style, run without a shell), a fenced sh/bash/python code
+    block, and `timeout: <seconds>`. The first command found wins. Fences
+    without a language, and `console` transcripts with their prompts and
+    interleaved output, are sample output, so they are not commands.
+    `inputs: <glob>, ...` lists the files the item's result depends on.
+    Nothing inside a fenced block is parsed as a heading or checklist item.
+
+    A byte range starting at a restart line can be parsed on its own; pass
+    the occurrence counts of the top-level items before it as root_counts.
+    """
+    if root_counts is None:
+        root_counts = {}
+    stack: List[_SpecFrame] = []
+    offset = start_offset
+    fence: Optional[bytes] = None
+    fence_owner: Optional[_SpecFrame] = None
+    fence_language = ''
+    fence_body: List[bytes] = []
+    loaded_at = datetime.now()
+    with open(spec_path, 'rb') as f:
+        f.seek(start_offset)
+        for line_number, line in enumerate(f, first_line):
+            if end_offset is not None and offset >= end_offset:
+                break
+            line_offset = offset
+            offset += len(line)
+            if index is not None:
+                index.add(line_offset, line)
+            
+            if fence is not None or b'``' in line or b'~~' in line:
+                previous = fence
+                fence = fence_transition(fence, line)
+                if previous is not None or fence is not None:
+                    if previous is None:
+                        # Opening fence: its body becomes the command of the item it is indented under
+                        match = FENCE_PATTERN.match(line)
+                        fence_owner = _owning_frame(stack, len(match.group(1).expandtabs(4)))
+                        if fence_owner is not None and fence_owner.task.command is not None:
+                            fence_owner = None
+                        fence_language = match.group(3).decode('ascii', errors='replace')
+                        fence_body = []
+                    elif fence is None:
+                        if fence_owner is not None:
+                            fence_owner.task.command = _fence_command(fence_language, fence_body)
+                        fence_owner = None
+                    elif fence_owner is not None:
+                        fence_body.append(line)
+                    continue
+            
+            if line.startswith(b'#'):
+                # A heading closes every open item
+                while stack:
+                    yield stack.pop().task
+                continue
+            
+            match = CHECKBOX_PATTERN.match(line) if b'[' in line else None
+            if not match:
+                if stack and (b'cmd:' in line or b'timeout:' in line or b'inputs:' in line):
+                    _apply_annotation(stack, line)
+                continue
+            
+            indent = len(match.group(1).expandtabs(4))
+            while stack and stack[-1].indent >= indent:
+                yield stack.pop().task
+            
+            parent = stack[-1] if stack else None
+            parent_id = parent.task.id if parent else None
+            name = match.group(3).decode('utf-8', errors='replace')
+            
+            # Identical siblings are told apart by their occurrence number
+            counts = parent.sibling_counts if parent else root_counts
+            base_id = make_task_id(parent_id, name)
+            occurrence = counts.get(base_id, 0) + 1
+            counts[base_id] = occurrence
+            
+            task = Task(
+                id=occurrence_id(base_id, occurrence),
+                name=name,
+                status='completed' if match.group(2) in b'xX' else 'not_started',
+                priority=1,
+                dependencies=[],
+                estimated_time=DEFAULT_ESTIMATED_TIME,
+                created_at=loaded_at,
+                parent=parent_id,
+                line_number=line_number,
+                checkbox_offset=line_offset + match.start(2)
+            )
+            if parent:
+                parent.task.dependencies.append(task.id)
+            stack.append(_SpecFrame(indent, task))
+    
+    while stack:
+        yield stack.pop().task
+
+class _PrefixRootCounts(dict):
+    """Occurrence counts of top-level items before a re-parsed region, looked up on demand"""
+
+    def __init__(self, tasks: Dict[str, Task], before_line: int):
+        super().__init__()
+        self.tasks = tasks
+        self.before_line = before_line
+
+    def get(self, base_id: str, default: int = 0) -> int:
+        if base_id not in self:
+            count = 0
+            while True:
+                task = self.tasks.get(occurrence_id(base_id, count + 1))
+                if task is None or task.parent is not None or not task.line_number or task.line_number >= self.before_line:
+                    break
+                count += 1
+            self[base_id] = count
+        return self[base_id]
+
+class SpecWatcher:
+    """Watches a spec file and calls back when its contents change
+
+    Uses inotify on Linux (watching the directory, so editors that save via
+    rename are seen) and falls back to polling the file's mtime/size.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, path: str, on_change: Callable[[], Awaitable[Any]], poll_interval: float = 2.0,
+                 debounce: float = 0.2):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.backend = 'polling'
+        self._signature = self._stat()
+        self._changed: Optional[asyncio.Event] = None
+        self._fd: Optional[int] = None
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def mark_seen(self):
+        """Accept the file's current state as known (e.g. after the agent wrote it itself)"""
+        self._signature = self._stat()
+
+    def has_unseen_changes(self) -> bool:
+        return self._stat() != self._signature
+
+    def _start_inotify(self) -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            if fd < 0:
+                return False
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+            if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+                os.close(fd)
+                return False
+        except (OSError, AttributeError):
+            return False
+        self._fd = fd
+        asyncio.get_event_loop().add_reader(fd, self._on_inotify)
+        return True
+
+    def _on_inotify(self):
+        name = os.path.basename(self.path).encode()
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        pos = 0
+        while pos + 16 <= len(data):
+            _, _, _, length = struct.unpack_from('iIII', data, pos)
+            event_name = data[pos + 16:pos + 16 + length].rstrip(b'\0')
+            pos += 16 + length
+            if event_name == name:
+                self._changed.set()
+
+    async def run(self):
+        """Watch until cancelled"""
+        self._changed = asyncio.Event()
+        if self._start_inotify():
+            self.backend = 'inotify'
+        logger.info(f"Watching {self.path} for changes ({self.backend})")
+        try:
+            while True:
+                if self._fd is not None:
+                    await self._changed.wait()
+                else:
+                    await asyncio.sleep(self.poll_interval)
+                # Let a burst of writes settle before reading the file
+                await asyncio.sleep(self.debounce)
+                self._changed.clear()
+                signature = self._stat()
+                if signature is None or signature == self._signature:
+                    continue
+                self._signature = signature
+                try:
+                    await self.on_change()
+                except Exception as e:
+                    logger.error(f"Error reloading {self.path}: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                asyncio.get_event_loop().remove_reader(self._fd)
+            except Exception:
+                pass
+            os.close(self._fd)
+            self._fd = None
+
+class StatusCounts:
+    """Number of tasks in each status, adjusted on every transition instead of recounted
+
+    Also keeps the estimated minutes of work left in tasks that are not
+    completed; callers pass a task's own work (zero for aggregates) with
+    each transition.
+    """
+    __slots__ = ('counts', 'remaining_work')
+
+    def __init__(self):
+        self.counts: Dict[str, int] = dict.fromkeys(TASK_STATUSES, 0)
+        self.remaining_work = 0.0
+
+    def reset(self, tasks: Iterator[Task]):
+        """Recount from scratch (after a load or reload)"""
+        counts = dict.fromkeys(TASK_STATUSES, 0)
+        remaining_work = 0.0
+        for task in tasks:
+            counts[task.status] = counts.get(task.status, 0) + 1
+            if task.status != 'completed' and not is_aggregate(task):
+                remaining_work += task.estimated_time
+        self.counts = counts
+        self.remaining_work = remaining_work
+
+    def move(self, old: str, new: str, work: float = 0.0):
+        if old != new:
+            self.counts[old] -= 1
+            self.counts[new] = self.counts.get(new, 0) + 1
+            if new == 'completed':
+                self.remaining_work -= work
+            elif old == 'completed':
+                self.remaining_work += work
+
+    def remove(self, status: str, work: float = 0.0):
+        self.counts[status] -= 1
+        if status != 'completed':
+            self.remaining_work -= work
+
+    def __getitem__(self, status: str) -> int:
+        return self.counts.get(status, 0)
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+class SubtreeProgress:
+    """Completed and total leaf tasks under every parent task, adjusted on each transition
+
+    Only leaves (items without subtasks) are counted, since parents have no
+    work of their own. A transition walks up the parent chain, so keeping
+    section progress current costs the nesting depth, not a table scan.
+    """
+    __slots__ = ('tasks', 'done', 'total', 'sections')
+
+    def __init__(self, tasks: Dict[str, Task]):
+        self.tasks = tasks
+        self.done: Dict[str, int] = {}
+        self.total: Dict[str, int] = {}
+        self.sections: List[str] = []  # top-level parents in spec order
+
+    def _ancestors(self, task: Task) -> Iterator[str]:
+        parent_id = task.parent
+        while parent_id is not None:
+            yield parent_id
+            parent = self.tasks.get(parent_id)
+            parent_id = parent.parent if parent is not None else None
+
+    def reset(self):
+        """Recount from scratch (after a load or reload)"""
+        done: Dict[str, int] = {}
+        total: Dict[str, int] = {}
+        for task in self.tasks.values():
+            if task.dependencies:
+                continue
+            completed = task.status == 'completed'
+            for ancestor in self._ancestors(task):
+                total[ancestor] = total.get(ancestor, 0) + 1
+                if completed:
+                    done[ancestor] = done.get(ancestor, 0) + 1
+        self.done, self.total = done, total
+        sections = []
+        for task_id in total:
+            task = self.tasks.get(task_id)
+            if task is not None and task.parent is None:
+                sections.append((task.line_number or 0, task_id))
+        self.sections = [task_id for _, task_id in sorted(sections)]
+
+    def move(self, task: Task, old: str, new: str):
+        if (old == 'completed') == (new == 'completed') or task.dependencies:
+            return
+        delta = 1 if new == 'completed' else -1
+        for ancestor in self._ancestors(task):
+            self.done[ancestor] = self.done.get(ancestor, 0) + delta
+
+    def remove(self, task: Task):
+        if task.dependencies:
+            return
+        for ancestor in self._ancestors(task):
+            if ancestor in self.total:
+                self.total[ancestor] -= 1
+                if task.status == 'completed':
+                    self.done[ancestor] -= 1
+
+    def summary(self, task_id: str) -> Dict[str, Any]:
+        task = self.tasks.get(task_id)
+        done = self.done.get(task_id, 0)
+        total = self.total.get(task_id, 0)
+        return {
+            'id': task_id,
+            'name': task.name if task is not None else None,
+            'status': task.status if task is not None else None,
+            'completed_subtasks': done,
+            'total_subtasks': total,
+            'completion_percentage': done / total * 100 if total else 100.0
+        }
+
+class Histogram:
+    """Fixed-bucket histogram of observed values (seconds), exported Prometheus-style"""
+    __slots__ = ('bounds', 'buckets', 'sum', 'count')
+
+    DURATION_BOUNDS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+    WAIT_BOUNDS = (0.001, 0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600)
+    LATENCY_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                if i == len(self.bounds):
+                    return lower
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        """(upper bound label, cumulative count) pairs, ending with +Inf"""
+        total = 0
+        for bound, n in zip(self.bounds, self.buckets):
+            total += n
+            yield f"{bound:g}", total
+        yield "+Inf", self.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': dict(self.cumulative())
+        }
+
+class TaskScheduler:
+    """Dependency-indexed ready queue for the agent's task table
+
+    Keeps a reverse-dependency map and per-task unmet-dependency counters so
+    finishing a task only touches its direct dependents, plus a priority heap
+    of ready tasks so picking the next one is O(log n). Workers block on an
+    asyncio.Event that is set whenever a task becomes ready, instead of polling.
+
+    In 'critical_path' mode the heap is ordered by each task's longest
+    remaining path through the dependency DAG (weighted by estimated_time),
+    so the chain that bounds the makespan is dispatched first.
+
+    Parents without a command of their own never enter the heap: once their
+    last subtask finishes they are handed to on_aggregate_ready, and they
+    count as zero time on the critical path.
+
+    The scheduler also keeps per-status task counts, per-subtree progress
+    and the time tasks spend ready before a worker claims them (queue_wait).
+
+    Ranks are only recomputed when the graph changes: a finished task just
+    drops out of them, and the critical path is walked again at most every
+    CRITICAL_PATH_REFRESH seconds while tasks keep finishing.
+    """
+
+    MODES = SCHEDULE_MODES
+    CRITICAL_PATH_REFRESH = 1.0  # seconds
+
+    def __init__(self, tasks: Dict[str, Task], mode: str = 'priority'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown schedule mode: {mode}")
+        self.tasks = tasks
+        self.mode = mode
+        self._dependents: Dict[str, Set[str]] = {}
+        self._unmet: Dict[str, int] = {}
+        self._order: Dict[str, int] = {}
+        self._rank: Dict[str, float] = {}  # estimated minutes from task start to the end of its longest chain
+        self._ranks_stale = True  # a completed task was reopened or tasks were added since compute_ranks
+        self._ready: List[Tuple[Tuple[float, ...], int, str]] = []  # (sort key, order, task_id)
+        self._queued: Set[str] = set()
+        self._in_flight: Set[str] = set()
+        self._delayed: Dict[str, asyncio.TimerHandle] = {}
+        self._detached: Set[str] = set()  # removed from the spec while running
+        self._resume: Optional[asyncio.TimerHandle] = None  # set while dispatch is paused
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closed = False
+        self._version = 0
+        self._critical_path_cache: Optional[Tuple[int, List[str], float, float]] = None  # (..., computed_at)
+        self._ready_at: Dict[str, float] = {}  # monotonic time each queued task became ready
+        self.counts = StatusCounts()
+        self.progress = SubtreeProgress(tasks)
+        self.queue_wait = Histogram(Histogram.WAIT_BOUNDS)
+        self.on_aggregate_ready: Optional[Callable[[str], None]] = None  # completes parents instead of queueing them
+
+    def rebuild(self):
+        """Recompute the dependency index and ready heap from scratch"""
+        self._dependents.clear()
+        self._unmet.clear()
+        self._ready.clear()
+        self._queued.clear()
+        self._ready_at.clear()
+        self.counts.reset(self.tasks.values())
+        self.progress.reset()
+        for task in self.tasks.values():
+            self._index_task(task)
+        self.compute_ranks()
+        for task_id in self.tasks:
+            self._push_if_ready(task_id)
+        self._closed = False
+        self._notify()
+
+    def add_task(self, task: Task):
+        """Register a single task that was added to the task table"""
+        self.add_tasks([task])
+
+    def add_tasks(self, tasks: List[Task]):
+        """Register (or re-register after unindex) a batch of tasks in the task table"""
+        for task in tasks:
+            self._index_task(task)
+        if self.mode == 'critical_path':
+            self.compute_ranks()
+        else:
+            self._ranks_stale = True
+            self._version += 1
+        self._critical_path_cache = None
+        for task in tasks:
+            self._push_if_ready(task.id)
+        self._notify()
+
+    def unindex(self, task: Task):
+        """Drop a task's dependency edges before its dependencies are edited"""
+        for dep_id in task.dependencies:
+            dependents = self._dependents.get(dep_id)
+            if dependents:
+                dependents.discard(task.id)
+        self._unmet.pop(task.id, None)
+
+    def remove_task(self, task_id: str):
+        """Remove a task from the table; a running task is dropped once it finishes"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return
+        self.unindex(task)
+        self._dependents.pop(task_id, None)
+        self._order.pop(task_id, None)
+        self._rank.pop(task_id, None)
+        self._queued.discard(task_id)
+        self._ready_at.pop(task_id, None)
+        handle = self._delayed.pop(task_id, None)
+        if handle:
+            handle.cancel()
+        if task_id in self._in_flight:
+            self._detached.add(task_id)
+        else:
+            del self.tasks[task_id]
+        self._version += 1
+        self._critical_path_cache = None
+
+    def compute_ranks(self):
+        """Compute every incomplete task's longest remaining path, weighted by estimated_time
+
+        Walks the DAG in reverse topological order (sinks first), O(tasks + edges).
+        Tasks caught in a dependency cycle only count their own estimate.
+        """
+        rank: Dict[str, float] = {}
+        pending_dependents: Dict[str, int] = {}
+        for task_id, task in self.tasks.items():
+            if task.status == 'completed':
+                continue
+            rank[task_id] = 0.0 if is_aggregate(task) else float(task.estimated_time)
+            pending_dependents[task_id] = sum(
+                1 for d in self._dependents.get(task_id, ()) if d in self.tasks and self.tasks[d].status != 'completed'
+            )
+        stack = [task_id for task_id, count in pending_dependents.items() if count == 0]
+        while stack:
+            task_id = stack.pop()
+            for dep_id in self.tasks[task_id].dependencies:
+                if dep_id not in rank:
+                    continue
+                dep = self.tasks[dep_id]
+                dep_rank = (0.0 if is_aggregate(dep) else dep.estimated_time) + rank[task_id]
+                if dep_rank > rank[dep_id]:
+                    rank[dep_id] = dep_rank
+                pending_dependents[dep_id] -= 1
+                if pending_dependents[dep_id] == 0:
+                    stack.append(dep_id)
+        self._rank = rank
+        self._ranks_stale = False
+        self._version += 1
+        self._critical_path_cache = None
+        if self.mode == 'critical_path' and self._ready:
+            self._ready = [(self._sort_key(self.tasks[t]), order, t) for _, order, t in self._ready if t in self.tasks]
+            heapq.heapify(self._ready)
+
+    def _sort_key(self, task: Task) -> Tuple[float, ...]:
+        if self.mode == 'critical_path':
+            return (-self._rank.get(task.id, task.estimated_time), -task.priority)
+        return (-task.priority,)
+
+    def set_status(self, task: Task, status: str):
+        """Change a task's status, keeping the counters, progress and ranks in step"""
+        old = task.status
+        if old != status:
+            self.counts.move(old, status, 0.0 if is_aggregate(task) else task.estimated_time)
+            self.progress.move(task, old, status)
+            if status == 'completed':
+                # Ranks only look downstream, so finishing a task leaves the others valid
+                self._rank.pop(task.id, None)
+            elif old == 'completed':
+                self._ranks_stale = True
+        task.status = status
+        if self._ranks_stale and old == 'completed' and self.mode == 'critical_path':
+            self.compute_ranks()  # the ready heap is ordered by rank
+
+    def critical_path(self) -> Tuple[List[str], float]:
+        """Return the current critical path (task ids) and its length in minutes
+
+        While tasks keep finishing, the last path is reused (minus its
+        finished head) until CRITICAL_PATH_REFRESH seconds have passed.
+        """
+        cached = self._critical_path_cache
+        if cached is not None:
+            version, path, length, computed_at = cached
+            if version == self._version:
+                return path, length
+            if not self._ranks_stale and time.monotonic() - computed_at < self.CRITICAL_PATH_REFRESH:
+                skip = 0
+                while skip < len(path) and path[skip] not in self._rank:
+                    skip += 1
+                if skip:
+                    path = path[skip:]
+                    length = self._rank[path[0]] if path else 0.0
+                self._critical_path_cache = (self._version, path, length, computed_at)
+                return path, length
+        if self._ranks_stale:
+            self.compute_ranks()
+        rank = self._rank
+        path: List[str] = []
+        visited: Set[str] = set()
+        start = max(rank, key=rank.__getitem__) if rank else None
+        length = rank[start] if start is not None else 0.0
+        current = start
+        while current is not None:
+            path.append(current)
+            visited.add(current)
+            following = None
+            for dependent_id in self._dependents.get(current, ()):
+                if dependent_id not in rank or dependent_id in visited:
+                    continue
+                if following is None or rank[dependent_id] > rank[following]:
+                    following = dependent_id
+            current = following
+        self._critical_path_cache = (self._version, path, length, time.monotonic())
+        return path, length
+
+    def remaining_work(self) -> float:
+        """Estimated minutes of work in the tasks not yet completed"""
+        return max(0.0, self.counts.remaining_work)
+
+    def estimate_makespan(self, workers: int) -> float:
+        """Lower-bound estimate (minutes) of the time left: the critical path or the work spread over all workers"""
+        _, path_length = self.critical_path()
+        return max(path_length, self.remaining_work() / max(1, workers))
+
+    def _index_task(self, task: Task):
+        if task.id not in self._order:
+            self._order[task.id] = next(self._seq)
+        unmet = 0
+        for dep_id in task.dependencies:
+            dep = self.tasks.get(dep_id)
+            # Unknown dependencies are treated as met
+            if dep is None:
+                continue
+            self._dependents.setdefault(dep_id, set()).add(task.id)
+            if dep.status != 'completed':
+                unmet += 1
+        self._unmet[task.id] = unmet
+
+    def _push_if_ready(self, task_id: str):
+        task = self.tasks.get(task_id)
+        if (task is None or task.status != 'not_started' or self._unmet.get(task_id, 0) > 0
+                or task_id in self._queued or task_id in self._delayed):
+            return
+        if self.on_aggregate_ready is not None and is_aggregate(task):
+            # A parent whose subtasks are all done has nothing left to run
+            self.on_aggregate_ready(task_id)
+            return
+        heapq.heappush(self._ready, (self._sort_key(task), self._order[task_id], task_id))
+        self._queued.add(task_id)
+        self._ready_at[task_id] = time.monotonic()
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def set_wakeup(self, event: asyncio.Event):
+        """Signal this event when a task becomes ready (shared by the specs of a multi-spec run)"""
+        self._wakeup = event
+
+    def pop_ready(self) -> Optional[str]:
+        """Claim the highest-priority ready task, or None if nothing is ready"""
+        if self._resume is not None:
+            return None
+        while self._ready:
+            _, _, task_id = heapq.heappop(self._ready)
+            self._queued.discard(task_id)
+            ready_at = self._ready_at.pop(task_id, None)
+            task = self.tasks.get(task_id)
+            # Entries are invalidated lazily (e.g. a task run directly via execute_single_task)
+            if task is None or task.status != 'not_started' or self._unmet.get(task_id, 0) > 0:
+                continue
+            if ready_at is not None:
+                self.queue_wait.observe(time.monotonic() - ready_at)
+            self.counts.move(task.status, 'in_progress')
+            task.status = 'in_progress'
+            self._in_flight.add(task_id)
+            return task_id
+        return None
+
+    def unmet_dependencies(self, task_id: str) -> int:
+        """Dependencies of a task that have not completed yet"""
+        return self._unmet.get(task_id, 0)
+
+    def start_direct(self, task_id: str):
+        """Count a task run outside the worker pool as in flight, so the pool doesn't go idle under it"""
+        self._in_flight.add(task_id)
+
+    def end_direct(self, task_id: str):
+        """Release a direct run that did not go through task_finished"""
+        if task_id in self._in_flight:
+            self._in_flight.discard(task_id)
+            self._notify()
+
+    def ready_count(self) -> int:
+        return len(self._queued)
+
+    def retry_count(self) -> int:
+        return len(self._delayed)
+
+    def next_retry_in(self) -> Optional[float]:
+        """Seconds until the earliest backed-off task becomes eligible again"""
+        if not self._delayed:
+            return None
+        now = asyncio.get_event_loop().time()
+        return max(0.0, min(handle.when() for handle in self._delayed.values()) - now)
+
+    def pause(self, seconds: float):
+        """Stop handing out tasks for a while; running tasks are not affected"""
+        if self._resume is not None:
+            self._resume.cancel()
+        self._resume = asyncio.get_event_loop().call_later(seconds, self._unpause)
+
+    def paused_for(self) -> Optional[float]:
+        """Seconds left in the current pause, or None if dispatching"""
+        if self._resume is None:
+            return None
+        return max(0.0, self._resume.when() - asyncio.get_event_loop().time())
+
+    def _unpause(self):
+        self._resume = None
+        self._notify()
+
+    def is_idle(self) -> bool:
+        """True when no task is ready, running or waiting to be retried"""
+        return not self._queued and not self._in_flight and not self._delayed
+
+    async def next_task(self) -> Optional[str]:
+        """Wait for the next ready task; returns None once no more progress is possible"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        while not self._closed:
+            # Clear before checking so a notify between the check and the wait is not lost
+            self._wakeup.clear()
+            task_id = self.pop_ready()
+            if task_id is not None:
+                return task_id
+            if self.is_idle():
+                self._notify()  # let the other waiting workers see the idle state too
+                return None
+            await self._wakeup.wait()
+        return None
+
+    def task_finished(self, task_id: str, success: bool, retry_delay: float = 0):
+        """Record the outcome of a task and wake the workers that can make progress"""
+        self._in_flight.discard(task_id)
+        self._version += 1
+        if task_id in self._detached:
+            self._detached.discard(task_id)
+            task = self.tasks.pop(task_id, None)
+            if task is not None:
+                self.counts.remove(task.status, 0.0 if is_aggregate(task) else task.estimated_time)
+                self.progress.remove(task)
+                self._rank.pop(task_id, None)
+            self._notify()
+            return
+        if success:
+            for dependent_id in self._dependents.get(task_id, ()):
+                if self._unmet.get(dependent_id, 0) > 0:
+                    self._unmet[dependent_id] -= 1
+                    self._push_if_ready(dependent_id)
+        elif retry_delay > 0 and task_id not in self._delayed and not self._closed:
+            loop = asyncio.get_event_loop()
+            self._delayed[task_id] = loop.call_later(retry_delay, self._retry, task_id)
+        else:
+            self._push_if_ready(task_id)
+        self._notify()
+
+    def _retry(self, task_id: str):
+        self._delayed.pop(task_id, None)
+        self._push_if_ready(task_id)
+        self._notify()
+
+    def close(self):
+        """Wake all waiting workers and make next_task return None"""
+        self._closed = True
+        for handle in self._delayed.values():
+            handle.cancel()
+        self._delayed.clear()
+        if self._resume is not None:
+            self._resume.cancel()
+            self._resume = None
+        self._notify()
+
+class SpecStatusWriter:
+    """Coalesces task status changes and writes them back to the spec file
+
+    Each change flips the single checkbox byte recorded by the parser, so
+    nothing is re-rendered. Changes are batched until max_batch are pending
+    or flush_interval has passed, then applied to a copy of the file that is
+    fsynced and atomically renamed over the original.
+    """
+
+    CHECKBOX_STATES = (b' ', b'x', b'X')
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, path: str, flush_interval: float = 2.0, max_batch: int = 50,
+                 on_flush: Optional[Callable[[List[Task]], None]] = None,
+                 is_stale: Optional[Callable[[], bool]] = None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.on_flush = on_flush
+        self.is_stale = is_stale  # True while the file has edits the parser has not seen yet
+        self.flushes = 0
+        self._pending: Dict[str, Tuple[Task, bytes]] = {}
+        self._attempts: Dict[str, int] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def mark(self, task: Task, completed: bool):
+        """Queue a checkbox change; the last change per task wins"""
+        if task.checkbox_offset is None:
+            return
+        self._pending[task.id] = (task, b'x' if completed else b' ')
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif not self._schedule_flush():
+            self.flush()
+
+    def _schedule_flush(self) -> bool:
+        if self._timer is None:
+            try:
+                self._timer = asyncio.get_event_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                return False
+        return True
+
+    def flush(self) -> int:
+        """Write all pending changes in one atomic replace; returns the number of checkboxes changed"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return 0
+        if self.is_stale and self.is_stale():
+            # Offsets are about to change; wait for the reload
+            self._schedule_flush()
+            return 0
+        pending, self._pending = self._pending, {}
+        
+        tmp_path = f"{self.path}.tmp"
+        patched: List[Task] = []
+        try:
+            before = os.stat(self.path)
+            shutil.copyfile(self.path, tmp_path)
+            shutil.copymode(self.path, tmp_path)
+            with open(tmp_path, 'r+b') as f:
+                for task, state in pending.values():
+                    offset = task.checkbox_offset
+                    if offset is None or offset < 1:
+                        continue
+                    f.seek(offset - 1)
+                    current = f.read(3)
+                    # Skip offsets that no longer point at a checkbox (file edited since the last parse)
+                    if len(current) != 3 or current[0:1] != b'[' or current[2:3] != b']' \
+                            or current[1:2] not in self.CHECKBOX_STATES:
+                        self._retry_later(task, state)
+                        continue
+                    if current[1:2].lower() == state:
+                        continue
+                    f.seek(offset)
+                    f.write(state)
+                    patched.append(task)
+                f.flush()
+                os.fsync(f.fileno())
+            
+            after = os.stat(self.path)
+            if (after.st_mtime_ns, after.st_size) != (before.st_mtime_ns, before.st_size):
+                # Someone else wrote the spec meanwhile; retry after the reload picks up their edit
+                os.remove(tmp_path)
+                for task_id, change in pending.items():
+                    self._pending.setdefault(task_id, change)
+                self._schedule_flush()
+                return 0
+            if not patched:
+                os.remove(tmp_path)
+                return 0
+            os.replace(tmp_path, self.path)
+            self._fsync_directory()
+        except Exception as e:
+            logger.error(f"Error writing task status to {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return 0
+        
+        self.flushes += 1
+        for task in patched:
+            self._attempts.pop(task.id, None)
+        logger.info(f"Wrote {len(patched)} task status change(s) to {self.path}")
+        if self.on_flush:
+            self.on_flush(patched)
+        return len(patched)
+
+    def _retry_later(self, task: Task, state: bytes):
+        attempts = self._attempts.get(task.id, 0) + 1
+        if attempts >= self.MAX_ATTEMPTS:
+            self._attempts.pop(task.id, None)
+            logger.warning(f"Checkbox for task {task.id} not found at its recorded offset; skipping write-back")
+            return
+        self._attempts[task.id] = attempts
+        self._pending.setdefault(task.id, (task, state))
+        self._schedule_flush()
+
+    def _fsync_directory(self):
+        if os.name != 'posix':
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class TaskJournal:
+    """Append-only log of task state transitions with periodic snapshots
+
+    Each transition is one short text line ("<code> <task_id> <time>").
+    After snapshot_every records the current state is written to a snapshot
+    file and the log is truncated, so replay at startup reads one small JSON
+    file plus the tail of the log.
+    """
+
+    CODES = {'not_started': 'N', 'in_progress': 'R', 'completed': 'C', 'failed': 'F'}
+    STATUSES = {code: status for status, code in CODES.items()}
+
+    def __init__(self, directory: str, spec_path: str, snapshot_every: int = 10000,
+                 state_provider: Optional[Callable[[], Dict[str, str]]] = None):
+        spec_key = hashlib.sha1(os.path.abspath(spec_path).encode('utf-8')).hexdigest()[:12]
+        self.log_path = os.path.join(directory, f"{spec_key}.log")
+        self.snapshot_path = os.path.join(directory, f"{spec_key}.snapshot.json")
+        self.snapshot_every = snapshot_every
+        self.state_provider = state_provider
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+        self._file = None
+
+    def replay(self) -> Dict[str, str]:
+        """Rebuild the last recorded status of every task from the snapshot and the log"""
+        state: Dict[str, str] = {}
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    for task_id, code in json.load(f).get('tasks', {}).items():
+                        state[task_id] = self.STATUSES.get(code, 'not_started')
+            except Exception as e:
+                logger.error(f"Error reading journal snapshot {self.snapshot_path}: {e}")
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    parts = line.split()
+                    # A torn last line from a crash is simply ignored
+                    if len(parts) != 3 or parts[0] not in self.STATUSES:
+                        continue
+                    state[parts[1]] = self.STATUSES[parts[0]]
+        return state
+
+    def record(self, task_id: str, status: str):
+        """Append one transition; flushed to the OS so it survives a process crash"""
+        code = self.CODES.get(status)
+        if code is None:
+            return
+        if self._file is None:
+            self._file = open(self.log_path, 'a', encoding='utf-8')
+        self._file.write(f"{code} {task_id} {time.time():.3f}\n")
+        self._file.flush()
+        self.records += 1
+        if self.records >= self.snapshot_every and self.state_provider:
+            self.snapshot(self.state_provider())
+
+    def snapshot(self, state: Dict[str, str]):
+        """Persist the full state and truncate the log (compaction)"""
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'created_at': time.time(),
+                       'tasks': {task_id: self.CODES[s] for task_id, s in state.items() if s in self.CODES}}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # The snapshot now covers every logged record, so the log can start over
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.log_path, 'w', encoding='utf-8')
+        self.records = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+class DurationHistory:
+    """Persistent per-task duration history used to seed Task.estimated_time
+
+    Entries are keyed by a hash of the normalized task name (numbering,
+    case and whitespace stripped) so estimates survive renumbering, and hold
+    an exponentially weighted moving average of the measured run time.
+    """
+
+    MAX_ENTRIES = 10000
+
+    def __init__(self, path: Optional[str], alpha: float = 0.3, save_interval: float = 5.0):
+        self.path = path
+        self.alpha = alpha
+        self.save_interval = save_interval
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self.load()
+
+    @staticmethod
+    def key_for(name: str) -> str:
+        return hashlib.sha1(normalize_task_name(name).encode('utf-8')).hexdigest()[:16]
+
+    def load(self):
+        """Load the history file if it exists"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('tasks', {})
+            logger.info(f"Loaded duration history for {len(self.entries)} tasks from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading duration history: {e}")
+            self.entries = {}
+
+    def estimate(self, name: str, default: float) -> float:
+        """Estimated run time in minutes, or the default when the task has never run"""
+        entry = self.entries.get(self.key_for(name))
+        if not entry:
+            return default
+        return round(entry['ewma_seconds'] / 60, 3)
+
+    def record(self, task: 'Task'):
+        """Record the measured duration of a completed task"""
+        if not task.started_at or not task.completed_at:
+            return
+        run_seconds = max(0.0, (task.completed_at - task.started_at).total_seconds())
+        key = self.key_for(task.name)
+        entry = self.entries.get(key)
+        if entry:
+            entry['ewma_seconds'] = self.alpha * run_seconds + (1 - self.alpha) * entry['ewma_seconds']
+            entry['samples'] += 1
+        else:
+            entry = self.entries[key] = {'ewma_seconds': run_seconds, 'samples': 1}
+        entry.update({
+            'name': normalize_task_name(task.name)[:120],
+            'last_seconds': run_seconds,
+            'last_wall_seconds': max(0.0, (task.completed_at - task.created_at).total_seconds()),
+            'last_started_at': task.started_at.isoformat(),
+            'last_completed_at': task.completed_at.isoformat()
+        })
+        self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Write the history atomically if it changed"""
+        if not self.path or not self._dirty:
+            return
+        if len(self.entries) > self.MAX_ENTRIES:
+            recent = sorted(self.entries.items(), key=lambda kv: kv[1].get('last_completed_at', ''), reverse=True)
+            self.entries = dict(recent[:self.MAX_ENTRIES])
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'alpha': self.alpha, 'tasks': self.entries}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error saving duration history: {e}")
+
+class ResultCache:
+    """On-disk record of task results, keyed by what the result was computed from
+
+    A task's key hashes its normalized name, its command, the contents of
+    the files matched by its `inputs:` globs and the keys of its
+    dependencies' results, so changing any of them (or anything upstream)
+    changes the key. Only tasks that declare inputs are cached: without
+    them there is no way to tell that nothing changed. The index is kept in
+    least-recently-used order and trimmed to max_entries and max_bytes.
+    """
+
+    INDEX_NAME = 'index.json'
+    OUTPUT_LINES = 20  # output lines kept with each entry
+
+    def __init__(self, directory: str, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 save_interval: float = 5.0):
+        self.directory = directory
+        self.path = os.path.join(directory, self.INDEX_NAME)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.save_interval = save_interval
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._digests: Dict[str, Tuple[int, int, str]] = {}  # path -> (mtime_ns, size, sha256)
+        self._dirty = False
+        self._last_save = 0.0
+        self.load()
+
+    @staticmethod
+    def _entry_size(key: str, entry: Dict[str, Any]) -> int:
+        return len(key) + len(encode_json(entry))
+
+    def load(self):
+        """Load the index if it exists"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get('entries', [])
+            self.entries = OrderedDict((key, entry) for key, entry in entries)
+            self.bytes = sum(self._entry_size(key, entry) for key, entry in self.entries.items())
+            logger.info(f"Loaded {len(self.entries)} cached task results from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading result cache: {e}")
+            self.entries = OrderedDict()
+            self.bytes = 0
+
+    def _digest(self, path: str) -> str:
+        """sha256 of a file, reused while its mtime and size are unchanged"""
+        stat = os.stat(path)
+        known = self._digests.get(path)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        return digest.hexdigest()
+
+    def key_for(self, task: 'Task', dependency_keys: List[str], cwd: str) -> str:
+        """Cache key of a task given its dependencies' result keys (reads the input files)"""
+        files: List[Tuple[str, str]] = []
+        for pattern in task.inputs or []:
+            matches = sorted(glob.glob(os.path.join(cwd, pattern), recursive=True))
+            if not matches:
+                files.append((pattern, 'missing'))
+            for path in matches:
+                if os.path.isfile(path):
+                    files.append((os.path.relpath(path, cwd), self._digest(path)))
+        material = encode_json({
+            'name': normalize_task_name(task.name),
+            'command': task.command,
+            'inputs': files,
+            'dependencies': dependency_keys
+        })
+        return hashlib.sha256(material).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry for a key (marking it recently used), counting the hit or miss"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key: str, task: 'Task', output: List[str]):
+        """Remember a successful result, evicting the least recently used entries over the limits"""
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= self._entry_size(key, old)
+        seconds = (task.completed_at - task.started_at).total_seconds() \
+            if task.started_at and task.completed_at else None
+        entry = self.entries[key] = {
+            'name': normalize_task_name(task.name)[:120],
+            'stored_at': datetime.now().isoformat(),
+            'seconds': seconds,
+            'output': output[-self.OUTPUT_LINES:]
+        }
+        self.bytes += self._entry_size(key, entry)
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.bytes -= self._entry_size(evicted_key, evicted)
+            self.evictions += 1
+        self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Write the index atomically if it changed"""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'entries': list(self.entries.items())}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error saving result cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions
+        }
+
 @dataclass
-class Task:
-    id: str
-    name: str
-    status: str  # 'not_started', 'in_progress', 'completed'
-    priority: int
-    dependencies: List[str]
-    estimated_time: int  # minutes
-    created_at: datetime
-    completed_at: Optional[datetime] = None
+class RetryPolicy:
+    """Exponential backoff with jitter for failed tasks"""
+    base_delay: float = 30.0  # seconds before the first retry
+    max_delay: float = 600.0
+    max_attempts: int = 3  # runs before giving up
+    jitter: float = 0.5  # each delay is randomly shortened by up to this fraction
+
+    def delay(self, attempts: int) -> float:
+        """Backoff before the next run of a task that has failed `attempts` times"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * (1 - self.jitter * random.random())
+
+class LeaseTable:
+    """Task table shared by the agent processes of a cluster, in a SQLite database (WAL mode)
+
+    The coordinator publishes each spec's tasks and dependency edges; any
+    process can then claim a ready task. A claim is a lease: it names the
+    owner, carries a fencing token and expires unless the owner renews it,
+    after which another worker may claim the task again. Finishing a task
+    only counts while the lease is still held, and releases its dependents
+    (completing parents that have no work of their own) in the same
+    transaction. WAL mode lets status reads run alongside the one writer;
+    every write is a short BEGIN IMMEDIATE transaction. All calls go through
+    one thread per process so the event loop never waits on the database.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            spec TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 1,
+            command TEXT,
+            timeout REAL,
+            aggregate INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            unmet INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            ready_at REAL NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_token INTEGER NOT NULL DEFAULT 0,
+            lease_expires REAL,
+            started_at REAL,
+            finished_at REAL,
+            change_seq INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (spec, task_id)
+        );
+        CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, unmet, ready_at);
+        CREATE INDEX IF NOT EXISTS tasks_changes ON tasks (change_seq);
+        CREATE TABLE IF NOT EXISTS deps (
+            spec TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            dep_id TEXT NOT NULL,
+            PRIMARY KEY (spec, dep_id, task_id)
+        );
+        CREATE INDEX IF NOT EXISTS deps_task ON deps (spec, task_id);
+        CREATE TABLE IF NOT EXISTS workers (
+            worker_id TEXT PRIMARY KEY,
+            host TEXT,
+            pid INTEGER,
+            started_at REAL,
+            heartbeat_at REAL,
+            running INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('change_seq', '0'), ('reclaimed', '0'), ('finished', '0');
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        self._thread = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='lease-table')
+
+    async def call(self, method: Callable[..., Any], *args) -> Any:
+        """Run a blocking table operation on the table's thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread, functools.partial(method, *args))
+
+    @contextlib.contextmanager
+    def _write(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _next_seq(self) -> int:
+        self._conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'change_seq'")
+        return int(self._conn.execute("SELECT value FROM meta WHERE key = 'change_seq'").fetchone()[0])
+
+    def set_meta(self, key: str, value: str):
+        with self._write() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def publish(self, spec: str, tasks: List[Task]):
+        """Replace a spec's task graph, keeping the progress of tasks that are still in it"""
+        now = time.time()
+        with self._write() as conn:
+            seq = self._next_seq()
+            existing = {row[0] for row in conn.execute("SELECT task_id FROM tasks WHERE spec = ?", (spec,))}
+            conn.executemany("""
+                INSERT INTO tasks (spec, task_id, name, seq, priority, command, timeout, aggregate, status,
+                                   finished_at, change_seq)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (spec, task_id) DO UPDATE SET
+                    name = excluded.name, seq = excluded.seq, priority = excluded.priority,
+                    command = excluded.command, timeout = excluded.timeout, aggregate = excluded.aggregate,
+                    status = CASE WHEN excluded.status = 'completed' THEN 'completed' ELSE tasks.status END,
+                    change_seq = excluded.change_seq
+            """, [
+                (spec, task.id, task.name, order, task.priority, json.dumps(task.command) if task.command else None,
+                 task.timeout, int(is_aggregate(task)), 'completed' if task.status == 'completed' else 'not_started',
+                 now if task.status == 'completed' else None, seq)
+                for order, task in enumerate(tasks)
+            ])
+            published = {task.id for task in tasks}
+            conn.executemany("DELETE FROM tasks WHERE spec = ? AND task_id = ?",
+                             [(spec, task_id) for task_id in existing - published])
+            conn.execute("DELETE FROM deps WHERE spec = ?", (spec,))
+            conn.executemany("INSERT OR IGNORE INTO deps (spec, task_id, dep_id) VALUES (?, ?, ?)",
+                             [(spec, task.id, dep_id) for task in tasks for dep_id in task.dependencies])
+            conn.execute("""
+                UPDATE tasks SET unmet = (
+                    SELECT COUNT(*) FROM deps JOIN tasks AS dep ON dep.spec = deps.spec AND dep.task_id = deps.dep_id
+                    WHERE deps.spec = tasks.spec AND deps.task_id = tasks.task_id AND dep.status != 'completed'
+                ) WHERE spec = ?
+            """, (spec,))
+            ready = [row[0] for row in conn.execute(
+                "SELECT task_id FROM tasks WHERE spec = ? AND aggregate = 1 AND unmet = 0 AND status != 'completed'",
+                (spec,)
+            )]
+            for task_id in ready:
+                self._complete(spec, task_id, seq, now)
+            conn.execute("UPDATE meta SET value = '0' WHERE key = 'finished'")
+
+    def _complete(self, spec: str, task_id: str, seq: int, now: float):
+        """Mark a task completed and release its dependents, completing parents left with nothing to do"""
+        conn = self._conn
+        stack = [task_id]
+        while stack:
+            task_id = stack.pop()
+            conn.execute("""
+                UPDATE tasks SET status = 'completed', lease_owner = NULL, lease_expires = NULL,
+                                 finished_at = ?, change_seq = ?
+                WHERE spec = ? AND task_id = ?
+            """, (now, seq, spec, task_id))
+            conn.execute("""
+                UPDATE tasks SET unmet = unmet - 1
+                WHERE spec = ? AND unmet > 0 AND status != 'completed'
+                  AND task_id IN (SELECT task_id FROM deps WHERE spec = ? AND dep_id = ?)
+            """, (spec, spec, task_id))
+            stack.extend(row[0] for row in conn.execute("""
+                SELECT tasks.task_id FROM deps JOIN tasks ON tasks.spec = deps.spec AND tasks.task_id = deps.task_id
+                WHERE deps.spec = ? AND deps.dep_id = ? AND tasks.aggregate = 1 AND tasks.unmet = 0
+                  AND tasks.status = 'not_started'
+            """, (spec, task_id)))
+
+    def claim(self, owner: str, retry_policy: RetryPolicy) -> Optional[Dict[str, Any]]:
+        """Lease the highest-priority ready task, or one whose lease expired; None if nothing is claimable
+
+        An expired lease counts as a failed attempt, so a task whose runs keep
+        losing their lease is failed once it is out of attempts instead of
+        being handed out again.
+        """
+        now = time.time()
+        with self._write() as conn:
+            while True:
+                row = conn.execute("""
+                    SELECT * FROM tasks
+                    WHERE aggregate = 0 AND unmet = 0
+                      AND ((status = 'not_started' AND ready_at <= ?) OR (status = 'in_progress' AND lease_expires < ?))
+                    ORDER BY priority DESC, seq LIMIT 1
+                """, (now, now)).fetchone()
+                if row is None:
+                    return None
+                claimed = dict(row)
+                if row['status'] != 'in_progress':
+                    break
+                # The previous owner stopped renewing: count its run as a failed attempt
+                claimed['attempts'] += 1
+                conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'reclaimed'")
+                if claimed['attempts'] < retry_policy.max_attempts:
+                    logger.warning(f"Reclaiming {row['spec']}/{row['task_id']} from {row['lease_owner']} (lease expired)")
+                    break
+                logger.error(f"Giving up on {row['spec']}/{row['task_id']}: its lease expired "
+                             f"{claimed['attempts']} time(s)")
+                conn.execute("""
+                    UPDATE tasks SET status = 'failed', attempts = ?, lease_owner = NULL, lease_expires = NULL,
+                                     finished_at = ?, change_seq = ?
+                    WHERE spec = ? AND task_id = ?
+                """, (claimed['attempts'], now, self._next_seq(), row['spec'], row['task_id']))
+            claimed['lease_token'] += 1
+            conn.execute("""
+                UPDATE tasks SET status = 'in_progress', attempts = ?, lease_owner = ?, lease_token = ?,
+                                 lease_expires = ?, started_at = ?, change_seq = ?
+                WHERE spec = ? AND task_id = ?
+            """, (claimed['attempts'], owner, claimed['lease_token'], now + self.lease_seconds, now,
+                  self._next_seq(), row['spec'], row['task_id']))
+            return claimed
+
+    def renew(self, owner: str, running: int, completed: int, failed: int) -> int:
+        """Extend every lease the owner holds and record its heartbeat; returns the leases renewed"""
+        now = time.time()
+        with self._write() as conn:
+            renewed = conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE lease_owner = ? AND status = 'in_progress'",
+                (now + self.lease_seconds, owner)
+            ).rowcount
+            host, _, pid = owner.rpartition(':')
+            conn.execute("""
+                INSERT INTO workers (worker_id, host, pid, started_at, heartbeat_at, running, completed, failed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (worker_id) DO UPDATE SET
+                    heartbeat_at = excluded.heartbeat_at, running = excluded.running,
+                    completed = excluded.completed, failed = excluded.failed
+            """, (owner, host, int(pid) if pid.isdigit() else None, now, now, running, completed, failed))
+        return renewed
+
+    def finish(self, spec: str, task_id: str, owner: str, token: int, success: bool,
+               retry_policy: RetryPolicy, give_up: bool = False) -> Optional[str]:
+        """Record the outcome of a leased run; returns the task's new status, or None if the lease was lost
+
+        give_up fails the task at once instead of retrying it (it cannot run at all).
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT status, attempts, lease_owner, lease_token FROM tasks WHERE spec = ? AND task_id = ?",
+                (spec, task_id)
+            ).fetchone()
+            if row is None or row['status'] != 'in_progress' or row['lease_owner'] != owner \
+                    or row['lease_token'] != token:
+                return None
+            seq = self._next_seq()
+            if success:
+                self._complete(spec, task_id, seq, now)
+                return 'completed'
+            attempts = row['attempts'] + 1
+            status = 'failed' if give_up or attempts >= retry_policy.max_attempts else 'not_started'
+            ready_at = now + retry_policy.delay(attempts) if status == 'not_started' else 0
+            conn.execute("""
+                UPDATE tasks SET status = ?, attempts = ?, ready_at = ?, lease_owner = NULL, lease_expires = NULL,
+                                 finished_at = ?, change_seq = ?
+                WHERE spec = ? AND task_id = ?
+            """, (status, attempts, ready_at, now, seq, spec, task_id))
+            return status
+
+    def release(self, owner: str, spec: Optional[str] = None, task_id: Optional[str] = None) -> int:
+        """Hand leased tasks back without charging an attempt (on shutdown or cancellation)
+
+        Releases every lease the owner holds, only those of spec when it is
+        given, or a single task (task_id, which needs its spec).
+        """
+        if task_id is not None and spec is None:
+            raise ValueError("Releasing a single task needs its spec")
+        query = "UPDATE tasks SET status = 'not_started', lease_owner = NULL, lease_expires = NULL, change_seq = ? " \
+                "WHERE lease_owner = ? AND status = 'in_progress'"
+        with self._write() as conn:
+            params: Tuple = (self._next_seq(), owner)
+            if spec is not None:
+                query += " AND spec = ?"
+                params += (spec,)
+            if task_id is not None:
+                query += " AND task_id = ?"
+                params += (task_id,)
+            return conn.execute(query, params).rowcount
+
+    def has_pending(self) -> bool:
+        """True while some task is running or could still be claimed"""
+        row = self._conn.execute("""
+            SELECT 1 FROM tasks
+            WHERE aggregate = 0 AND (status = 'in_progress' OR (status = 'not_started' AND unmet = 0)) LIMIT 1
+        """).fetchone()
+        return row is not None
+
+    def changes_since(self, seq: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """Tasks whose state changed after change sequence seq, and the latest sequence"""
+        rows = [dict(row) for row in self._conn.execute("""
+            SELECT spec, task_id, status, attempts, started_at, finished_at, change_seq
+            FROM tasks WHERE change_seq > ? ORDER BY change_seq
+        """, (seq,))]
+        return (rows[-1]['change_seq'] if rows else seq), rows
+
+    def status(self) -> Dict[str, Any]:
+        """Cluster-wide task counts, leases and workers"""
+        now = time.time()
+        conn = self._conn
+        counts = dict.fromkeys(TASK_STATUSES, 0)
+        specs: Dict[str, Dict[str, int]] = {}
+        for row in conn.execute("SELECT spec, status, COUNT(*) FROM tasks GROUP BY spec, status"):
+            counts[row[1]] = counts.get(row[1], 0) + row[2]
+            specs.setdefault(row[0], dict.fromkeys(TASK_STATUSES, 0))[row[1]] = row[2]
+        leases = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(lease_expires < ?), 0) FROM tasks WHERE status = 'in_progress'
+        """, (now,)).fetchone()
+        workers = [
+            dict(row, heartbeat_age_seconds=now - row['heartbeat_at'],
+                 alive=now - row['heartbeat_at'] <= self.lease_seconds)
+            for row in conn.execute("SELECT * FROM workers ORDER BY worker_id")
+        ]
+        return {
+            'db': self.path,
+            'lease_seconds': self.lease_seconds,
+            'tasks': counts,
+            'total_tasks': sum(counts.values()),
+            'specs': specs,
+            'active_leases': leases[0] - leases[1],
+            'expired_leases': leases[1],
+            'reclaimed_leases': int(self.get_meta('reclaimed') or 0),
+            'change_seq': int(self.get_meta('change_seq') or 0),
+            'finished': self.get_meta('finished') == '1',
+            'workers': workers,
+            'alive_workers': sum(1 for worker in workers if worker['alive'])
+        }
+
+    def close(self):
+        self._thread.shutdown(wait=True)
+        self._conn.close()
+
+class CircuitBreaker:
+    """Trips when too many of the most recent task runs failed
+
+    Outcomes of the last `window` runs are kept in a ring buffer with a
+    running failure count. Once at least min_samples are recorded and the
+    failure share reaches threshold, recording a failure returns True and
+    the window starts over, so the breaker only trips again on fresh failures.
+    """
+
+    def __init__(self, threshold: float = 0.5, window: int = 20, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.min_samples = min(window, 5)
+        self.outcomes: deque = deque(maxlen=window)
+        self.failures = 0
+        self.trips = 0
+
+    def record(self, success: bool) -> bool:
+        """Add a run's outcome; True if this trips the breaker"""
+        if self.threshold <= 0:
+            return False
+        if len(self.outcomes) == self.outcomes.maxlen and not self.outcomes[0]:
+            self.failures -= 1
+        self.outcomes.append(success)
+        if not success:
+            self.failures += 1
+        if not success and len(self.outcomes) >= self.min_samples and self.failure_rate() >= self.threshold:
+            self.trips += 1
+            self.outcomes.clear()
+            self.failures = 0
+            return True
+        return False
+
+    def failure_rate(self) -> float:
+        return self.failures / len(self.outcomes) if self.outcomes else 0.0
+
+class TaskExecutor(abc.ABC):
+    """Does the actual work of a task; execute_task handles status, retries and history around it"""
+    name = 'base'
+    simulated = False  # results are made up: never written to the spec, journal, cache or history
+
+    @abc.abstractmethod
+    async def run(self, task: Task, output_key: Optional[str] = None) -> bool:
+        """Run the task and return True on success; its output is kept under output_key (default: task.id)"""
+
+    def can_run(self, task: Task) -> bool:
+        """False if the task has nothing this executor could run (retrying won't help)"""
+        return True
+
+    def output(self, task_id: str) -> List[str]:
+        """Most recent output lines captured for a task"""
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        return {'executor': self.name}
+
+class SimulatedExecutor(TaskExecutor):
+    """Pretends every task succeeds after a fixed delay (for tests and dry runs)"""
+    name = 'simulated'
+    simulated = True
+
+    def __init__(self, delay: float = 2.0):
+        self.delay = delay
+
+    async def run(self, task: Task, output_key: Optional[str] = None) -> bool:
+        # This would integrate with Kiro's task execution API
+        logger.info(f"Executing Kiro task: {task.name}")
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        return True
+
+class SubprocessExecutor(TaskExecutor):
+    """Runs a task's command as a child process; tasks without one cannot run
+
+    stdout and stderr are read line by line into a per-task ring buffer, so a
+    chatty command costs at most output_lines lines of memory. The exit code
+    decides success. A command that outlives its timeout (or whose task is
+    cancelled) is killed along with its process group. At most max_processes
+    children run at once, however many workers there are.
+    """
+    name = 'subprocess'
+    MAX_RETAINED_OUTPUTS = 1000  # tasks whose output buffers are kept
+    LINE_LIMIT = 64 * 1024  # longer lines are dropped with a marker
+
+    def __init__(self, cwd: str, timeout: float = 600.0, max_processes: int = 4, output_lines: int = 200):
+        self.cwd = cwd
+        self.timeout = timeout
+        self.max_processes = max_processes
+        self.output_lines = output_lines
+        self.outputs: 'OrderedDict[str, deque]' = OrderedDict()
+        self.running = 0
+        self.started = 0
+        self.timed_out = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def can_run(self, task: Task) -> bool:
+        return bool(task.command)
+
+    async def run(self, task: Task, output_key: Optional[str] = None) -> bool:
+        output_key = output_key or task.id
+        if not task.command:
+            self.outputs[output_key] = deque([f"agent: no command to run; {NO_COMMAND_HINT}"], maxlen=self.output_lines)
+            logger.error(f"Task {task.name} has no command to run")
+            return False
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_processes)
+        async with self._slots:
+            return await self._run_command(task, output_key)
+
+    async def _run_command(self, task: Task, output_key: str) -> bool:
+        buffer: deque = deque(maxlen=self.output_lines)
+        self.outputs.pop(output_key, None)
+        self.outputs[output_key] = buffer
+        while len(self.outputs) > self.MAX_RETAINED_OUTPUTS:
+            self.outputs.popitem(last=False)
+        
+        timeout = task.timeout or self.timeout
+        logger.info(f"Running command for {task.name}: {shlex.join(task.command)[:200]}")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *task.command,
+                cwd=self.cwd,
+                env=dict(os.environ, KIRO_TASK_ID=task.id, KIRO_TASK_NAME=task.name),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=self.LINE_LIMIT,
+                start_new_session=True
+            )
+        except OSError as e:
+            buffer.append(f"agent: failed to start command: {e}")
+            logger.error(f"Could not start command for {task.name}: {e}")
+            return False
+        
+        self.running += 1
+        self.started += 1
+        io = asyncio.gather(
+            self._pump(process.stdout, buffer, 'stdout'),
+            self._pump(process.stderr, buffer, 'stderr'),
+            process.wait()
+        )
+        finished = False
+        try:
+            await asyncio.wait_for(io, timeout)
+            finished = True
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            buffer.append(f"agent: killed after {timeout:g}s timeout")
+            logger.error(f"Command for {task.name} timed out after {timeout:g}s")
+            return False
+        finally:
+            if not finished:
+                # The shell may be gone while grandchildren still hold its pipes, so kill the whole session
+                self._kill(process)
+            self.running -= 1
+            if io.done() and not io.cancelled():
+                io.exception()  # retrieve the CancelledError a timeout or cancellation leaves on it
+        
+        if process.returncode != 0:
+            logger.error(f"Command for {task.name} exited with status {process.returncode}")
+            for line in list(buffer)[-5:]:
+                logger.error(f"  {line}")
+            return False
+        return True
+
+    async def _pump(self, stream: asyncio.StreamReader, buffer: deque, label: str):
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                buffer.append(f"{label}: <line longer than {self.LINE_LIMIT} bytes dropped>")
+                continue
+            if not line:
+                return
+            buffer.append(f"{label}: {line.decode('utf-8', errors='replace').rstrip()}")
+
+    @staticmethod
+    def _kill(process: asyncio.subprocess.Process):
+        """Kill the command's process group (its session), whether or not the command itself has exited"""
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, signal.SIGKILL)
+            elif process.returncode is None:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def output(self, task_id: str) -> List[str]:
+        buffer = self.outputs.get(task_id)
+        return list(buffer) if buffer is not None else []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'executor': self.name,
+            'running_processes': self.running,
+            'max_processes': self.max_processes,
+            'processes_started': self.started,
+            'processes_timed_out': self.timed_out
+        }
+
+def create_executor(config: AgentConfig, cwd: str) -> TaskExecutor:
+    """Build the executor selected by config.executor"""
+    if config.executor == 'simulated':
+        return SimulatedExecutor()
+    return SubprocessExecutor(cwd, config.task_timeout, config.max_processes, config.output_lines)
+
+class AgentMetrics:
+    """Counters and latency histograms behind get_metrics and the Prometheus export"""
+
+    UTILISATION_BOUNDS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.task_duration = Histogram(Histogram.DURATION_BOUNDS)
+        self.task_runs = {'completed': 0, 'failed': 0}
+        self.busy_seconds = 0.0
+        self.busy_workers = Histogram(self.UTILISATION_BOUNDS)  # share of workers busy, sampled at each dispatch
+        self.requests: Dict[Tuple[str, str], Histogram] = {}  # (method, tool) -> latency
+
+    def task_finished(self, seconds: float, success: bool):
+        self.task_duration.observe(seconds)
+        self.busy_seconds += seconds
+        self.task_runs['completed' if success else 'failed'] += 1
+
+    def request_finished(self, method: str, tool: str, seconds: float):
+        histogram = self.requests.get((method, tool))
+        if histogram is None:
+            histogram = self.requests[(method, tool)] = Histogram(Histogram.LATENCY_BOUNDS)
+        histogram.observe(seconds)
+
+    def utilisation(self, agent: 'KiroAutomationAgent') -> float:
+        """Share of worker time spent executing tasks since the agent started"""
+        now = datetime.now()
+        running = sum((now - w.started_at).total_seconds() for w in agent.workers.values() if w.started_at)
+        capacity = (time.monotonic() - self.started) * max(1, agent.config.workers)
+        return min(1.0, (self.busy_seconds + running) / capacity) if capacity > 0 else 0.0
+
+    def snapshot(self, agent: 'KiroAutomationAgent') -> Dict[str, Any]:
+        return {
+            'uptime_seconds': time.monotonic() - self.started,
+            'tasks': agent.status_counts(),
+            'task_runs': dict(self.task_runs),
+            'task_duration_seconds': self.task_duration.to_dict(),
+            'queue_wait_seconds': agent.scheduler.queue_wait.to_dict(),
+            'mcp_request_seconds': {
+                f"{method}:{tool}" if tool else method: histogram.to_dict()
+                for (method, tool), histogram in sorted(self.requests.items())
+            },
+            'executor': dict(
+                agent.executor.stats(),
+                utilisation=self.utilisation(agent),
+                busy_seconds=self.busy_seconds,
+                busy_workers_ratio=self.busy_workers.to_dict()
+            )
+        }
+
+    def prometheus(self, agent: 'KiroAutomationAgent') -> str:
+        """Render the metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, hist: Histogram, labels: str = ''):
+            for bound, count in hist.cumulative():
+                lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {count}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ''
+            lines.append(f"{name}_sum{suffix} {hist.sum:.6f}")
+            lines.append(f"{name}_count{suffix} {hist.count}")
+
+        metric('kiro_tasks', 'gauge', 'Tasks by status')
+        for status, count in agent.status_counts().items():
+            lines.append(f'kiro_tasks{{status="{status}"}} {count}')
+        if agent.specs:
+            metric('kiro_spec_tasks', 'gauge', 'Tasks by spec and status')
+            for name, graph in agent.specs.items():
+                for status, count in graph.scheduler.counts.counts.items():
+                    lines.append(f'kiro_spec_tasks{{spec="{name}",status="{status}"}} {count}')
+            metric('kiro_spec_worker_seconds_total', 'counter', 'Worker time spent on each spec')
+            for name, graph in agent.specs.items():
+                lines.append(f'kiro_spec_worker_seconds_total{{spec="{name}"}} {graph.share.served_seconds:.6f}')
+        metric('kiro_task_runs_total', 'counter', 'Task executions by outcome')
+        for outcome, count in self.task_runs.items():
+            lines.append(f'kiro_task_runs_total{{outcome="{outcome}"}} {count}')
+        metric('kiro_task_duration_seconds', 'histogram', 'Time spent executing a task')
+        histogram('kiro_task_duration_seconds', self.task_duration)
+        metric('kiro_task_queue_wait_seconds', 'histogram', 'Time a ready task waited for a worker')
+        histogram('kiro_task_queue_wait_seconds', agent.scheduler.queue_wait)
+        metric('kiro_mcp_request_duration_seconds', 'histogram', 'MCP request handling time by method and tool')
+        for (method, tool), hist in sorted(self.requests.items()):
+            histogram('kiro_mcp_request_duration_seconds', hist, f'method="{method}",tool="{tool}",')
+        metric('kiro_workers_busy_ratio', 'histogram', 'Share of workers busy, sampled at each dispatch')
+        histogram('kiro_workers_busy_ratio', self.busy_workers)
+        metric('kiro_executor_utilisation', 'gauge', 'Share of worker time spent executing tasks')
+        lines.append(f"kiro_executor_utilisation {self.utilisation(agent):.6f}")
+        metric('kiro_executor_busy_seconds_total', 'counter', 'Worker time spent on finished task runs')
+        lines.append(f"kiro_executor_busy_seconds_total {self.busy_seconds:.6f}")
+        stats = agent.executor.stats()
+        if 'running_processes' in stats:
+            metric('kiro_child_processes', 'gauge', 'Task commands currently running')
+            lines.append(f"kiro_child_processes {stats['running_processes']}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, agent: 'KiroAutomationAgent', path: str):
+        """Atomically replace path with the current metrics (for a textfile collector)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus(agent))
+        os.replace(tmp_path, path)
+
+class TraceRecorder:
+    """Opt-in timing spans exported as a Chrome trace-event file
+
+    Task runs are complete ('X') events on their worker's track, MCP
+    requests are async events (they overlap freely) and tracemalloc totals
+    are counters. Load the file in chrome://tracing or ui.perfetto.dev.
+    Every cprofile_every-th task switches cProfile on until it finishes (it
+    sees the whole event loop meanwhile, other tasks included) and every
+    tracemalloc_every-th task dumps a tracemalloc snapshot, both next to
+    the trace. The agent only holds a recorder when profiling is enabled.
+    """
+
+    MAX_EVENTS = 1000000  # later events are counted, not kept
+    MAX_SNAPSHOTS = 20  # tracemalloc snapshot files kept
+
+    def __init__(self, directory: str, cprofile_every: int = 0, tracemalloc_every: int = 0):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f"trace-{self.pid}.json")
+        self.cprofile_every = cprofile_every
+        self.tracemalloc_every = tracemalloc_every
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.tasks_started = 0
+        self._origin = time.perf_counter()
+        self._async_ids = itertools.count(1)
+        self._profiler: Optional[cProfile.Profile] = None
+        self._profiled_task: Optional[str] = None
+        self._profiled_run = 0
+        self._snapshots: deque = deque()
+        if tracemalloc_every and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.name_thread(0, 'direct / MCP')
+
+    def now(self) -> float:
+        """Microseconds since the recorder started (the trace's time base)"""
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _add(self, event: Dict[str, Any]):
+        if len(self.events) >= self.MAX_EVENTS:
+            self.dropped += 1
+            return
+        event['pid'] = self.pid
+        self.events.append(event)
+
+    def name_thread(self, tid: int, name: str):
+        self._add({'name': 'thread_name', 'ph': 'M', 'tid': tid, 'args': {'name': name}})
+
+    def complete(self, name: str, cat: str, start: float, tid: int, args: Optional[Dict] = None):
+        """Record a span that began at start (from now()) and ends now"""
+        self._add({'name': name, 'cat': cat, 'ph': 'X', 'ts': start, 'dur': self.now() - start,
+                   'tid': tid, 'args': args or {}})
+
+    def begin_async(self, name: str, cat: str) -> int:
+        span_id = next(self._async_ids)
+        self._add({'name': name, 'cat': cat, 'ph': 'b', 'ts': self.now(), 'id': span_id, 'tid': 0})
+        return span_id
+
+    def end_async(self, name: str, cat: str, span_id: int, args: Optional[Dict] = None):
+        self._add({'name': name, 'cat': cat, 'ph': 'e', 'ts': self.now(), 'id': span_id, 'tid': 0,
+                   'args': args or {}})
+
+    def counter(self, name: str, values: Dict[str, float]):
+        self._add({'name': name, 'ph': 'C', 'ts': self.now(), 'tid': 0, 'args': values})
+
+    def task_started(self, task_id: str):
+        """Count a task run and start the samplers that are due"""
+        self.tasks_started += 1
+        n = self.tasks_started
+        if self.cprofile_every and n % self.cprofile_every == 0 and self._profiler is None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:  # another profiler is already active
+                logger.warning(f"Not profiling task {task_id}: {e}")
+            else:
+                self._profiler = profiler
+                self._profiled_task = task_id
+                self._profiled_run = n
+        if self.tracemalloc_every and n % self.tracemalloc_every == 0 and tracemalloc.is_tracing():
+            self._snapshot_memory(n)
+
+    def task_finished(self, task_id: str):
+        if self._profiler is not None and self._profiled_task == task_id:
+            self._stop_profiler()
+
+    def _stop_profiler(self):
+        profiler, self._profiler = self._profiler, None
+        profiler.disable()
+        path = os.path.join(self.directory, f"cprofile-{self.pid}-{self._profiled_run}-{self._profiled_task}.prof")
+        try:
+            profiler.dump_stats(path)
+        except OSError as e:
+            logger.error(f"Error writing profile {path}: {e}")
+        self._profiled_task = None
+
+    def _snapshot_memory(self, n: int):
+        current, peak = tracemalloc.get_traced_memory()
+        self.counter('tracemalloc', {'current_bytes': current, 'peak_bytes': peak})
+        path = os.path.join(self.directory, f"tracemalloc-{self.pid}-{n}.snapshot")
+        try:
+            tracemalloc.take_snapshot().dump(path)
+        except OSError as e:
+            logger.error(f"Error writing tracemalloc snapshot {path}: {e}")
+            return
+        self._snapshots.append(path)
+        while len(self._snapshots) > self.MAX_SNAPSHOTS:
+            try:
+                os.remove(self._snapshots.popleft())
+            except OSError:
+                pass
+
+    def write(self):
+        """Atomically rewrite the trace file with every event recorded so far"""
+        if self._profiler is not None:
+            self._stop_profiler()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(encode_json({
+                    'traceEvents': self.events,
+                    'displayTimeUnit': 'ms',
+                    'otherData': {'tasks_started': self.tasks_started, 'dropped_events': self.dropped}
+                }))
+            os.replace(tmp_path, self.path)
+            logger.info(f"Wrote {len(self.events)} trace events to {self.path}")
+        except OSError as e:
+            logger.error(f"Error writing trace {self.path}: {e}")
+
+class SessionRegistry:
+    """The agent's execution sessions, of which at most one runs at a time
+
+    The agent has a single task table and worker pool, so starting a session
+    for the specs that are already running returns the running session
+    (single-flight) and starting a different one is refused until it stops.
+    Each session keeps the asyncio task of its run: stopping cancels it, so
+    workers kill their commands and hand their tasks back to the queue
+    instead of finishing them first. The last MAX_FINISHED finished sessions
+    are kept for list_sessions.
+    """
+
+    MAX_FINISHED = 20
+    STOP_TIMEOUT = 10.0  # seconds a stop waits for the run to clean up
 
-class KiroAutomationAgent:
     def __init__(self):
-        self.tasks: Dict[str, Task] = {}
+        self.sessions: 'OrderedDict[str, ExecutionSession]' = OrderedDict()
+
+    def active(self) -> Optional[ExecutionSession]:
+        for session in reversed(self.sessions.values()):
+            if session.state in ('running', 'stopping'):
+                return session
+        return None
+
+    def start(self, mode: str, spec_paths: List[str],
+              run: Callable[[], Awaitable[Any]]) -> Tuple[ExecutionSession, bool]:
+        """Start run() as a new session, or return the matching running one; (session, started)"""
+        active = self.active()
+        if active is not None:
+            if active.state == 'running' and active.matches(mode, spec_paths):
+                return active, False
+            raise RuntimeError(
+                f"Session {active.session_id} is already {active.state}; call stop_session first"
+            )
+        session = ExecutionSession(uuid.uuid4().hex[:12], mode, list(spec_paths), datetime.now())
+        session.task = asyncio.ensure_future(run())
+        session.task.add_done_callback(functools.partial(self._finished, session))
+        self.sessions[session.session_id] = session
+        finished = [s for s in self.sessions.values() if s.task.done()]
+        for old in finished[:max(0, len(finished) - self.MAX_FINISHED)]:
+            del self.sessions[old.session_id]
+        logger.info(f"Started session {session.session_id} ({mode}: {', '.join(spec_paths) or 'cluster tasks'})")
+        return session, True
+
+    def _finished(self, session: ExecutionSession, task: asyncio.Task):
+        session.finished_at = datetime.now()
+        if task.cancelled() or session.state == 'stopping':
+            session.state = 'stopped'
+        elif task.exception() is not None:
+            session.state = 'failed'
+            session.error = str(task.exception())
+            logger.error(f"Session {session.session_id} failed: {session.error}")
+        else:
+            session.state = 'completed'
+        logger.info(f"Session {session.session_id} {session.state}")
+
+    async def stop(self, session_id: str) -> Optional[ExecutionSession]:
+        """Cancel a session's run and wait (briefly) for its workers to hand their tasks back"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if not session.task.done():
+            session.state = 'stopping'
+            session.task.cancel()
+            await asyncio.wait({session.task}, timeout=self.STOP_TIMEOUT)
+        return session
+
+    async def stop_all(self) -> List[ExecutionSession]:
+        return [await self.stop(session.session_id)
+                for session in list(self.sessions.values()) if not session.task.done()]
+
+    def to_list(self) -> List[Dict]:
+        return [session.to_dict() for session in reversed(self.sessions.values())]
+
+class KiroAutomationAgent:
+    # Shared with the spec graphs of a multi-spec run instead of created per spec
+    SHARED_COMPONENTS = ('config', 'history', 'result_cache', 'workspace_path', 'executor', 'retry_policy',
+                         'breaker', 'metrics', 'tracer')
+
+    def __init__(self, config: Optional[AgentConfig] = None, owner: Optional['KiroAutomationAgent'] = None,
+                 namespace: Optional[str] = None):
+        self.owner = owner  # the agent whose worker pool runs this spec graph, if any
+        self.namespace = namespace  # spec name that qualifies this graph's task ids
+        if owner is not None:
+            for name in self.SHARED_COMPONENTS:
+                setattr(self, name, getattr(owner, name))
+        else:
+            self.config = config or AgentConfig.from_env()
+            self.workspace_path = os.getcwd()
+            self.executor = create_executor(self.config, self.workspace_path)
+            # A dry run must not leave made-up results where a later real run would read them back
+            dry_run = self.executor.simulated
+            self.history = DurationHistory(None if dry_run else self.config.history_path)
+            self.result_cache: Optional[ResultCache] = None
+            if self.config.cache_dir and not dry_run:
+                self.result_cache = ResultCache(
+                    self.config.cache_dir, self.config.cache_max_entries, self.config.cache_max_bytes
+                )
+            self.retry_policy = RetryPolicy(
+                self.config.retry_delay, self.config.retry_max_delay, self.config.max_attempts
+            )
+            self.breaker = CircuitBreaker(
+                self.config.breaker_threshold, self.config.breaker_window, self.config.breaker_cooldown
+            )
+            self.metrics = AgentMetrics()
+            self.sessions = SessionRegistry()
+            self.tracer: Optional[TraceRecorder] = None
+            if self.config.profile_dir:
+                self.tracer = TraceRecorder(
+                    self.config.profile_dir, self.config.profile_cprofile_every, self.config.profile_tracemalloc_every
+                )
+        self.tasks: Dict[str, Task] = create_task_store(self.config.task_store)
+        self.scheduler = TaskScheduler(self.tasks, self.config.schedule)
+        self.scheduler.on_aggregate_ready = self._complete_aggregate
+        if owner is not None:
+            self.scheduler.queue_wait = owner.scheduler.queue_wait
+        self._result_keys: Dict[str, str] = {}  # task id -> key of the result it produced this process
         self.running = False
-        self.current_task: Optional[str] = None
-        self.workspace_path = os.getcwd()
+        self.workers: Dict[int, WorkerState] = {}
+        self.spec_index: Optional[SpecIndex] = None
+        self.watcher: Optional[SpecWatcher] = None
+        self.status_writer: Optional[SpecStatusWriter] = None
+        self.journal: Optional[TaskJournal] = None
+        # Called on every status change with the task, its new status and its spec (None for a single spec)
+        self.state_listeners: List[Callable[[Task, str, Optional[str]], None]] = []
+        self.spec_path: Optional[str] = None
+        self.specs: 'OrderedDict[str, KiroAutomationAgent]' = OrderedDict()  # namespace -> graph, multi-spec runs
+        self.share = SpecShare()
+        self._dispatch_wakeup: Optional[asyncio.Event] = None
+        self.cluster: Optional[ClusterNode] = None  # set when this process shares its tasks with others
+        if owner is None and self.config.cluster_role:
+            self.cluster = ClusterNode(
+                self, LeaseTable(self.config.cluster_db, self.config.lease_seconds),
+                self.config.cluster_role, self.config.cluster_poll_interval
+            )
         
     async def load_tasks_from_spec(self, spec_path: str) -> List[Task]:
         """Load tasks from the tasks.md file"""
         try:
-            with open(spec_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
             tasks = []
-            lines = content.split('\n')
-            
-            for line in lines:
-                if '- [ ]' in line:  # Incomplete task
-                    # Extract task info
-                    task_text = line.split('- [ ]')[1].strip()
-                    if task_text:
-                        task_id = f"task_{len(tasks) + 1}"
-                        task = Task(
-                            id=task_id,
-                            name=task_text,
-                            status='not_started',
-                            priority=1,
-                            dependencies=[],
-                            estimated_time=30,  # Default 30 minutes
-                            created_at=datetime.now()
-                        )
-                        tasks.append(task)
-                        self.tasks[task_id] = task
+            completed = 0
+            index = SpecIndex()
+            for task in iter_spec_tasks(spec_path, index=index):
+                task.estimated_time = self.history.estimate(task.name, DEFAULT_ESTIMATED_TIME)
+                if task.status == 'completed':
+                    completed += 1
+                self.tasks[task.id] = task
+                tasks.append(self.tasks[task.id])
             
-            logger.info(f"Loaded {len(tasks)} tasks from {spec_path}")
+            self.spec_index = index
+            if self.config.write_back and not self.executor.simulated:
+                if self.status_writer:
+                    self.status_writer.flush()
+                self.status_writer = SpecStatusWriter(
+                    spec_path, self.config.flush_interval, self.config.flush_batch, self._on_status_flush,
+                    is_stale=lambda: self.watcher is not None and self.watcher.has_unseen_changes()
+                )
+            logger.info(f"Loaded {len(tasks)} tasks from {spec_path} ({completed} already completed)")
+            if self.config.journal_dir and not self.executor.simulated:
+                self.recover_from_journal(spec_path)
+            self.scheduler.counts.reset(self.tasks.values())
+            self.scheduler.progress.reset()
             return tasks
             
         except Exception as e:
             logger.error(f"Error loading tasks: {e}")
             return []
     
+    def recover_from_journal(self, spec_path: str):
+        """Restore task states recorded by a previous run of this spec
+
+        Tasks that run left in progress are re-executed ('rerun') or taken as
+        done ('complete') according to the recovery policy. The recovered
+        state is then compacted into a fresh snapshot.
+        """
+        if self.journal:
+            self.journal.close()
+        self.journal = TaskJournal(
+            self.config.journal_dir, spec_path, self.config.snapshot_every,
+            state_provider=lambda: {t.id: t.status for t in self.tasks.values() if t.status != 'not_started'}
+        )
+        started = time.perf_counter()
+        state = self.journal.replay()
+        restored = interrupted = 0
+        for task_id, status in state.items():
+            task = self.tasks.get(task_id)
+            if task is None or task.status == 'completed':
+                continue
+            if status == 'in_progress':
+                interrupted += 1
+                if self.config.recovery_policy != 'complete':
+                    continue
+                status = 'completed'
+            if status == 'completed':
+                task.status = 'completed'
+                restored += 1
+                # The crashed run may not have ticked the checkbox yet
+                if self.status_writer:
+                    self.status_writer.mark(task, True)
+        self.journal.snapshot({t.id: t.status for t in self.tasks.values() if t.status != 'not_started'})
+        if state:
+            logger.info(
+                f"Recovered {restored} completed task(s) from journal in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms; {interrupted} interrupted task(s) "
+                f"handled with policy '{self.config.recovery_policy}'"
+            )
+    
+    async def reload_spec(self, spec_path: str) -> Dict[str, int]:
+        """Merge edits to the spec file into the live task table
+
+        Compares per-line hashes with the last parse to find the changed
+        region, widens it to the surrounding restart lines (headings or
+        top-level items) and re-parses only that range. Tasks after the
+        region just have their line numbers and offsets shifted. Running
+        tasks are never interrupted; removed ones are dropped when they finish.
+        A checkbox ticked in the file completes the task, but unticking does
+        not reset a task the agent already completed. A finished section that
+        gains a new open subtask is reopened.
+        """
+        old = self.spec_index
+        if old is None:
+            await self.load_tasks_from_spec(spec_path)
+            self.scheduler.rebuild()
+            return {'added': len(self.tasks), 'removed': 0, 'updated': 0}
+        
+        new = SpecIndex.scan(spec_path)
+        old_count, new_count = len(old), len(new)
+        limit = min(old_count, new_count)
+        prefix = 0
+        while prefix < limit and old.hashes[prefix] == new.hashes[prefix]:
+            prefix += 1
+        if prefix == old_count == new_count:
+            self.spec_index = new
+            return {'added': 0, 'removed': 0, 'updated': 0}
+        suffix = 0
+        while suffix < limit - prefix and old.hashes[old_count - 1 - suffix] == new.hashes[new_count - 1 - suffix]:
+            suffix += 1
+        
+        # Widen [start, end) to lines where both versions restart with an empty parser stack
+        line_delta = new_count - old_count
+        start = prefix
+        while start > 0 and not (new.is_restart(start) and old.is_restart(start)):
+            start -= 1
+        new_end = new_count - suffix
+        while new_end < new_count and not (new.is_restart(new_end) and old.is_restart(new_end - line_delta)):
+            new_end += 1
+        old_end = new_end - line_delta
+        
+        old_region = [t for t in self.tasks.values() if t.line_number is not None and start < t.line_number <= old_end]
+        parsed = self._parse_region(spec_path, new, start, new_end)
+        if self._shifts_later_duplicates(old_region, parsed):
+            # Identical top-level items after the region would be renumbered: re-parse everything
+            start, new_end, old_end = 0, new_count, old_count
+            old_region = [t for t in self.tasks.values() if t.line_number is not None]
+            parsed = self._parse_region(spec_path, new, start, new_end)
+        
+        byte_delta = new.offset_at(new_end) - old.offset_at(old_end)
+        for task in self.tasks.values():
+            if task.line_number is not None and task.line_number > old_end:
+                task.line_number += line_delta
+                task.checkbox_offset += byte_delta
+        for task in old_region:
+            self.scheduler.unindex(task)
+        
+        added = updated = 0
+        region_tasks: List[Task] = []
+        for parsed_task in parsed:
+            task = self.tasks.get(parsed_task.id)
+            if task is None:
+                parsed_task.estimated_time = self.history.estimate(parsed_task.name, DEFAULT_ESTIMATED_TIME)
+                self.tasks[parsed_task.id] = parsed_task
+                task = self.tasks[parsed_task.id]
+                added += 1
+            else:
+                if (task.name, task.dependencies, task.command, task.timeout, task.inputs) != \
+                        (parsed_task.name, parsed_task.dependencies, parsed_task.command, parsed_task.timeout,
+                         parsed_task.inputs):
+                    updated += 1
+                task.name = parsed_task.name
+                task.command = parsed_task.command
+                task.timeout = parsed_task.timeout
+                task.inputs = parsed_task.inputs
+                task.parent = parsed_task.parent
+                task.dependencies = parsed_task.dependencies
+                task.line_number = parsed_task.line_number
+                task.checkbox_offset = parsed_task.checkbox_offset
+                if parsed_task.status == 'completed' and task.status in ('not_started', 'failed'):
+                    task.status = 'completed'
+                    task.completed_at = datetime.now()
+                    updated += 1
+            region_tasks.append(task)
+        
+        region_ids = {task.id for task in region_tasks}
+        removed = [task for task in old_region if task.id not in region_ids]
+        for task in removed:
+            task.line_number = None
+            task.checkbox_offset = None
+            self.scheduler.remove_task(task.id)
+        self.scheduler.counts.reset(self.tasks.values())
+        progress = self.scheduler.progress
+        progress.reset()
+        for task in region_tasks:
+            if (task.status == 'completed' and is_aggregate(task)
+                    and progress.done.get(task.id, 0) < progress.total.get(task.id, 0)):
+                # A subtask was added under a finished section, so it is open again
+                self._set_status(task, 'not_started')
+                task.completed_at = None
+                self._record_status(task.id, 'not_started')
+                updated += 1
+        self.scheduler.add_tasks(region_tasks)
+        self.spec_index = new
+        
+        logger.info(
+            f"Reloaded {spec_path} lines {start + 1}-{new_end}: "
+            f"{added} added, {len(removed)} removed, {updated} updated"
+        )
+        return {'added': added, 'removed': len(removed), 'updated': updated}
+    
+    def _parse_region(self, spec_path: str, index: SpecIndex, start: int, end: int) -> List[Task]:
+        """Parse lines [start, end) of the spec, numbering duplicates after the items before it"""
+        return list(iter_spec_tasks(
+            spec_path,
+            start_offset=index.offset_at(start),
+            end_offset=index.offset_at(end),
+            first_line=start + 1,
+            root_counts=_PrefixRootCounts(self.tasks, start + 1)
+        ))
+    
+    def _shifts_later_duplicates(self, old_region: List[Task], parsed: List[Task]) -> bool:
+        """True if the region gained or lost a top-level item that also appears after it"""
+        def root_bases(tasks: List[Task]) -> Dict[str, int]:
+            counts: Dict[str, int] = {}
+            for task in tasks:
+                if task.parent is None:
+                    base_id = task.id.split('-', 1)[0]
+                    counts[base_id] = counts.get(base_id, 0) + 1
+            return counts
+        
+        old_counts, new_counts = root_bases(old_region), root_bases(parsed)
+        region_end = max((t.line_number for t in old_region), default=0)
+        for base_id in set(old_counts) | set(new_counts):
+            if old_counts.get(base_id) == new_counts.get(base_id):
+                continue
+            occurrence = 1
+            while True:
+                task = self.tasks.get(occurrence_id(base_id, occurrence))
+                if task is None:
+                    break
+                if task.parent is None and task.line_number and task.line_number > region_end:
+                    return True
+                occurrence += 1
+        return False
+    
     async def execute_task(self, task_id: str) -> bool:
         """Execute a single task"""
         if task_id not in self.tasks:
@@ -80,165 +3185,955 @@ class KiroAutomationAgent:
         if task.status == 'completed':
             logger.info(f"Task {task_id} already completed")
             return True
+        if is_aggregate(task):
+            if self._dependency_keys(task) is None:
+                logger.error(f"Task {task.name} is a section with unfinished subtasks")
+                return False
+            self._complete_aggregate(task_id)
+            return True
+        
+        if not self.executor.can_run(task):
+            # Nothing to run, so retrying is pointless and it is no sign of a failing service either
+            logger.error(f"Task {task.name} has no command; marking it failed ({NO_COMMAND_HINT})")
+            self._set_status(task, 'failed')
+            self.scheduler.task_finished(task_id, False)
+            await self.update_task_status(task_id, 'failed')
+            return False
         
         logger.info(f"Starting task: {task.name}")
-        task.status = 'in_progress'
-        self.current_task = task_id
+        self._set_status(task, 'in_progress')
+        task.started_at = datetime.now()
+        started = time.monotonic()
+        tracer = self.tracer
+        if tracer is not None:
+            trace_start = tracer.now()
+            tracer.task_started(task_id)
+        outcome = 'error'
         
         try:
             # Update task status in the tasks.md file
             await self.update_task_status(task_id, 'in_progress')
             
+            result_key = await self._result_key(task)
+            if result_key is not None and self.result_cache.lookup(result_key) is not None:
+                outcome = 'cached'
+                self._result_keys[task_id] = result_key
+                self._set_status(task, 'completed')
+                task.completed_at = datetime.now()
+                self.scheduler.task_finished(task_id, True)
+                await self.update_task_status(task_id, 'completed')
+                logger.info(f"♻️ Inputs unchanged, reused cached result: {task.name}")
+                return True
+            
             # Execute the task using Kiro's task execution
-            success = await self.execute_kiro_task(task.name)
+            success = await self.execute_kiro_task(task)
+            self.metrics.task_finished(time.monotonic() - started, success)
+            outcome = 'completed' if success else 'failed'
             
             if success:
-                task.status = 'completed'
+                self._set_status(task, 'completed')
                 task.completed_at = datetime.now()
+                self.history.record(task)
+                self.breaker.record(True)
+                # Tasks that ran without a key get a fresh one so nothing downstream is reused
+                self._result_keys[task_id] = result_key or f"run:{task_id}:{time.time_ns()}"
+                if result_key is not None:
+                    self.result_cache.store(result_key, task, self.executor.output(self.qualify(task_id)))
+                self.scheduler.task_finished(task_id, True)
                 await self.update_task_status(task_id, 'completed')
                 logger.info(f"Completed task: {task.name}")
                 return True
             else:
-                task.status = 'not_started'  # Reset for retry
                 logger.error(f"Failed to complete task: {task.name}")
+                await self._task_failed(task)
                 return False
                 
+        except asyncio.CancelledError:
+            # Cancelled by the client or a shutdown: hand the task back to the queue
+            logger.info(f"Task {task_id} cancelled")
+            outcome = 'cancelled'
+            self._set_status(task, 'not_started')
+            self.scheduler.task_finished(task_id, False)
+            if self.journal:
+                self.journal.record(task_id, 'not_started')
+            self._publish_state(task, 'not_started')
+            raise
         except Exception as e:
             logger.error(f"Error executing task {task_id}: {e}")
-            task.status = 'not_started'
+            self.metrics.task_finished(time.monotonic() - started, False)
+            await self._task_failed(task)
             return False
         finally:
-            self.current_task = None
+            if tracer is not None:
+                tracer.task_finished(task_id)
+                tracer.complete(task.name, 'task', trace_start, self._worker_of(task_id),
+                                {'task_id': task_id, 'outcome': outcome, 'attempts': task.attempts})
     
-    async def execute_kiro_task(self, task_name: str) -> bool:
-        """Execute task using Kiro's task execution system"""
+    async def _result_key(self, task: Task) -> Optional[str]:
+        """Result cache key of a task, or None when its result is not cacheable
+
+        Dependencies that completed in this process contribute the key of the
+        result they produced; ones already ticked when the spec was loaded
+        contribute their name, since nothing is known about how they were done.
+        """
+        if self.result_cache is None or not task.inputs:
+            return None
+        dependency_keys = self._dependency_keys(task)
+        if dependency_keys is None:
+            return None
+        loop = asyncio.get_running_loop()
         try:
-            # This would integrate with Kiro's task execution API
-            # For now, we'll simulate task execution
-            logger.info(f"Executing Kiro task: {task_name}")
-            
-            # Simulate task execution time
-            await asyncio.sleep(2)
-            
-            # In a real implementation, this would:
-            # 1. Call Kiro's task execution API
-            # 2. Monitor task progress
-            # 3. Handle errors and retries
-            # 4. Return success/failure status
-            
-            return True  # Simulate success
-            
+            # Hashing the input files is blocking I/O; keep it off the event loop
+            return await loop.run_in_executor(
+                None, self.result_cache.key_for, task, dependency_keys, self.workspace_path
+            )
+        except OSError as e:
+            logger.warning(f"Not caching {task.name}: could not read its inputs: {e}")
+            return None
+    
+    def _dependency_keys(self, task: Task) -> Optional[List[str]]:
+        """Result keys of a task's dependencies, or None if any of them is not done"""
+        keys = []
+        for dep_id in task.dependencies:
+            key = self._result_keys.get(dep_id)
+            if key is None:
+                dep = self.tasks.get(dep_id)
+                if dep is None or dep.status != 'completed':
+                    return None
+                key = f"done:{normalize_task_name(dep.name)}"
+            keys.append(key)
+        return keys
+    
+    def _complete_aggregate(self, task_id: str):
+        """Tick a parent task as soon as its last subtask is done, without a worker
+
+        Called by the scheduler when the parent becomes ready, which in turn
+        may complete its own parent.
+        """
+        task = self.tasks[task_id]
+        self._set_status(task, 'completed')
+        task.completed_at = datetime.now()
+        dependency_keys = self._dependency_keys(task)
+        if dependency_keys is not None:
+            self._result_keys[task_id] = hashlib.sha256(encode_json(dependency_keys)).hexdigest()
+        self._record_status(task_id, 'completed')
+        logger.info(f"Completed section: {task.name} ({len(task.dependencies)} subtask(s) done)")
+        self.scheduler.task_finished(task_id, True)
+    
+    def _worker_of(self, task_id: str) -> int:
+        """Worker running a task (trace track), or 0 for tasks run directly"""
+        for worker in self.workers.values():
+            if worker.current_task == task_id:
+                return worker.worker_id
+        return 0
+    
+    def _set_status(self, task: Task, status: str):
+        """Change a task's status, keeping the status counters in step"""
+        if task.id in self.tasks:
+            self.scheduler.set_status(task, status)
+        else:
+            task.status = status
+    
+    async def _task_failed(self, task: Task):
+        """Back off before retrying a failed task, or give up once it is out of attempts"""
+        task.attempts += 1
+        if task.attempts >= self.retry_policy.max_attempts:
+            self._set_status(task, 'failed')
+            self.scheduler.task_finished(task.id, False)
+            await self.update_task_status(task.id, 'failed')
+            logger.error(f"Giving up on task {task.name} after {task.attempts} attempt(s)")
+        else:
+            delay = self.retry_policy.delay(task.attempts)
+            self._set_status(task, 'not_started')  # Reset for retry
+            self.scheduler.task_finished(task.id, False, delay)
+            await self.update_task_status(task.id, 'not_started')
+            logger.info(f"Retrying task {task.name} in {delay:.1f}s (attempt {task.attempts + 1} of {self.retry_policy.max_attempts})")
+        if self.breaker.record(False):
+            logger.warning(
+                f"Too many recent task failures: pausing dispatch for {self.breaker.cooldown:g}s"
+            )
+            for graph in (self.owner or self)._graphs():
+                graph.scheduler.pause(self.breaker.cooldown)
+    
+    async def execute_kiro_task(self, task: Task, output_key: Optional[str] = None) -> bool:
+        """Execute task using the configured executor; its output is kept under its qualified id"""
+        try:
+            return await self.executor.run(task, output_key or self.qualify(task.id))
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Error in Kiro task execution: {e}")
             return False
     
     async def update_task_status(self, task_id: str, status: str):
         """Update task status in the tasks.md file"""
+        self._record_status(task_id, status)
+    
+    def _record_status(self, task_id: str, status: str):
+        """Journal a status change, queue the checkbox write and notify listeners"""
         try:
-            # This would call the taskStatus tool to update the task
             logger.info(f"Updating task {task_id} status to {status}")
+            if self.journal:
+                self.journal.record(task_id, status)
             
-            # In a real implementation, this would use the taskStatus tool
-            # For now, we'll just log the update
+            # The checkbox only distinguishes done / not done; writes are batched
+            task = self.tasks.get(task_id)
+            if self.status_writer and task and status in ('completed', 'not_started'):
+                self.status_writer.mark(task, status == 'completed')
+            if task:
+                self._publish_state(task, status)
             
         except Exception as e:
             logger.error(f"Error updating task status: {e}")
     
+    def _publish_state(self, task: Task, status: str):
+        for listener in (self.owner or self).state_listeners:
+            try:
+                listener(task, status, self.namespace)
+            except Exception as e:
+                logger.error(f"Error in task state listener: {e}")
+    
+    def _on_status_flush(self, patched: List[Task]):
+        """Keep the line index and watcher in sync with checkboxes the agent wrote itself"""
+        index = self.spec_index
+        if index is not None and self.status_writer:
+            with open(self.status_writer.path, 'rb') as f:
+                for task in patched:
+                    line_index = task.line_number - 1
+                    if 0 <= line_index < len(index):
+                        f.seek(index.offset_at(line_index))
+                        line = f.read(index.offset_at(line_index + 1) - index.offset_at(line_index))
+                        index.hashes[line_index] = zlib.crc32(line)
+        if self.watcher:
+            self.watcher.mark_seen()
+    
     async def get_next_task(self) -> Optional[str]:
         """Get the next task to execute based on priority and dependencies"""
-        available_tasks = []
-        
-        for task_id, task in self.tasks.items():
-            if task.status == 'not_started':
-                # Check if all dependencies are completed
-                dependencies_met = all(
-                    self.tasks.get(dep_id, Task('', '', 'completed', 0, [], 0, datetime.now())).status == 'completed'
-                    for dep_id in task.dependencies
-                )
-                
-                if dependencies_met:
-                    available_tasks.append((task_id, task.priority))
-        
-        if available_tasks:
-            # Sort by priority (higher number = higher priority)
-            available_tasks.sort(key=lambda x: x[1], reverse=True)
-            return available_tasks[0][0]
-        
-        return None
+        return self.scheduler.pop_ready()
+    
+    def _graphs(self) -> List['KiroAutomationAgent']:
+        """Task graphs run by this agent: one per spec in a multi-spec run, otherwise the agent itself"""
+        return list(self.specs.values()) or [self]
+    
+    def qualify(self, task_id: str) -> str:
+        """Task id as seen outside this graph: `<spec>/<id>` in a multi-spec run"""
+        return f"{self.namespace}/{task_id}" if self.namespace else task_id
+    
+    def find_task(self, task_id: str) -> Tuple['KiroAutomationAgent', str]:
+        """Graph that owns a (possibly qualified) task id, and the id within that graph"""
+        namespace, separator, local_id = task_id.partition('/')
+        if separator and namespace in self.specs:
+            return self.specs[namespace], local_id
+        return self, task_id
+    
+    def status_counts(self) -> Dict[str, int]:
+        """Tasks in each status across every spec (or across the cluster, when in one)"""
+        if self.cluster is not None and self.cluster.snapshot is not None:
+            return dict(self.cluster.snapshot['tasks'])
+        totals = dict.fromkeys(TASK_STATUSES, 0)
+        for graph in self._graphs():
+            for status, count in graph.scheduler.counts.counts.items():
+                totals[status] = totals.get(status, 0) + count
+        return totals
+    
+    def task_count(self) -> int:
+        if self.cluster is not None and self.cluster.snapshot is not None:
+            return self.cluster.snapshot['total_tasks']
+        return sum(len(graph.tasks) for graph in self._graphs())
     
     async def run_continuous_execution(self, spec_path: str):
-        """Run continuous task execution"""
-        logger.info("Starting continuous task execution")
+        """Run continuous task execution with a pool of concurrent workers"""
+        self.specs = OrderedDict()
+        self.spec_path = spec_path
+        await self._run_pool()
+    
+    async def run_multi_spec_execution(self, spec_paths: List[str], weights: Optional[Dict[str, float]] = None):
+        """Run several specs on one worker pool, each as its own task graph
+
+        Every spec keeps its own tasks, scheduler, journal, checkbox writer
+        and watcher, and its task ids are qualified as `<spec>/<id>` outside
+        the graph. The executor, duration history, result cache and circuit
+        breaker are shared. Workers take the next task from whichever spec is
+        furthest below its weighted fair share (see SpecShare).
+        """
+        weights = dict(self.config.spec_weights, **(weights or {}))
+        self.specs = OrderedDict()
+        for spec_path in spec_paths:
+            namespace = base = spec_namespace(spec_path)
+            suffix = 2
+            while namespace in self.specs:
+                namespace = f"{base}-{suffix}"
+                suffix += 1
+            graph = KiroAutomationAgent(owner=self, namespace=namespace)
+            graph.spec_path = spec_path
+            graph.share.weight = max(0.01, float(weights.get(namespace, 1.0)))
+            self.specs[namespace] = graph
+        self.spec_path = None
+        await self._run_pool()
+    
+    async def _run_pool(self):
+        """Load every graph, then run the worker pool until nothing more can run"""
+        graphs = self._graphs()
+        if self.specs:
+            logger.info(f"Starting continuous task execution of {len(graphs)} specs with {self.config.workers} worker(s)")
+        else:
+            logger.info(f"Starting continuous task execution with {self.config.workers} worker(s)")
         self.running = True
+        self._dispatch_wakeup = asyncio.Event() if self.specs else None
+        self.workers = {
+            worker_id: WorkerState(worker_id)
+            for worker_id in range(1, self.config.workers + 1)
+        }
+        
+        # Load tasks from each spec
+        for graph in graphs:
+            graph.running = True
+            graph.workers = self.workers
+            await graph.load_tasks_from_spec(graph.spec_path)
+            if self._dispatch_wakeup is not None:
+                graph.scheduler.set_wakeup(self._dispatch_wakeup)
+            graph.scheduler.rebuild()
         
-        # Load tasks from spec
-        await self.load_tasks_from_spec(spec_path)
+        watch_tasks = []
+        if self.config.watch_spec:
+            for graph in graphs:
+                graph.watcher = SpecWatcher(
+                    graph.spec_path, functools.partial(graph.reload_spec, graph.spec_path),
+                    poll_interval=self.config.watch_interval
+                )
+                watch_tasks.append(asyncio.ensure_future(graph.watcher.run()))
+        
+        metrics_task = None
+        if self.config.metrics_file:
+            metrics_task = asyncio.ensure_future(self.export_metrics())
         
+        if self.tracer is not None:
+            for worker_id in self.workers:
+                self.tracer.name_thread(worker_id, f"worker {worker_id}")
+        worker_tasks = [asyncio.ensure_future(self.run_worker(worker)) for worker in self.workers.values()]
+        try:
+            await asyncio.gather(*worker_tasks)
+        except KeyboardInterrupt:
+            logger.info("Stopping continuous execution...")
+            self.running = False
+        except asyncio.CancelledError:
+            # Stopped: let every worker kill its command and hand its task back before cleaning up
+            logger.info("Continuous execution cancelled")
+            self.running = False
+            for worker_task in worker_tasks:
+                worker_task.cancel()
+            await asyncio.gather(*worker_tasks, return_exceptions=True)
+            raise
+        finally:
+            if metrics_task:
+                metrics_task.cancel()
+                self.write_metrics_file()
+            for watch_task in watch_tasks:
+                watch_task.cancel()
+            for graph in graphs:
+                if graph.watcher is not None:
+                    if graph.watcher.has_unseen_changes():
+                        graph.watcher.mark_seen()
+                        await graph.reload_spec(graph.spec_path)
+                    graph.watcher = None
+                if graph.status_writer:
+                    graph.status_writer.flush()
+                if graph.journal:
+                    graph.journal.close()
+            if self.tracer is not None:
+                self.tracer.write()
+            self._finish_pool(graphs)
+    
+    def _finish_pool(self, graphs: List['KiroAutomationAgent']):
+        """Report what is left of each spec and persist the shared state once the pool has stopped"""
+        for graph in graphs:
+            label = f"{graph.namespace}: " if graph.namespace else ""
+            remaining_tasks = [t for t in graph.tasks.values() if t.status != 'completed']
+            failed_tasks = [t for t in remaining_tasks if t.status == 'failed']
+            if not remaining_tasks:
+                logger.info(f"{label}All tasks completed! 🎉")
+            elif self.running:
+                unrunnable = [t for t in failed_tasks if not graph.executor.can_run(t)]
+                if unrunnable:
+                    names = ', '.join(t.name for t in unrunnable[:5]) + (', ...' if len(unrunnable) > 5 else '')
+                    logger.error(f"{label}{len(unrunnable)} task(s) failed without running, having no command "
+                                 f"({names}); {NO_COMMAND_HINT}")
+                by_attempts: Dict[int, int] = {}
+                for t in failed_tasks:
+                    if graph.executor.can_run(t):
+                        by_attempts[t.attempts] = by_attempts.get(t.attempts, 0) + 1
+                for attempts, count in sorted(by_attempts.items()):
+                    logger.error(f"{label}{count} task(s) failed after {attempts} attempt(s)")
+                blocked = len(remaining_tasks) - len(failed_tasks)
+                if blocked:
+                    logger.warning(f"{label}{blocked} task(s) blocked on dependencies that can never complete")
+            graph.running = False
+        self.running = False
+        self.history.save()
+        if self.result_cache:
+            self.result_cache.save()
+    
+    async def _next_fair_task(self) -> Tuple[Optional['KiroAutomationAgent'], Optional[str]]:
+        """Wait for a ready task from the spec furthest below its fair share of the workers"""
+        wakeup = self._dispatch_wakeup
+        graphs = list(self.specs.values())
+        while self.running:
+            # Clear before checking so a notify between the check and the wait is not lost
+            wakeup.clear()
+            for graph in sorted(graphs, key=lambda g: g.share.sort_key()):
+                task_id = graph.scheduler.pop_ready()
+                if task_id is not None:
+                    return graph, task_id
+            if all(graph.scheduler.is_idle() for graph in graphs):
+                wakeup.set()  # let the other waiting workers see the idle state too
+                return None, None
+            await wakeup.wait()
+        return None, None
+    
+    async def run_worker(self, worker: WorkerState):
+        """Pull ready tasks and execute them until every spec is done or the agent stops"""
         while self.running:
             try:
-                # Get next task to execute
-                next_task_id = await self.get_next_task()
-                
-                if next_task_id:
-                    # Execute the task
-                    success = await self.execute_task(next_task_id)
-                    
-                    if success:
-                        logger.info(f"Task completed successfully: {next_task_id}")
-                    else:
-                        logger.error(f"Task failed: {next_task_id}")
-                        # Wait before retrying
-                        await asyncio.sleep(30)
+                # Blocks until a task is ready; None means nothing more can run
+                tracer = self.tracer
+                if tracer is not None:
+                    wait_start = tracer.now()
+                if self.specs:
+                    graph, next_task_id = await self._next_fair_task()
                 else:
-                    # No more tasks available
-                    remaining_tasks = [t for t in self.tasks.values() if t.status != 'completed']
-                    if not remaining_tasks:
-                        logger.info("All tasks completed! 🎉")
-                        break
-                    else:
-                        logger.info("Waiting for dependencies or new tasks...")
-                        await asyncio.sleep(60)  # Wait 1 minute before checking again
+                    graph, next_task_id = self, await self.scheduler.next_task()
+                if tracer is not None:
+                    tracer.complete('dispatch', 'scheduler', wait_start, worker.worker_id, {
+                        'task_id': graph.qualify(next_task_id) if next_task_id else None,
+                        'ready': sum(g.scheduler.ready_count() for g in self._graphs())
+                    })
+                if next_task_id is None:
+                    break
                 
-                # Small delay between tasks
-                await asyncio.sleep(5)
+                worker.current_task = next_task_id
+                worker.spec = graph.namespace
+                worker.started_at = datetime.now()
+                self.metrics.busy_workers.observe(
+                    sum(1 for w in self.workers.values() if w.current_task) / len(self.workers)
+                )
+                share = graph.share
+                share.running += 1
+                share.dispatched += 1
+                started = time.monotonic()
+                try:
+                    success = await graph.execute_task(next_task_id)
+                finally:
+                    share.running -= 1
+                    share.served_seconds += time.monotonic() - started
+                    worker.current_task = None
+                    worker.spec = None
+                    worker.started_at = None
+                
+                if success:
+                    worker.tasks_completed += 1
+                    logger.info(f"Worker {worker.worker_id}: task completed successfully: {graph.qualify(next_task_id)}")
+                else:
+                    worker.tasks_failed += 1
+                    logger.error(f"Worker {worker.worker_id}: task failed: {graph.qualify(next_task_id)}")
                 
-            except KeyboardInterrupt:
-                logger.info("Stopping continuous execution...")
-                self.running = False
-                break
             except Exception as e:
-                logger.error(f"Error in continuous execution: {e}")
-                await asyncio.sleep(30)  # Wait before retrying
+                logger.error(f"Worker {worker.worker_id}: error in continuous execution: {e}")
+                await asyncio.sleep(1)
+    
+    async def export_metrics(self):
+        """Rewrite the Prometheus metrics file every metrics_interval seconds"""
+        while True:
+            self.write_metrics_file()
+            await asyncio.sleep(self.config.metrics_interval)
+    
+    def write_metrics_file(self):
+        try:
+            self.metrics.write_prometheus(self, self.config.metrics_file)
+        except OSError as e:
+            logger.error(f"Error writing metrics file {self.config.metrics_file}: {e}")
     
     def stop(self):
         """Stop continuous execution"""
         self.running = False
+        if self.cluster is not None:
+            self.cluster.wake()
+        for graph in self._graphs():
+            graph.running = False
+            graph.scheduler.close()
+            if graph.status_writer:
+                graph.status_writer.flush()
+            if graph.journal:
+                graph.journal.close()
+        self.history.save()
+        if self.result_cache:
+            self.result_cache.save()
+        if self.tracer is not None:
+            self.tracer.write()
         logger.info("Stopping automation agent...")
     
+    def spec_summary(self) -> Dict[str, Any]:
+        """Progress of this graph's spec (one entry of get_status' `specs`)"""
+        counts = self.scheduler.counts
+        total = len(self.tasks)
+        return {
+            'spec': self.namespace or (spec_namespace(self.spec_path) if self.spec_path else None),
+            'spec_path': self.spec_path,
+            'weight': self.share.weight,
+            'total_tasks': total,
+            'completed_tasks': counts['completed'],
+            'in_progress_tasks': counts['in_progress'],
+            'pending_tasks': counts['not_started'],
+            'failed_tasks': counts['failed'],
+            'ready_tasks': self.scheduler.ready_count(),
+            'running_tasks': self.share.running,
+            'dispatched_tasks': self.share.dispatched,
+            'worker_seconds': self.share.served_seconds,
+            'section_count': len(self.scheduler.progress.sections),
+            'completion_percentage': (counts['completed'] / total * 100) if total else 0
+        }
+    
     def get_status(self) -> Dict:
         """Get current status of the automation agent"""
-        completed_tasks = [t for t in self.tasks.values() if t.status == 'completed']
-        in_progress_tasks = [t for t in self.tasks.values() if t.status == 'in_progress']
-        pending_tasks = [t for t in self.tasks.values() if t.status == 'not_started']
+        graphs = self._graphs()
+        counts = self.status_counts()
+        total_tasks = self.task_count()
+        (critical_path, critical_path_minutes), critical_graph = max(
+            ((graph.scheduler.critical_path(), graph) for graph in graphs), key=lambda item: item[0][1]
+        )
+        remaining_work = sum(graph.scheduler.remaining_work() for graph in graphs)
+        sections = []
+        for graph in graphs:
+            progress = graph.scheduler.progress
+            for task_id in progress.sections[:50 - len(sections)]:
+                section = progress.summary(task_id)
+                if graph.namespace:
+                    section.update(id=graph.qualify(task_id), spec=graph.namespace)
+                sections.append(section)
+        retry_in = [t for t in (graph.scheduler.next_retry_in() for graph in graphs) if t is not None]
+        paused_for = [t for t in (graph.scheduler.paused_for() for graph in graphs) if t is not None]
+        if self.cluster is not None and self.cluster.paused_for() is not None:
+            paused_for.append(self.cluster.paused_for())
         
         return {
             'running': self.running,
-            'current_task': self.current_task,
-            'total_tasks': len(self.tasks),
-            'completed_tasks': len(completed_tasks),
-            'in_progress_tasks': len(in_progress_tasks),
-            'pending_tasks': len(pending_tasks),
-            'completion_percentage': (len(completed_tasks) / len(self.tasks) * 100) if self.tasks else 0
+            'spec_path': self.spec_path,
+            'specs': [graph.spec_summary() for graph in graphs if graph.spec_path],
+            'max_workers': self.config.workers,
+            'active_workers': sum(1 for w in self.workers.values() if w.current_task),
+            'workers': [w.to_dict() for w in self.workers.values()],
+            'total_tasks': total_tasks,
+            'completed_tasks': counts['completed'],
+            'in_progress_tasks': counts['in_progress'],
+            'pending_tasks': counts['not_started'],
+            'failed_tasks': counts['failed'],
+            'ready_tasks': sum(graph.scheduler.ready_count() for graph in graphs),
+            'retrying_tasks': sum(graph.scheduler.retry_count() for graph in graphs),
+            'next_retry_in_seconds': min(retry_in) if retry_in else None,
+            'circuit_breaker': {
+                'paused_for_seconds': max(paused_for) if paused_for else None,
+                'recent_failure_rate': self.breaker.failure_rate(),
+                'trips': self.breaker.trips
+            },
+            'schedule_mode': self.scheduler.mode,
+            'sections': sections,
+            'section_count': sum(len(graph.scheduler.progress.sections) for graph in graphs),
+            'critical_path': [critical_graph.qualify(task_id) for task_id in critical_path[:50]],
+            'critical_path_length': len(critical_path),
+            'critical_path_minutes': critical_path_minutes,
+            'makespan_estimate_minutes': max(critical_path_minutes, remaining_work / max(1, self.config.workers)),
+            'executor': self.executor.stats(),
+            'result_cache': self.result_cache.stats() if self.result_cache else None,
+            'cluster': self.cluster.status() if self.cluster else None,
+            'completion_percentage': (counts['completed'] / total_tasks * 100) if total_tasks else 0
+        }
+
+class ClusterNode:
+    """This process's part in a cluster of agents sharing a LeaseTable
+
+    Every node runs config.workers claim loops that lease ready tasks from
+    the table and execute them with the agent's executor, plus a maintenance
+    loop that renews its leases, records its heartbeat and refreshes the
+    cluster snapshot that status queries read. The coordinator also parses
+    the spec, publishes its graph (again after each reload) and mirrors the
+    progress of every node back into its own task table, so the spec file,
+    journal and notifications stay current. Plain workers need no spec.
+
+    When the circuit breaker trips, the node stops its claim loops (handing
+    the tasks they were running back to the cluster), stays away from the
+    table for the breaker's cooldown and then starts claiming again.
+    """
+
+    ROLES = CLUSTER_ROLES
+
+    def __init__(self, agent: 'KiroAutomationAgent', table: LeaseTable, role: str, poll_interval: float = 1.0):
+        if role not in self.ROLES:
+            raise ValueError(f"Unknown cluster role: {role}")
+        self.agent = agent
+        self.table = table
+        self.role = role
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.namespace: Optional[str] = None  # spec name the coordinator publishes under
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.leases: Dict[str, int] = {}  # `<spec>/<id>` -> fencing token, for tasks running here
+        self.completed = 0
+        self.failed = 0
+        self.lost_leases = 0
+        self._seen_seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tripped: Optional[asyncio.Event] = None  # set by a run that trips the circuit breaker
+        self._resume_at: Optional[float] = None  # monotonic time claiming resumes while paused
+
+    async def run(self, spec_path: Optional[str] = None):
+        """Work on the cluster's tasks until none are left (or the agent stops)"""
+        agent = self.agent
+        agent.running = True
+        self._wakeup = asyncio.Event()
+        self._tripped = asyncio.Event()
+        watch_task = None
+        if self.role == 'coordinator':
+            agent.spec_path = spec_path
+            self.namespace = spec_namespace(spec_path)
+            await agent.load_tasks_from_spec(spec_path)
+            agent.scheduler.rebuild()
+            await self.publish()
+            if agent.config.watch_spec:
+                agent.watcher = SpecWatcher(spec_path, self._reload, poll_interval=agent.config.watch_interval)
+                watch_task = asyncio.ensure_future(agent.watcher.run())
+        logger.info(f"Joining cluster {self.table.path} as {self.role} {self.worker_id} "
+                    f"with {agent.config.workers} worker(s)")
+        agent.workers = {
+            worker_id: WorkerState(worker_id)
+            for worker_id in range(1, agent.config.workers + 1)
         }
+        await self.maintain_once()
+        maintenance = asyncio.ensure_future(self.maintain())
+        claim_tasks = [asyncio.ensure_future(self.claim_loop(worker)) for worker in agent.workers.values()]
+        try:
+            while True:
+                claiming = asyncio.gather(*claim_tasks)
+                tripped = asyncio.ensure_future(self._tripped.wait())
+                await asyncio.wait([claiming, tripped], return_when=asyncio.FIRST_COMPLETED)
+                tripped.cancel()
+                if claiming.done():
+                    claiming.result()
+                    break
+                await self._pause(claim_tasks)
+                claiming.exception()  # retrieve the CancelledError the stopped loops leave on it
+                claim_tasks = [asyncio.ensure_future(self.claim_loop(worker)) for worker in agent.workers.values()]
+        except asyncio.CancelledError:
+            # Stopped: let every loop hand its leased task back before leaving the cluster
+            agent.running = False
+            for claim_task in claim_tasks:
+                claim_task.cancel()
+            await asyncio.gather(*claim_tasks, return_exceptions=True)
+            raise
+        finally:
+            maintenance.cancel()
+            if watch_task:
+                watch_task.cancel()
+                agent.watcher = None
+            released = await self.table.call(self.table.release, self.worker_id)
+            if released:
+                logger.info(f"Handed {released} leased task(s) back to the cluster")
+            await self.maintain_once()
+            if self.role == 'coordinator':
+                if not await self.table.call(self.table.has_pending):
+                    await self.table.call(self.table.set_meta, 'finished', '1')
+                if agent.status_writer:
+                    agent.status_writer.flush()
+                if agent.journal:
+                    agent.journal.close()
+            agent.running = False
+            agent.history.save()
+            if agent.tracer is not None:
+                agent.tracer.write()
+
+    async def _pause(self, claim_tasks: List[asyncio.Task]):
+        """Stop claiming for the breaker's cooldown, handing this node's running tasks back to the cluster"""
+        cooldown = self.agent.breaker.cooldown
+        logger.warning(f"Too many recent task failures: pausing claims for {cooldown:g}s")
+        self._tripped.clear()
+        self._resume_at = time.monotonic() + cooldown
+        for claim_task in claim_tasks:
+            claim_task.cancel()
+        await asyncio.gather(*claim_tasks, return_exceptions=True)
+        released = await self.table.call(self.table.release, self.worker_id)
+        if released:
+            logger.info(f"Handed {released} leased task(s) back to the cluster")
+        try:
+            await asyncio.sleep(cooldown)
+        finally:
+            self._resume_at = None
+
+    def paused_for(self) -> Optional[float]:
+        """Seconds left before claiming resumes, or None if claiming"""
+        if self._resume_at is None:
+            return None
+        return max(0.0, self._resume_at - time.monotonic())
+
+    async def publish(self):
+        """Publish the coordinator's task graph to the table"""
+        tasks = list(self.agent.tasks.values())
+        await self.table.call(self.table.publish, self.namespace, tasks)
+        logger.info(f"Published {len(tasks)} tasks of {self.namespace} to {self.table.path}")
+        self.wake()
+
+    async def _reload(self):
+        await self.agent.reload_spec(self.agent.spec_path)
+        await self.publish()
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _finished(self) -> bool:
+        """Nothing left to claim: the coordinator decides, workers wait for it to say so"""
+        if await self.table.call(self.table.has_pending):
+            return False
+        return self.role == 'coordinator' or await self.table.call(self.table.get_meta, 'finished') == '1'
+
+    async def claim_loop(self, worker: WorkerState):
+        while self.agent.running:
+            try:
+                claimed = await self.table.call(self.table.claim, self.worker_id, self.agent.retry_policy)
+                if claimed is None:
+                    if await self._finished():
+                        self.wake()  # let the other loops see it too
+                        break
+                    self._wakeup.clear()
+                    try:
+                        # Jittered so idle workers on many hosts don't poll in lockstep
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval * random.uniform(0.5, 1.5))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.run_claimed(worker, claimed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker {worker.worker_id}: error in cluster execution: {e}")
+                await asyncio.sleep(1)
+
+    async def run_claimed(self, worker: WorkerState, claimed: Dict[str, Any]):
+        """Execute a leased task and report the outcome to the table"""
+        agent = self.agent
+        spec, task_id, token = claimed['spec'], claimed['task_id'], claimed['lease_token']
+        key = f"{spec}/{task_id}"
+        task = Task(
+            id=task_id, name=claimed['name'], status='in_progress', priority=claimed['priority'],
+            dependencies=[], estimated_time=agent.history.estimate(claimed['name'], DEFAULT_ESTIMATED_TIME),
+            created_at=datetime.now(), started_at=datetime.now(),
+            command=json.loads(claimed['command']) if claimed['command'] else None,
+            timeout=claimed['timeout'], attempts=claimed['attempts']
+        )
+        if not agent.executor.can_run(task):
+            logger.error(f"Task {task.name} ({key}) has no command; marking it failed ({NO_COMMAND_HINT})")
+            await self.table.call(self.table.finish, spec, task_id, self.worker_id, token, False,
+                                  agent.retry_policy, True)
+            self.failed += 1
+            worker.tasks_failed += 1
+            self.wake()
+            return
+        logger.info(f"Starting task: {task.name} ({key}, lease {token})")
+        self.leases[key] = token
+        worker.current_task = task_id
+        worker.spec = spec
+        worker.started_at = task.started_at
+        started = time.monotonic()
+        success = False
+        try:
+            success = await agent.execute_kiro_task(task, key)
+        except asyncio.CancelledError:
+            await asyncio.shield(self.table.call(self.table.release, self.worker_id, spec, task_id))
+            raise
+        finally:
+            self.leases.pop(key, None)
+            worker.current_task = None
+            worker.spec = None
+            worker.started_at = None
+        task.completed_at = datetime.now()
+        agent.metrics.task_finished(time.monotonic() - started, success)
+        status = await self.table.call(
+            self.table.finish, spec, task_id, self.worker_id, token, success, agent.retry_policy
+        )
+        if status is None:
+            self.lost_leases += 1
+            logger.warning(f"Lease on {key} was lost while it ran; its result was discarded")
+        elif success:
+            self.completed += 1
+            worker.tasks_completed += 1
+            agent.history.record(task)
+            logger.info(f"Completed task: {task.name}")
+        else:
+            self.failed += 1
+            worker.tasks_failed += 1
+            logger.error(f"Failed task: {task.name} (now {status})")
+        if agent.breaker.record(success):
+            self._tripped.set()
+        self.wake()
+
+    async def maintain(self):
+        """Renew leases and heartbeat every third of the lease time; refresh status every poll interval"""
+        last_renewal = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if time.monotonic() - last_renewal >= self.table.lease_seconds / 3:
+                    await self.maintain_once()
+                    last_renewal = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Cluster maintenance failed: {e}")
+
+    async def maintain_once(self):
+        await self.table.call(self.table.renew, self.worker_id, len(self.leases), self.completed, self.failed)
+        await self.refresh()
+
+    async def refresh(self):
+        """Re-read the cluster snapshot and, on the coordinator, apply other nodes' progress"""
+        previous = self.snapshot
+        self.snapshot = await self.table.call(self.table.status)
+        if previous is None or previous['change_seq'] != self.snapshot['change_seq']:
+            self.wake()
+        if self.role == 'coordinator':
+            self._seen_seq, changes = await self.table.call(self.table.changes_since, self._seen_seq)
+            self.apply(changes)
+
+    def apply(self, changes: List[Dict[str, Any]]):
+        """Mirror task state changes from the table into the coordinator's task table"""
+        agent = self.agent
+        for change in changes:
+            if change['spec'] != self.namespace:
+                continue
+            task = agent.tasks.get(change['task_id'])
+            if task is None or task.status == change['status']:
+                continue
+            task.attempts = change['attempts']
+            if change['started_at']:
+                task.started_at = datetime.fromtimestamp(change['started_at'])
+            if change['status'] == 'completed':
+                task.completed_at = datetime.fromtimestamp(change['finished_at'] or time.time())
+            agent._set_status(task, change['status'])
+            agent._record_status(task.id, change['status'])
+
+    def status(self) -> Dict[str, Any]:
+        return dict(
+            self.snapshot or {},
+            role=self.role,
+            worker_id=self.worker_id,
+            leases_held=sorted(self.leases),
+            completed_here=self.completed,
+            failed_here=self.failed,
+            lost_leases=self.lost_leases,
+            paused_for_seconds=self.paused_for()
+        )
+
+class NotificationPublisher:
+    """Pushes task progress to a subscribed MCP client at a bounded rate
+
+    Listens to the agent's state changes and keeps only the latest state of
+    each changed task. At most max_rate times per second the pending changes
+    are flushed as one `notifications/kiro/taskState` message listing them,
+    followed by a `notifications/progress` message with the overall count.
+    """
+
+    STATE_METHOD = "notifications/kiro/taskState"
+    EVENTS = {'in_progress': 'started', 'completed': 'completed', 'failed': 'failed'}
+
+    def __init__(self, agent: KiroAutomationAgent, send: Callable[[Dict], None], max_rate: float = 4.0):
+        self.agent = agent
+        self.send = send
+        self.max_rate = max_rate
+        self.progress_token: Any = None
+        self.subscribed = False
+        self.sent = 0
+        self._pending: Dict[str, Tuple[Task, str, Optional[str]]] = {}  # qualified task id -> latest state
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._last_flush = 0.0
+
+    def subscribe(self, progress_token: Any, max_rate: Optional[float] = None):
+        if max_rate:
+            self.max_rate = max(0.1, max_rate)
+        self.progress_token = progress_token
+        if not self.subscribed:
+            self.subscribed = True
+            self.agent.state_listeners.append(self.on_state)
+
+    def unsubscribe(self):
+        if self.subscribed:
+            self.subscribed = False
+            self.agent.state_listeners.remove(self.on_state)
+        self._pending.clear()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def on_state(self, task: Task, status: str, spec: Optional[str] = None):
+        key = f"{spec}/{task.id}" if spec else task.id
+        self._pending.pop(key, None)
+        self._pending[key] = (task, status, spec)
+        if self._flush_handle is None:
+            loop = asyncio.get_event_loop()
+            delay = max(0.0, self._last_flush + 1.0 / self.max_rate - loop.time())
+            self._flush_handle = loop.call_later(delay, self.flush)
+
+    def flush(self):
+        """Send the pending changes now"""
+        self._flush_handle = None
+        self._last_flush = asyncio.get_event_loop().time()
+        if not self._pending:
+            return
+        timestamp = datetime.now().isoformat()
+        changes = []
+        for key, (task, status, spec) in self._pending.items():
+            if status == 'not_started':
+                event = 'retrying' if task.attempts else 'reset'
+            else:
+                event = self.EVENTS.get(status, status)
+            change = {
+                "task_id": key,
+                "name": task.name,
+                "status": status,
+                "event": event,
+                "attempts": task.attempts,
+                "timestamp": timestamp
+            }
+            if spec:
+                change["spec"] = spec
+            changes.append(change)
+        self._pending.clear()
+        counts = self.agent.status_counts()
+        self.send({"jsonrpc": "2.0", "method": self.STATE_METHOD, "params": {
+            "changes": changes,
+            "counts": counts,
+            "running": self.agent.running
+        }})
+        
+        total = self.agent.task_count()
+        completed = counts['completed']
+        self.send({
+            "jsonrpc": "2.0",
+            "method": "notifications/progress",
+            "params": {
+                "progressToken": self.progress_token,
+                "progress": completed,
+                "total": total,
+                "message": f"{completed}/{total} tasks completed"
+            }
+        })
+        self.sent += 2
 
 # MCP Server Implementation
 class MCPServer:
-    def __init__(self):
-        self.agent = KiroAutomationAgent()
+    def __init__(self, agent: Optional[KiroAutomationAgent] = None, allowed_tools: Optional[Collection[str]] = None):
+        self.agent = agent or KiroAutomationAgent()
         self.tools = [
             {
                 "name": "start_continuous_execution",
-                "description": "Start continuous task execution from a spec file",
+                "description": "Start an execution session for one or more spec files (returns the running "
+                               "session if they are already being executed)",
                 "inputSchema": {
                     "type": "object",
                     "properties": {
@@ -246,18 +4141,55 @@ class MCPServer:
                             "type": "string",
                             "description": "Path to the tasks.md file",
                             "default": ".kiro/specs/ai-powered-integrations/tasks.md"
+                        },
+                        "spec_paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Run several tasks.md files at once on the shared worker pool"
+                        },
+                        "all_specs": {
+                            "type": "boolean",
+                            "description": "Run every .kiro/specs/*/tasks.md",
+                            "default": False
+                        },
+                        "weights": {
+                            "type": "object",
+                            "additionalProperties": {"type": "number"},
+                            "description": "Fair-share weight per spec name (default 1)"
                         }
                     }
                 }
             },
             {
                 "name": "stop_execution",
-                "description": "Stop continuous task execution",
+                "description": "Stop continuous task execution, cancelling running tasks",
                 "inputSchema": {
                     "type": "object",
                     "properties": {}
                 }
             },
+            {
+                "name": "list_sessions",
+                "description": "List execution sessions, the running one first, with their specs and state",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {}
+                }
+            },
+            {
+                "name": "stop_session",
+                "description": "Stop an execution session, cancelling its running tasks",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "session_id": {
+                            "type": "string",
+                            "description": "ID returned by start_continuous_execution or list_sessions"
+                        }
+                    },
+                    "required": ["session_id"]
+                }
+            },
             {
                 "name": "get_status",
                 "description": "Get current status of the automation agent",
@@ -274,7 +4206,7 @@ class MCPServer:
                     "properties": {
                         "task_id": {
                             "type": "string",
-                            "description": "ID of the task to execute"
+                            "description": "ID of the task to execute (`<spec>/<id>` when several specs are running)"
                         }
                     },
                     "required": ["task_id"]
@@ -287,8 +4219,72 @@ class MCPServer:
                     "type": "object",
                     "properties": {}
                 }
+            },
+            {
+                "name": "get_metrics",
+                "description": "Get task duration, queue-wait and request latency histograms plus executor utilisation",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "format": {
+                            "type": "string",
+                            "enum": ["json", "prometheus"],
+                            "default": "json"
+                        }
+                    }
+                }
+            },
+            {
+                "name": "subscribe_notifications",
+                "description": "Subscribe to (or unsubscribe from) progress and task state-change notifications",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "enabled": {
+                            "type": "boolean",
+                            "description": "false to unsubscribe",
+                            "default": True
+                        },
+                        "progress_token": {
+                            "type": ["string", "integer"],
+                            "description": "Token echoed in notifications/progress",
+                            "default": "kiro-automation"
+                        },
+                        "max_rate": {
+                            "type": "number",
+                            "description": "Maximum notification batches per second"
+                        }
+                    }
+                }
             }
         ]
+        if allowed_tools is not None:
+            # Tools outside the allowlist are neither listed nor callable
+            self.tools = [tool for tool in self.tools if tool["name"] in allowed_tools]
+        self.publisher: Optional[NotificationPublisher] = None
+        self.initialize_result = {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {
+                "tools": {}
+            },
+            "serverInfo": {
+                "name": "kiro-automation-agent",
+                "version": "1.0.0"
+            }
+        }
+        self.refresh_static_responses()
+    
+    def attach(self, send: Callable[[Dict], None]):
+        """Connect to the transport so notifications can be pushed to the client"""
+        self.publisher = NotificationPublisher(self.agent, send, self.agent.config.mcp_notify_rate)
+    
+    def refresh_static_responses(self):
+        """Encode the responses that never change once, so replies only splice in the id"""
+        self._tool_names = {tool["name"] for tool in self.tools}
+        self._static_results = {
+            "initialize": encode_json(self.initialize_result),
+            "tools/list": encode_json({"tools": self.tools})
+        }
     
     async def handle_message(self, message: Dict) -> Dict:
         """Handle MCP protocol messages"""
@@ -302,16 +4298,7 @@ class MCPServer:
                 return {
                     "jsonrpc": "2.0",
                     "id": message.get("id"),
-                    "result": {
-                        "protocolVersion": "2024-11-05",
-                        "capabilities": {
-                            "tools": {}
-                        },
-                        "serverInfo": {
-                            "name": "kiro-automation-agent",
-                            "version": "1.0.0"
-                        }
-                    }
+                    "result": self.initialize_result
                 }
             
             elif method == "tools/list":
@@ -336,7 +4323,7 @@ class MCPServer:
                         "content": [
                             {
                                 "type": "text",
-                                "text": json.dumps(result, indent=2)
+                                "text": encode_json(result, indent=not self.agent.config.mcp_compact_json).decode('utf-8')
                             }
                         ]
                     }
@@ -363,17 +4350,109 @@ class MCPServer:
                 }
             }
     
+    async def handle_encoded(self, message: Any) -> bytes:
+        """Handle one message and return the encoded response"""
+        if not isinstance(message, dict):
+            return encode_json({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}})
+        started = time.perf_counter()
+        method = message.get("method")
+        # Only known names become labels, so clients can't grow the metrics without bound
+        label, tool = method, ''
+        if method == "tools/call" and isinstance(message.get("params"), dict):
+            tool = message["params"].get("name", '')
+            tool = tool if tool in self._tool_names else 'unknown'
+        elif method not in ("initialize", "tools/list"):
+            label = 'unknown'
+        tracer = self.agent.tracer
+        if tracer is not None:
+            span_name = f"{label} {tool}" if tool else label
+            span_id = tracer.begin_async(span_name, 'mcp')
+        try:
+            static = self._static_results.get(method)
+            if static is not None:
+                if method == "initialize":
+                    logger.info("🚀 MCP Connection Established - Kiro Automation Agent Ready!")
+                response = b'{"jsonrpc":"2.0","id":' + encode_json(message.get("id")) + b',"result":' + static + b'}'
+            else:
+                response = encode_json(await self.handle_message(message))
+        finally:
+            if tracer is not None:
+                tracer.end_async(span_name, 'mcp', span_id, {'id': message.get("id")})
+        self.agent.metrics.request_finished(label, tool, time.perf_counter() - started)
+        return response
+    
     async def handle_tool_call(self, tool_name: str, arguments: Dict) -> Dict:
         """Handle tool calls"""
+        if tool_name not in self._tool_names:
+            return {"success": False, "error": f"Unknown tool: {tool_name}"}
         try:
             if tool_name == "start_continuous_execution":
-                spec_path = arguments.get('spec_path', '.kiro/specs/ai-powered-integrations/tasks.md')
-                asyncio.create_task(self.agent.run_continuous_execution(spec_path))
-                return {"success": True, "message": "Continuous execution started", "spec_path": spec_path}
+                agent = self.agent
+                spec_paths = arguments.get('spec_paths') or []
+                cluster = agent.cluster
+                if cluster is not None:
+                    if spec_paths or arguments.get('all_specs'):
+                        return {"success": False, "error": "A cluster coordinator runs a single spec"}
+                    spec_paths = []
+                    if cluster.role == 'coordinator':
+                        spec_paths = [arguments.get('spec_path', '.kiro/specs/ai-powered-integrations/tasks.md')]
+                    mode, run = 'cluster', functools.partial(cluster.run, spec_paths[0] if spec_paths else None)
+                else:
+                    if arguments.get('all_specs'):
+                        spec_paths = discover_specs()
+                        if not spec_paths:
+                            return {"success": False, "error": f"No tasks.md files found under {DEFAULT_SPECS_DIR}"}
+                    if spec_paths:
+                        missing = [path for path in spec_paths if not os.path.exists(path)]
+                        if missing:
+                            return {"success": False, "error": f"Spec file not found: {', '.join(missing)}"}
+                        mode = 'multi_spec'
+                        run = functools.partial(agent.run_multi_spec_execution, spec_paths, arguments.get('weights'))
+                    else:
+                        spec_paths = [arguments.get('spec_path', '.kiro/specs/ai-powered-integrations/tasks.md')]
+                        mode, run = 'spec', functools.partial(agent.run_continuous_execution, spec_paths[0])
+                if agent.running and agent.sessions.active() is None:
+                    return {"success": False, "error": "Execution is already running outside a session"}
+                try:
+                    session, started = agent.sessions.start(mode, spec_paths, run)
+                except RuntimeError as e:
+                    return {"success": False, "error": str(e), "session": agent.sessions.active().to_dict()}
+                if not started:
+                    message = f"Session {session.session_id} is already running these specs"
+                elif cluster is not None:
+                    message = f"Joined cluster {cluster.table.path} as {cluster.role}"
+                elif mode == 'multi_spec':
+                    message = f"Continuous execution started for {len(spec_paths)} specs"
+                else:
+                    message = "Continuous execution started"
+                return {
+                    "success": True,
+                    "message": message,
+                    "session_id": session.session_id,
+                    "already_running": not started,
+                    "session": session.to_dict()
+                }
+            
+            elif tool_name == "list_sessions":
+                return {"success": True, "sessions": self.agent.sessions.to_list()}
+            
+            elif tool_name == "stop_session":
+                session_id = arguments.get('session_id')
+                if not session_id:
+                    return {"success": False, "error": "session_id required"}
+                session = await self.agent.sessions.stop(session_id)
+                if session is None:
+                    return {"success": False, "error": f"Unknown session: {session_id}"}
+                return {"success": True, "message": f"Session {session_id} {session.state}", "session": session.to_dict()}
             
             elif tool_name == "stop_execution":
+                stopped = await self.agent.sessions.stop_all()
                 self.agent.stop()
-                return {"success": True, "message": "Execution stopped"}
+                return {
+                    "success": True,
+                    "message": "Execution stopped",
+                    "sessions": [session.to_dict() for session in stopped]
+                }
             
             elif tool_name == "get_status":
                 status = self.agent.get_status()
@@ -384,14 +4463,52 @@ class MCPServer:
                 if not task_id:
                     return {"success": False, "error": "task_id required"}
                 
-                success = await self.agent.execute_task(task_id)
-                return {"success": success, "message": f"Task {task_id} {'completed' if success else 'failed'}"}
+                graph, local_id = self.agent.find_task(task_id)
+                task = graph.tasks.get(local_id)
+                if task is None:
+                    return {"success": False, "error": f"Task {task_id} not found"}
+                if task.status == 'in_progress':
+                    return {"success": False, "error": f"Task {task_id} is already running"}
+                unmet = graph.scheduler.unmet_dependencies(local_id)
+                if unmet:
+                    return {"success": False, "error": f"Task {task_id} is waiting on {unmet} unfinished dependencies"}
+                # In flight while it runs, so pool workers don't see an idle graph and exit under it
+                graph.scheduler.start_direct(local_id)
+                try:
+                    success = await graph.execute_task(local_id)
+                finally:
+                    graph.scheduler.end_direct(local_id)
+                return {
+                    "success": success,
+                    "message": f"Task {task_id} {'completed' if success else 'failed'}",
+                    "output": self.agent.executor.output(graph.qualify(local_id))
+                }
+            
+            elif tool_name == "get_metrics":
+                if arguments.get('format') == 'prometheus':
+                    return {"success": True, "data": self.agent.metrics.prometheus(self.agent)}
+                return {"success": True, "data": self.agent.metrics.snapshot(self.agent)}
+            
+            elif tool_name == "subscribe_notifications":
+                if self.publisher is None:
+                    return {"success": False, "error": "Notifications are not available on this transport"}
+                if not arguments.get('enabled', True):
+                    self.publisher.unsubscribe()
+                    return {"success": True, "subscribed": False}
+                self.publisher.subscribe(arguments.get('progress_token', 'kiro-automation'), arguments.get('max_rate'))
+                return {
+                    "success": True,
+                    "subscribed": True,
+                    "progress_token": self.publisher.progress_token,
+                    "max_rate": self.publisher.max_rate,
+                    "methods": ["notifications/progress", NotificationPublisher.STATE_METHOD]
+                }
             
             elif tool_name == "connection_health_check":
                 logger.info("🔍 Connection Health Check Requested")
                 logger.info("✅ MCP Connection: ACTIVE")
                 logger.info("✅ Agent Status: READY")
-                logger.info("✅ Tools Available: 5")
+                logger.info(f"✅ Tools Available: {len(self.tools)}")
                 
                 status = self.agent.get_status()
                 return {
@@ -402,7 +4519,7 @@ class MCPServer:
                     "health_check": {
                         "mcp_connection": "✅ ACTIVE",
                         "agent_ready": "✅ READY",
-                        "tools_loaded": "✅ 5 TOOLS",
+                        "tools_loaded": f"✅ {len(self.tools)} TOOLS",
                         "workspace_path": self.agent.workspace_path,
                         "timestamp": datetime.now().isoformat()
                     },
@@ -416,84 +4533,718 @@ class MCPServer:
             logger.error(f"Error handling tool call: {e}")
             return {"success": False, "error": str(e)}
 
-async def run_mcp_server():
+class RequestDispatcher:
+    """Runs each JSON-RPC request as its own task so slow tool calls don't block the rest
+
+    Responses are handed to a single writer coroutine in completion order
+    (clients match them by id). At most max_in_flight requests are handled
+    at once; `notifications/cancelled` cancels the matching request, which
+    then gets no response. A batch (JSON array) runs its requests
+    concurrently and is answered with one array once all have finished.
+    The writer only needs write(bytes) and drain().
+    """
+
+    def __init__(self, server: 'MCPServer', writer: Any, max_in_flight: int = 16):
+        self.server = server
+        self.writer = writer
+        self.max_in_flight = max_in_flight
+        self.in_flight: Dict[Any, asyncio.Task] = {}
+        self._outbox: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def start(self):
+        self._outbox = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._writer_task = asyncio.ensure_future(self._run_writer())
+
+    def send(self, message: Any):
+        """Queue a message (dict or already-encoded bytes) for the serialized writer"""
+        self._outbox.put_nowait(message if isinstance(message, bytes) else encode_json(message))
+
+    async def _run_writer(self):
+        while True:
+            # Write everything already queued, then wait for the pipe once
+            batch = [await self._outbox.get()]
+            while not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            try:
+                self.writer.write(b'\n'.join(batch) + b'\n')
+                await self.writer.drain()
+            except Exception as e:
+                logger.error(f"Error writing response: {e}")
+            finally:
+                for _ in batch:
+                    self._outbox.task_done()
+
+    def dispatch(self, message: Any):
+        """Start handling one decoded message or batch"""
+        if isinstance(message, list):
+            if not message:
+                self.send(self._invalid_request())
+                return
+            tasks = [task for task in map(self._start, message) if task is not None]
+            if tasks:
+                # Registered like a request so close() waits for the batch reply
+                collector = asyncio.ensure_future(self._collect_batch(tasks))
+                self.in_flight[('batch', id(collector))] = collector
+                collector.add_done_callback(lambda t, key=('batch', id(collector)): self._forget(key, t))
+            return
+        task = self._start(message)
+        if task is not None:
+            task.add_done_callback(self._send_result)
+
+    def _start(self, message: Any) -> Optional[asyncio.Future]:
+        """Start one request; returns None for notifications"""
+        if not isinstance(message, dict):
+            invalid = asyncio.get_event_loop().create_future()
+            invalid.set_result(encode_json(self._invalid_request()))
+            return invalid
+        method = message.get("method")
+        if "id" not in message:
+            # Notifications never get a response
+            if method == "notifications/cancelled":
+                self.cancel(message.get("params", {}).get("requestId"))
+            return None
+        request_id = message.get("id")
+        task = asyncio.ensure_future(self._handle(message))
+        self.in_flight[request_id] = task
+        task.add_done_callback(lambda t, request_id=request_id: self._forget(request_id, t))
+        return task
+
+    @staticmethod
+    def _invalid_request() -> Dict:
+        return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}}
+
+    def _send_result(self, task: asyncio.Task):
+        if not task.cancelled():
+            self.send(task.result())
+
+    async def _collect_batch(self, tasks: List[asyncio.Task]):
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Cancelled requests are left out; an all-cancelled batch gets no reply
+        parts = [result for result in results if isinstance(result, bytes)]
+        if parts:
+            self.send(b'[' + b','.join(parts) + b']')
+
+    def _forget(self, request_id: Any, task: asyncio.Task):
+        if self.in_flight.get(request_id) is task:
+            del self.in_flight[request_id]
+
+    async def _handle(self, message: Dict) -> bytes:
+        async with self._slots:
+            return await self.server.handle_encoded(message)
+
+    def cancel(self, request_id: Any) -> bool:
+        task = self.in_flight.get(request_id)
+        if task is None:
+            return False
+        logger.info(f"Cancelling request {request_id}")
+        task.cancel()
+        return True
+
+    async def close(self):
+        """Let in-flight requests finish and flush every queued response"""
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight.values(), return_exceptions=True)
+        if self._outbox is not None:
+            await self._outbox.join()
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+
+class _BufferedStdoutWriter:
+    """StreamWriter stand-in for stdout handles the event loop cannot wrap (e.g. Windows consoles)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+
+    async def drain(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+def _feed_reader_from_thread(loop: asyncio.AbstractEventLoop, reader: asyncio.StreamReader, stream):
+    """Pump a blocking stream into a StreamReader from one long-lived thread"""
+    def pump():
+        try:
+            while True:
+                chunk = stream.read1(65536) if hasattr(stream, 'read1') else stream.readline()
+                if not chunk:
+                    break
+                loop.call_soon_threadsafe(reader.feed_data, chunk)
+        finally:
+            loop.call_soon_threadsafe(reader.feed_eof)
+    threading.Thread(target=pump, name='stdin-reader', daemon=True).start()
+
+async def open_stdio_transport(limit: int) -> Tuple[asyncio.StreamReader, Any]:
+    """Connect asyncio streams to stdin/stdout
+
+    Uses pipe transports so reads and writes happen on the event loop
+    without a thread hop per message; falls back to a single reader thread
+    and buffered blocking writes when stdio is not a pipe or socket.
+    """
+    loop = asyncio.get_event_loop()
+    reader = asyncio.StreamReader(limit=limit)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except (ValueError, NotImplementedError, OSError):
+        _feed_reader_from_thread(loop, reader, sys.stdin.buffer)
+    try:
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    except (ValueError, NotImplementedError, OSError):
+        writer = _BufferedStdoutWriter(sys.stdout.buffer)
+    return reader, writer
+
+async def run_mcp_server(config: Optional[AgentConfig] = None):
     """Run the MCP server using stdio"""
-    server = MCPServer()
+    config = config or AgentConfig.from_env()
+    server = MCPServer(KiroAutomationAgent(config))
+    
+    reader, writer = await open_stdio_transport(config.mcp_max_message_bytes)
+    dispatcher = RequestDispatcher(server, writer, config.mcp_max_in_flight)
+    dispatcher.start()
+    server.attach(dispatcher.send)
     
     logger.info("🚀 Starting Kiro Automation Agent MCP Server")
     logger.info("🔌 Waiting for MCP connection from Kiro...")
     
+    control = None
+    if config.control_socket:
+        control = ControlServer(server.agent, config.control_socket)
+        await control.start()
     try:
-        while True:
-            # Read from stdin
-            line = await asyncio.get_event_loop().run_in_executor(None, sys.stdin.readline)
-            if not line:
-                break
-                
-            line = line.strip()
-            if not line:
-                continue
-                
-            try:
-                message = json.loads(line)
-                response = await server.handle_message(message)
-                
-                # Write response to stdout
-                print(json.dumps(response), flush=True)
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON received: {e}")
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "id": None,
-                    "error": {
-                        "code": -32700,
-                        "message": "Parse error"
-                    }
-                }
-                print(json.dumps(error_response), flush=True)
-                
+        await serve_json_rpc(server, reader, dispatcher, config.mcp_max_message_bytes)
     except Exception as e:
         logger.error(f"Server error: {e}")
+    finally:
+        if control:
+            await control.close()
+    if server.agent.tracer is not None:
+        server.agent.tracer.write()
+
+async def serve_json_rpc(server: 'MCPServer', reader: asyncio.StreamReader, dispatcher: RequestDispatcher,
+                         max_message_bytes: int):
+    """Read newline-delimited JSON-RPC messages until EOF and dispatch them"""
+    while True:
+        try:
+            line = await reader.readline()
+        except ValueError:
+            logger.error(f"Message larger than {max_message_bytes} bytes dropped")
+            dispatcher.send({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Message too large"}})
+            continue
+        if not line:
+            break
+            
+        line = line.strip()
+        if not line:
+            continue
+            
+        try:
+            message = decode_json(line)
+            dispatcher.dispatch(message)
+            
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON received: {e}")
+            error_response = {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {
+                    "code": -32700,
+                    "message": "Parse error"
+                }
+            }
+            dispatcher.send(error_response)
+    
+    if server.publisher:
+        server.publisher.unsubscribe()
+    await dispatcher.close()
+
+class ControlServer:
+    """Local control channel on a Unix socket, for dashboards watching a running agent
+
+    Each connection gets its own MCPServer over the shared agent and speaks
+    the same newline-delimited JSON-RPC as stdio, so a client calls
+    get_status once and subscribe_notifications to receive state deltas.
+    Only the READ_ONLY_TOOLS are offered: nothing on the socket can start,
+    stop or run tasks, and the socket file is only accessible to its owner.
+    A socket file left behind by a dead agent is replaced; one that still
+    answers belongs to another agent and is left alone.
+    """
+
+    READ_ONLY_TOOLS = ('get_status', 'get_metrics', 'subscribe_notifications', 'list_sessions')
+
+    def __init__(self, agent: 'KiroAutomationAgent', path: str):
+        self.agent = agent
+        self.path = path
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def start(self) -> bool:
+        if not hasattr(socket, 'AF_UNIX'):
+            logger.info("Control socket not supported on this platform")
+            return False
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.path):
+                if await self._in_use():
+                    logger.warning(f"Control socket {self.path} belongs to another running agent; not listening")
+                    return False
+                os.remove(self.path)
+            self._server = await asyncio.start_unix_server(
+                self._serve, self.path, limit=self.agent.config.mcp_max_message_bytes
+            )
+            os.chmod(self.path, 0o600)
+        except OSError as e:
+            logger.error(f"Could not open control socket {self.path}: {e}")
+            return False
+        logger.info(f"📡 Control socket listening on {self.path}")
+        return True
+
+    async def _in_use(self) -> bool:
+        try:
+            _, writer = await asyncio.open_unix_connection(self.path)
+        except OSError:
+            return False
+        writer.close()
+        return True
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        server = MCPServer(self.agent, self.READ_ONLY_TOOLS)
+        dispatcher = RequestDispatcher(server, writer, self.agent.config.mcp_max_in_flight)
+        dispatcher.start()
+        server.attach(dispatcher.send)
+        try:
+            await serve_json_rpc(server, reader, dispatcher, self.agent.config.mcp_max_message_bytes)
+        except ConnectionError:
+            server.publisher.unsubscribe()
+            await dispatcher.close()
+        finally:
+            del self._clients[task]
+            writer.close()
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # Closing a client's transport ends its read loop, which then shuts its dispatcher down
+        for writer in self._clients.values():
+            writer.close()
+        if self._clients:
+            await asyncio.wait(list(self._clients), timeout=5)
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
 
 # Main execution
+def self_test_config(**overrides) -> AgentConfig:
+    """Configuration for a self-test: nothing persisted or shared outside its scratch directory
+
+    Checkbox write-back is off unless a check asks for it, since a pending
+    flush would otherwise fire after the scratch directory is gone.
+    """
+    settings = dict(history_path=None, cache_dir=None, journal_dir=None, control_socket=None, watch_spec=False,
+                    write_back=False, flush_interval=0.0)
+    settings.update(overrides)
+    return AgentConfig(**settings)
+
+def write_self_test_spec(workdir: str, body: str) -> str:
+    spec_path = os.path.join(workdir, 'tasks.md')
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        f.write(textwrap.dedent(body))
+    return spec_path
+
+async def self_test_simulated_run_leaves_spec_unticked(workdir: str):
+    """A simulated run completes tasks without ticking them in the spec"""
+    spec_path = write_self_test_spec(workdir, """\
+        # Tasks
+        - [ ] 1. First
+        - [ ] 2. Second
+    """)
+    agent = KiroAutomationAgent(self_test_config(executor='simulated', write_back=True, workers=2,
+                                                 journal_dir=os.path.join(workdir, 'journal')))
+    agent.executor = SimulatedExecutor(delay=0)
+    await agent.run_continuous_execution(spec_path)
+    assert agent.status_counts()['completed'] == 2, agent.status_counts()
+    with open(spec_path, encoding='utf-8') as f:
+        assert '[x]' not in f.read(), "simulated completions were written to the spec"
+    assert not os.path.exists(os.path.join(workdir, 'journal')), "simulated completions were journaled"
+
+async def self_test_task_without_command_fails(workdir: str):
+    """A task without a command fails at once instead of being ticked; unlabeled and console fences don't run"""
+    spec_path = write_self_test_spec(workdir, """\
+        # Tasks
+        - [ ] 1. Write the release notes
+          ```
+          touch ran.txt
+          ```
+        - [ ] 2. Build
+          - cmd: `true`
+        - [ ] 3. Show the usage
+          ```console
+          $ touch ran.txt
+          ```
+    """)
+    agent = KiroAutomationAgent(self_test_config(write_back=True, max_attempts=3))
+    agent.executor = SubprocessExecutor(workdir)
+    await agent.run_continuous_execution(spec_path)
+    notes, build, usage = sorted(agent.tasks.values(), key=lambda task: task.line_number)
+    assert notes.command is None and usage.command is None, (notes.command, usage.command)
+    assert (notes.status, notes.attempts) == ('failed', 0), (notes.status, notes.attempts)
+    assert build.status == 'completed', build.status
+    assert not os.path.exists(os.path.join(workdir, 'ran.txt')), "the unlabeled fence was run"
+    with open(spec_path, encoding='utf-8') as f:
+        assert f.read().count('[x]') == 1, "only the task that ran should be ticked"
+
+async def self_test_status_tracks_transitions(workdir: str):
+    """Remaining work and the critical path follow each transition without a rescan"""
+    spec_path = write_self_test_spec(workdir, """\
+        # Tasks
+        - [ ] 1. Backend
+          - [ ] 1.1 Schema
+          - [ ] 1.2 Models
+        - [ ] 2. Frontend
+          - [ ] 2.1 Pages
+        - [x] 3. Docs
+    """)
+    for task_store in TASK_STORES:
+        agent = KiroAutomationAgent(self_test_config(task_store=task_store, schedule='critical_path'))
+        await agent.load_tasks_from_spec(spec_path)
+        scheduler = agent.scheduler
+        scheduler.rebuild()
+        scheduler.CRITICAL_PATH_REFRESH = 0.0
+
+        def check(step: str):
+            fresh = TaskScheduler(agent.tasks, scheduler.mode)
+            fresh.rebuild()
+            assert scheduler.remaining_work() == fresh.remaining_work(), (task_store, step)
+            assert scheduler.critical_path() == fresh.critical_path(), (task_store, step)
+
+        check('loaded')
+        finished = []
+        while True:
+            task_id = scheduler.pop_ready()
+            if task_id is None:
+                break
+            agent._set_status(agent.tasks[task_id], 'completed')
+            scheduler.task_finished(task_id, True)
+            finished.append(task_id)
+            check(f"finished {task_id}")
+        assert scheduler.remaining_work() == 0.0, (task_store, scheduler.remaining_work())
+        agent._set_status(agent.tasks[finished[0]], 'not_started')
+        check(f"reopened {finished[0]}")
+
+async def self_test_expiring_lease_gives_up(workdir: str):
+    """A task whose lease keeps expiring is failed once it is out of attempts"""
+    spec_path = write_self_test_spec(workdir, """\
+        # Tasks
+        - [ ] 1. Hangs
+          - cmd: `sleep 3600`
+    """)
+    table = LeaseTable(os.path.join(workdir, 'cluster.db'), lease_seconds=0.01)
+    try:
+        table.publish('tasks', list(iter_spec_tasks(spec_path)))
+        retry_policy = RetryPolicy(max_attempts=3)
+        for attempt in range(retry_policy.max_attempts):
+            claimed = table.claim(f"host:{attempt}", retry_policy)
+            assert claimed is not None and claimed['attempts'] == attempt, claimed
+            time.sleep(0.02)  # the owner never renews
+        assert table.claim('host:last', retry_policy) is None, "an exhausted task was handed out again"
+        _, changes = table.changes_since(0)
+        assert (changes[-1]['status'], changes[-1]['attempts']) == ('failed', 3), changes[-1]
+        assert not table.has_pending(), "the failed task still counts as pending"
+        assert table.status()['reclaimed_leases'] == 3, table.status()
+    finally:
+        table.close()
+
+async def self_test_control_socket_is_read_only(workdir: str):
+    """The control socket is private to its owner and only offers read-only tools"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return
+    path = os.path.join(workdir, 'agent.sock')
+    control = ControlServer(KiroAutomationAgent(self_test_config()), path)
+    assert await control.start(), "control socket did not start"
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600, oct(os.stat(path).st_mode)
+        reader, writer = await asyncio.open_unix_connection(path)
+        calls = [
+            {"jsonrpc": "2.0", "id": 1, "method": "tools/list"},
+            {"jsonrpc": "2.0", "id": 2, "method": "tools/call",
+             "params": {"name": "execute_single_task", "arguments": {"task_id": "x"}}},
+        ]
+        responses = {}
+        for call in calls:
+            writer.write(encode_json(call) + b'\n')
+            await writer.drain()
+            response = decode_json(await asyncio.wait_for(reader.readline(), 5))
+            responses[response['id']] = response['result']
+        writer.close()
+        listed = {tool['name'] for tool in responses[1]['tools']}
+        assert listed == set(ControlServer.READ_ONLY_TOOLS), listed
+        refused = decode_json(responses[2]['content'][0]['text'])
+        assert refused == {"success": False, "error": "Unknown tool: execute_single_task"}, refused
+    finally:
+        await control.close()
+
+async def self_test_single_task_respects_the_graph(workdir: str):
+    """execute_single_task refuses running or blocked tasks and keeps the pool from going idle"""
+    spec_path = write_self_test_spec(workdir, """\
+        # Tasks
+        - [ ] 1. Deploy
+          - cmd: `echo deployed`
+          - [ ] 1.1 Build
+            - cmd: `sh -c "sleep 0.2; echo built"`
+    """)
+    server = MCPServer(KiroAutomationAgent(self_test_config()))
+    agent = server.agent
+    agent.executor = SubprocessExecutor(workdir)
+    await agent.load_tasks_from_spec(spec_path)
+    agent.scheduler.rebuild()
+    deploy, build = sorted(agent.tasks.values(), key=lambda task: task.line_number)
+
+    blocked = await server.handle_tool_call('execute_single_task', {'task_id': deploy.id})
+    assert blocked == {"success": False, "error": f"Task {deploy.id} is waiting on 1 unfinished dependencies"}, blocked
+    assert agent.scheduler.pop_ready() == build.id
+    running = await server.handle_tool_call('execute_single_task', {'task_id': build.id})
+    assert running == {"success": False, "error": f"Task {build.id} is already running"}, running
+    agent._set_status(build, 'not_started')
+    agent.scheduler.task_finished(build.id, False)
+
+    direct = asyncio.ensure_future(server.handle_tool_call('execute_single_task', {'task_id': build.id}))
+    await asyncio.sleep(0.1)
+    assert not agent.scheduler.is_idle(), "a direct run left the scheduler idle"
+    result = await direct
+    assert result['success'] and result['output'] == ['stdout: built'], result
+    assert agent.scheduler.unmet_dependencies(deploy.id) == 0
+
+async def self_test_cluster_breaker_pauses_claims(workdir: str):
+    """A failure storm in cluster mode pauses claiming and hands running tasks back"""
+    failing = ''.join(f"- [ ] {n}. Broken {n}\n  - cmd: `false`\n" for n in range(2, 7))
+    spec_path = write_self_test_spec(workdir, "# Tasks\n- [ ] 1. Slow\n"
+                                              "  - cmd: `sh -c \"echo run >> runs.txt; sleep 1\"`\n" + failing)
+    agent = KiroAutomationAgent(self_test_config(
+        cluster_role='coordinator', cluster_db=os.path.join(workdir, 'cluster.db'), cluster_poll_interval=0.05,
+        workers=2, max_attempts=1, breaker_window=5, breaker_cooldown=0.2
+    ))
+    agent.executor = SubprocessExecutor(workdir)
+    try:
+        await agent.cluster.run(spec_path)
+    finally:
+        agent.cluster.table.close()
+    assert agent.breaker.trips == 1, agent.breaker.trips
+    with open(os.path.join(workdir, 'runs.txt'), encoding='utf-8') as f:
+        assert f.read().count('run') == 2, "the running task was not handed back and run again"
+    slow = next(task for task in agent.tasks.values() if task.name == '1. Slow')
+    assert (slow.status, slow.attempts) == ('completed', 0), (slow.status, slow.attempts)
+
+async def self_test_timeout_kills_orphaned_children(workdir: str):
+    """A timed-out command's children are killed even after the command itself has exited"""
+    if not hasattr(os, 'killpg'):
+        return
+    spec_path = write_self_test_spec(workdir, """\
+        # Tasks
+        - [ ] 1. Start a server
+          - cmd: `sh -c "sleep 30 & echo $! > child.pid"`
+    """)
+    task = next(iter_spec_tasks(spec_path))
+    assert not await SubprocessExecutor(workdir, timeout=0.5).run(task), "the command should have timed out"
+    with open(os.path.join(workdir, 'child.pid'), encoding='utf-8') as f:
+        pid = int(f.read())
+    await asyncio.sleep(0.1)
+    try:
+        with open(f"/proc/{pid}/stat", encoding='utf-8') as f:
+            state = f.read().rpartition(')')[2].split()[0]
+    except FileNotFoundError:
+        state = None
+    assert state in (None, 'Z', 'X'), f"child {pid} is still running (state {state})"
+
+async def self_test_release_keeps_other_specs(workdir: str):
+    """Releasing one spec's leases leaves the owner's leases in other specs alone"""
+    spec_path = write_self_test_spec(workdir, """\
+        # Tasks
+        - [ ] 1. Build
+          - cmd: `true`
+    """)
+    table = LeaseTable(os.path.join(workdir, 'cluster.db'))
+    try:
+        tasks = list(iter_spec_tasks(spec_path))
+        table.publish('api', tasks)
+        table.publish('web', tasks)
+        retry_policy = RetryPolicy()
+        claimed = {table.claim('host:1', retry_policy)['spec'] for _ in range(2)}
+        assert claimed == {'api', 'web'}, claimed
+        assert table.release('host:1', 'api') == 1
+        assert table.status()['specs']['web']['in_progress'] == 1, table.status()['specs']
+        assert table.release('host:1') == 1
+    finally:
+        table.close()
+
+SELF_TESTS: List[Callable[[str], Awaitable[None]]] = [
+    self_test_simulated_run_leaves_spec_unticked,
+    self_test_task_without_command_fails,
+    self_test_status_tracks_transitions,
+    self_test_expiring_lease_gives_up,
+    self_test_control_socket_is_read_only,
+    self_test_single_task_respects_the_graph,
+    self_test_cluster_breaker_pauses_claims,
+    self_test_timeout_kills_orphaned_children,
+    self_test_release_keeps_other_specs,
+]
+
+async def run_self_tests() -> bool:
+    """Run every SELF_TESTS check in its own scratch directory; True if all pass"""
+    passed = True
+    for check in SELF_TESTS:
+        with tempfile.TemporaryDirectory(prefix='kiro-self-test-') as workdir:
+            try:
+                await check(workdir)
+                logger.info(f"✅ {check.__doc__}")
+            except Exception as e:
+                passed = False
+                logger.error(f"❌ {check.__doc__}: {e!r}")
+    return passed
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Kiro Automation Agent - Continuous Task Execution MCP Server")
+    parser.add_argument('--standalone', action='store_true', help='Run the spec continuously without MCP (for testing)')
+    parser.add_argument('--test', action='store_true', help='Run a quick self-test and exit')
+    parser.add_argument('--workers', type=int, help='Number of tasks executed concurrently (env: KIRO_AGENT_WORKERS, default 1)')
+    parser.add_argument('--schedule', choices=TaskScheduler.MODES,
+                        help='Dispatch order: task priority or longest remaining path first (env: KIRO_AGENT_SCHEDULE)')
+    parser.add_argument('--executor', choices=EXECUTORS,
+                        help='Run task commands as child processes or simulate every task (env: KIRO_AGENT_EXECUTOR)')
+    parser.add_argument('--task-store', choices=TASK_STORES,
+                        help='Keep tasks as objects or in compact columns for very large specs (env: KIRO_AGENT_TASK_STORE)')
+    parser.add_argument('--spec', action='append', metavar='PATH',
+                        help=f'Spec file to run in standalone mode (repeat to run several; default {DEFAULT_SPEC_PATH})')
+    parser.add_argument('--all-specs', action='store_true',
+                        help=f'Run every {DEFAULT_SPECS_DIR}/*/tasks.md in standalone mode')
+    parser.add_argument('--weights', metavar='NAME=W,...',
+                        help='Fair-share weight per spec when several run (env: KIRO_AGENT_SPEC_WEIGHTS)')
+    parser.add_argument('--cluster', choices=CLUSTER_ROLES,
+                        help='Share tasks with other agent processes through a lease table (env: KIRO_AGENT_CLUSTER_ROLE)')
+    parser.add_argument('--cluster-db', metavar='PATH',
+                        help=f'SQLite lease table of the cluster (env: KIRO_AGENT_CLUSTER_DB, default {DEFAULT_CLUSTER_DB})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Run every task even when its inputs are unchanged (env: KIRO_AGENT_CACHE_DIR=)')
+    parser.add_argument('--no-watch', action='store_true', help='Do not reload the spec when it changes (env: KIRO_AGENT_WATCH=0)')
+    parser.add_argument('--control-socket', nargs='?', const=DEFAULT_CONTROL_SOCKET, metavar='PATH',
+                        help=f'Serve read-only status on a local Unix socket at PATH (default {DEFAULT_CONTROL_SOCKET}, '
+                             f'env: KIRO_AGENT_CONTROL_SOCKET)')
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_DIR, metavar='DIR',
+                        help=f'Write a Chrome trace of task runs and MCP requests to DIR (default {DEFAULT_PROFILE_DIR}, '
+                             f'env: KIRO_AGENT_PROFILE_DIR)')
+    return parser.parse_args(argv)
+
+def build_config(args: argparse.Namespace) -> AgentConfig:
+    """Build the agent configuration from the environment and CLI overrides"""
+    config = AgentConfig.from_env()
+    if args.workers is not None:
+        config.workers = max(1, args.workers)
+    if args.schedule:
+        config.schedule = args.schedule
+    if args.executor:
+        config.executor = args.executor
+    if args.task_store:
+        config.task_store = args.task_store
+    if args.weights:
+        config.spec_weights.update(parse_spec_weights(args.weights))
+    if args.cluster:
+        config.cluster_role = args.cluster
+    if args.cluster_db:
+        config.cluster_db = args.cluster_db
+    if args.no_cache:
+        config.cache_dir = None
+    if args.no_watch:
+        config.watch_spec = False
+    if args.control_socket:
+        config.control_socket = args.control_socket
+    if args.profile:
+        config.profile_dir = args.profile
+    return config
+
 async def main():
     """Main function to run the MCP server or standalone mode"""
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "--standalone":
-            # Standalone mode for testing
-            server = MCPServer()
-            spec_path = ".kiro/specs/ai-powered-integrations/tasks.md"
-            
-            if os.path.exists(spec_path):
-                logger.info(f"Starting automation agent in standalone mode with spec: {spec_path}")
-                await server.agent.run_continuous_execution(spec_path)
-            else:
-                logger.error(f"Spec file not found: {spec_path}")
-                logger.info("Please provide the correct path to your tasks.md file")
+    args = parse_args()
+    config = build_config(args)
+    
+    if args.standalone:
+        # Standalone mode for testing
+        server = MCPServer(KiroAutomationAgent(config))
+        cluster = server.agent.cluster
+        spec_paths = discover_specs() if args.all_specs else (args.spec or [DEFAULT_SPEC_PATH])
+        if cluster is not None and cluster.role == 'worker':
+            spec_paths = []  # workers take their tasks from the cluster's lease table
+        missing = [path for path in spec_paths if not os.path.exists(path)]
         
-        elif sys.argv[1] == "--test":
-            # Test mode
-            logger.info("🧪 Testing Kiro Automation Agent...")
-            server = MCPServer()
-            
-            # Test basic functionality
-            status = server.agent.get_status()
-            logger.info(f"✅ Agent status: {status}")
-            
-            # Test task loading
-            spec_path = ".kiro/specs/ai-powered-integrations/tasks.md"
-            if os.path.exists(spec_path):
-                tasks = await server.agent.load_tasks_from_spec(spec_path)
-                logger.info(f"✅ Loaded {len(tasks)} tasks from spec")
+        if cluster is not None and len(spec_paths) > 1:
+            logger.error("A cluster coordinator runs a single spec; start one coordinator per spec")
+        elif (spec_paths or cluster is not None) and not missing:
+            if spec_paths:
+                logger.info(f"Starting automation agent in standalone mode with spec: {', '.join(spec_paths)}")
+            control = None
+            if config.control_socket:
+                control = ControlServer(server.agent, config.control_socket)
+                await control.start()
+            # Run as a session so dashboards on the control socket can list and stop it
+            if cluster is not None:
+                mode, run = 'cluster', functools.partial(cluster.run, spec_paths[0] if spec_paths else None)
+            elif len(spec_paths) > 1:
+                mode, run = 'multi_spec', functools.partial(server.agent.run_multi_spec_execution, spec_paths)
             else:
-                logger.warning(f"⚠️  Spec file not found: {spec_path}")
-            
-            logger.info("🎉 Test completed successfully!")
-            return
+                mode, run = 'spec', functools.partial(server.agent.run_continuous_execution, spec_paths[0])
+            session, _ = server.agent.sessions.start(mode, spec_paths, run)
+            try:
+                await asyncio.wait({session.task})
+                if session.state == 'failed':
+                    session.task.result()
+            finally:
+                if control:
+                    await control.close()
+        else:
+            logger.error(f"Spec file not found: {', '.join(missing) or DEFAULT_SPECS_DIR + '/*/tasks.md'}")
+            logger.info("Please provide the correct path to your tasks.md file")
+    
+    elif args.test:
+        # Test mode
+        logger.info("🧪 Testing Kiro Automation Agent...")
+        # Read-only: no journal, checkbox write-back, history or cache for the real spec
+        server = MCPServer(KiroAutomationAgent(self_test_config()))
+        
+        # Test basic functionality
+        status = server.agent.get_status()
+        logger.info(f"✅ Agent status: {status}")
+        
+        # Test task loading
+        spec_path = DEFAULT_SPEC_PATH
+        if os.path.exists(spec_path):
+            tasks = await server.agent.load_tasks_from_spec(spec_path)
+            logger.info(f"✅ Loaded {len(tasks)} tasks from spec")
+        else:
+            logger.warning(f"⚠️  Spec file not found: {spec_path}")
+        
+        if not await run_self_tests():
+            logger.error("❌ Self-test failed")
+            sys.exit(1)
+        logger.info("🎉 Test completed successfully!")
+        return
     else:
         # MCP server mode
-        await run_mcp_server()
+        await run_mcp_server(config)
 
 if __name__ == "__main__":
     try:
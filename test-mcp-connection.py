@@ -1,95 +1,425 @@
 #!/usr/bin/env python3
 """
 Test MCP Connection for Kiro Automation Agent
+Smoke test and JSON-RPC load generator with per-method latency percentiles
 """
 
+import argparse
+import asyncio
+import importlib.util
+import itertools
 import json
-import subprocess
+import logging
+import os
+import random
 import sys
 import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 
-def test_mcp_connection():
-    """Test the MCP connection by sending a health check"""
-    
-    print("🧪 Testing Kiro Automation Agent MCP Connection")
-    print("=" * 50)
-    
-    # Test message for health check
-    test_message = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "tools/call",
-        "params": {
-            "name": "connection_health_check",
-            "arguments": {}
+AGENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kiro-automation-agent.py")
+PROTOCOL_VERSION = "2024-11-05"
+DEFAULT_MIX = "get_status=6,connection_health_check=2,get_metrics=1,tools/list=1"
+METHODS = ("initialize", "tools/list")  # mix entries sent as-is; any other name is a tools/call
+
+class JsonRpcConnection:
+    """Client side of one MCP connection, matching responses to requests by id
+
+    Many concurrent callers can share the connection; each request gets its
+    own id and waits on a future that the reader resolves.
+    """
+
+    def __init__(self):
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.notifications = 0
+        self.unmatched = 0
+        self._ids = itertools.count(1)
+
+    async def start(self) -> float:
+        """Bring the agent up and initialize; returns seconds until the initialize response"""
+        started = time.perf_counter()
+        await self._open()
+        response, _ = await self.request("initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "kiro-load-test", "version": "1.0.0"}
+        })
+        if "result" not in response:
+            raise RuntimeError(f"initialize failed: {response.get('error')}")
+        return time.perf_counter() - started
+
+    async def request(self, method: str, params: Optional[Dict] = None,
+                      timeout: float = 30.0) -> Tuple[Dict, float]:
+        """Send one request and wait for its response; returns (response, seconds)"""
+        request_id = next(self._ids)
+        future = asyncio.get_event_loop().create_future()
+        self.pending[request_id] = future
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        started = time.perf_counter()
+        try:
+            await self._send(json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n')
+            response = await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+        return response, time.perf_counter() - started
+
+    def _receive(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+        except ValueError:
+            self.unmatched += 1
+            return
+        for item in message if isinstance(message, list) else [message]:
+            if not isinstance(item, dict):
+                self.unmatched += 1
+            elif "id" not in item:
+                self.notifications += 1
+            else:
+                future = self.pending.get(item["id"])
+                if future is None or future.done():
+                    self.unmatched += 1
+                else:
+                    future.set_result(item)
+
+    def _fail_pending(self, error: Exception):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _open(self):
+        raise NotImplementedError
+
+    async def _send(self, data: bytes):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class SubprocessConnection(JsonRpcConnection):
+    """Runs the agent as a child process and talks to it over stdin/stdout pipes"""
+
+    def __init__(self, agent_script: str = AGENT_SCRIPT, verbose: bool = False):
+        super().__init__()
+        self.agent_script = agent_script
+        self.verbose = verbose
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def _open(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, self.agent_script,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=None if self.verbose else asyncio.subprocess.DEVNULL,
+            limit=64 * 1024 * 1024
+        )
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                self._fail_pending(ConnectionError("agent closed its stdout"))
+                return
+            self._receive(line)
+
+    async def _send(self, data: bytes):
+        self.process.stdin.write(data)
+        await self.process.stdin.drain()
+
+    async def close(self):
+        if self.process is None:
+            return
+        # EOF on stdin makes the agent finish its in-flight requests and exit
+        if not self.process.stdin.is_closing():
+            self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 10)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        if self._reader is not None:
+            self._reader.cancel()
+
+class _LoopbackWriter:
+    """Stands in for stdout: hands each response line straight back to the client"""
+
+    def __init__(self, connection: JsonRpcConnection):
+        self.connection = connection
+
+    def write(self, data: bytes):
+        for line in data.split(b'\n'):
+            self.connection._receive(line)
+
+    async def drain(self):
+        pass
+
+class LoopbackConnection(JsonRpcConnection):
+    """Runs the MCP server in this process, without pipes or JSON-over-stdio framing costs
+
+    Requests still go through decode_json and the RequestDispatcher, so
+    concurrency limits and response encoding are the same as over stdio.
+    """
+
+    def __init__(self, agent_script: str = AGENT_SCRIPT):
+        super().__init__()
+        self.agent_script = agent_script
+        self.module = None
+        self.dispatcher = None
+
+    async def _open(self):
+        spec = importlib.util.spec_from_file_location("kiro_automation_agent", self.agent_script)
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+        config = self.module.AgentConfig.from_env()
+        server = self.module.MCPServer(self.module.KiroAutomationAgent(config))
+        self.dispatcher = self.module.RequestDispatcher(server, _LoopbackWriter(self), config.mcp_max_in_flight)
+        self.dispatcher.start()
+        server.attach(self.dispatcher.send)
+
+    async def _send(self, data: bytes):
+        self.dispatcher.dispatch(self.module.decode_json(data))
+
+    async def close(self):
+        if self.dispatcher is not None:
+            await self.dispatcher.close()
+
+def open_connection(args: argparse.Namespace) -> JsonRpcConnection:
+    if args.transport == 'loopback':
+        return LoopbackConnection(args.agent)
+    return SubprocessConnection(args.agent, args.verbose)
+
+def parse_mix(text: str) -> List[Tuple[str, float]]:
+    """Parse 'name=weight,...' into (name, weight) pairs"""
+    mix = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition('=')
+        mix.append((name.strip(), float(weight) if weight else 1.0))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError(f"Empty request mix: {text!r}")
+    return mix
+
+def build_request(name: str) -> Tuple[str, Optional[Dict]]:
+    """(method, params) for one mix entry"""
+    if name in METHODS:
+        return name, {} if name == "tools/list" else {
+            "protocolVersion": PROTOCOL_VERSION, "capabilities": {},
+            "clientInfo": {"name": "kiro-load-test", "version": "1.0.0"}
         }
+    return "tools/call", {"name": name, "arguments": {}}
+
+def is_error(response: Dict) -> bool:
+    """JSON-RPC errors and tool results reporting success: false"""
+    if "error" in response:
+        return True
+    for item in response.get("result", {}).get("content", ()):
+        text = item.get("text", "")
+        if '"success": false' in text or '"success":false' in text:
+            return True
+    return False
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), int(-(-q * len(sorted_values) // 1))))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    ms = lambda v: v * 1000 if v is not None else None
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'throughput_per_second': len(values) / elapsed if elapsed else None,
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'p50_ms': ms(percentile(values, 0.50)),
+        'p95_ms': ms(percentile(values, 0.95)),
+        'p99_ms': ms(percentile(values, 0.99)),
+        'max_ms': ms(values[-1]) if values else None
+    }
+
+async def run_load(connection: JsonRpcConnection, mix: List[Tuple[str, float]], clients: int,
+                   total: int, duration: Optional[float], timeout: float, seed: int) -> Dict[str, Any]:
+    """Drive the connection with clients concurrent callers issuing requests from the mix"""
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    timeouts: Counter = Counter()
+    remaining = total
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def client(client_id: int):
+        nonlocal remaining
+        rng = random.Random(seed + client_id)
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            elif remaining <= 0:
+                return
+            else:
+                remaining -= 1
+            name = rng.choices(names, weights)[0]
+            method, params = build_request(name)
+            try:
+                response, latency = await connection.request(method, params, timeout)
+            except asyncio.TimeoutError:
+                timeouts[name] += 1
+                errors[name] += 1
+                continue
+            latencies[name].append(latency)
+            if is_error(response):
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        'clients': clients,
+        'elapsed_seconds': elapsed,
+        'overall': summarize(everything, sum(errors.values()), elapsed),
+        'methods': {name: dict(summarize(latencies[name], errors[name], elapsed), timeouts=timeouts[name])
+                    for name in names if latencies[name] or errors[name]},
+        'notifications_received': connection.notifications,
+        'unmatched_responses': connection.unmatched
     }
-    
+
+async def measure_cold_starts(args: argparse.Namespace) -> List[float]:
+    """Start the agent args.cold_starts times, timing each until its initialize response"""
+    samples = []
+    for _ in range(args.cold_starts):
+        connection = open_connection(args)
+        try:
+            samples.append(await connection.start())
+        finally:
+            await connection.close()
+    return samples
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value:8.2f}" if value is not None else "       -"
+
+def print_report(report: Dict[str, Any]):
+    cold = report['cold_start']
+    print(f"🚀 Cold start to first initialize response ({report['transport']}): "
+          f"p50 {cold['p50_ms']:.1f} ms, max {cold['max_ms']:.1f} ms over {cold['samples']} start(s)")
+    load = report['load']
+    overall = load['overall']
+    print(f"📊 {overall['requests']} requests from {load['clients']} clients in {load['elapsed_seconds']:.2f}s "
+          f"= {overall['throughput_per_second']:.0f} req/s, {overall['errors']} error(s)")
+    print()
+    print(f"{'method':<34}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    print("-" * 95)
+    for name, stats in list(load['methods'].items()) + [('(all)', overall)]:
+        print(f"{name:<34}{stats['requests']:>8}{stats['errors']:>8}{stats['throughput_per_second'] or 0:>9.0f}"
+              f"{format_ms(stats['p50_ms'])} {format_ms(stats['p95_ms'])} {format_ms(stats['p99_ms'])} "
+              f"{format_ms(stats['max_ms'])}")
+
+async def load_test(args: argparse.Namespace) -> int:
+    mix = parse_mix(args.mix)
+    cold_starts = await measure_cold_starts(args)
+    connection = open_connection(args)
     try:
-        # Start the MCP server process
-        print("🚀 Starting MCP server...")
-        process = subprocess.Popen(
-            [sys.executable, "kiro-automation-agent.py"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        # Send initialization message first
-        init_message = {
-            "jsonrpc": "2.0",
-            "id": 0,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {
-                    "name": "test-client",
-                    "version": "1.0.0"
-                }
-            }
-        }
-        
-        print("📡 Sending initialization message...")
-        process.stdin.write(json.dumps(init_message) + "\\n")
-        process.stdin.flush()
-        
-        # Wait a moment
-        time.sleep(1)
-        
-        # Send health check
+        await connection.start()
+        load = await run_load(connection, mix, args.clients, args.requests, args.duration, args.timeout, args.seed)
+    finally:
+        await connection.close()
+
+    cold_sorted = sorted(cold_starts)
+    report = {
+        'version': 1,
+        'transport': args.transport,
+        'mix': dict(mix),
+        'cold_start': {
+            'samples': len(cold_sorted),
+            'p50_ms': percentile(cold_sorted, 0.5) * 1000,
+            'max_ms': cold_sorted[-1] * 1000
+        },
+        'load': load
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results written to {args.json}")
+    return 1 if load['overall']['errors'] else 0
+
+async def smoke_test(args: argparse.Namespace) -> int:
+    """Start the agent, initialize, list tools and run the health check"""
+    print("🧪 Testing Kiro Automation Agent MCP Connection")
+    print("=" * 50)
+    connection = open_connection(args)
+    try:
+        print(f"🚀 Starting MCP server ({args.transport})...")
+        cold_start = await connection.start()
+        print(f"✅ Initialized in {cold_start * 1000:.1f} ms")
+
+        response, latency = await connection.request("tools/list", {}, args.timeout)
+        tools = [tool["name"] for tool in response.get("result", {}).get("tools", [])]
+        print(f"✅ {len(tools)} tools listed in {latency * 1000:.1f} ms: {', '.join(tools)}")
+
         print("🔍 Sending health check...")
-        process.stdin.write(json.dumps(test_message) + "\\n")
-        process.stdin.flush()
-        
-        # Wait for response
-        time.sleep(2)
-        
-        # Read response
-        try:
-            output, error = process.communicate(timeout=5)
-            
-            if output:
-                print("✅ Response received:")
-                print(output)
-            
-            if error:
-                print("📋 Server logs:")
-                print(error)
-                
-        except subprocess.TimeoutExpired:
-            print("⏰ Timeout waiting for response")
-            process.kill()
-            
+        response, latency = await connection.request(
+            "tools/call", {"name": "connection_health_check", "arguments": {}}, args.timeout
+        )
+        if is_error(response):
+            print(f"❌ Health check failed in {latency * 1000:.1f} ms:")
+            print(json.dumps(response, indent=2))
+            return 1
+        print(f"✅ Health check answered in {latency * 1000:.1f} ms")
+        if args.verbose:
+            print(response["result"]["content"][0]["text"])
     except Exception as e:
-        print(f"❌ Error testing connection: {e}")
-    
-    print("\\n🎯 Test completed!")
-    print("\\nTo use with Kiro:")
+        print(f"❌ Error testing connection: {e!r}")
+        return 1
+    finally:
+        await connection.close()
+
+    print("\n🎯 Test completed!")
+    print("\nTo use with Kiro:")
     print("1. Make sure the MCP server is configured in .kiro/settings/mcp.json")
     print("2. Restart Kiro to load the MCP server")
     print("3. Use the 'connection_health_check' tool to verify connection")
+    return 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Smoke-test or load-test the Kiro Automation Agent over MCP")
+    parser.add_argument('--load', action='store_true', help='Run the load test instead of the smoke test')
+    parser.add_argument('--transport', choices=('subprocess', 'loopback'), default='subprocess',
+                        help='Agent as a child process over pipes, or in this process (default subprocess)')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients (default 8)')
+    parser.add_argument('--requests', type=int, default=2000, help='Total requests to send (default 2000)')
+    parser.add_argument('--duration', type=float, help='Send requests for this many seconds instead of --requests')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f'Weighted tools (or tools/list, initialize) to call (default {DEFAULT_MIX})')
+    parser.add_argument('--cold-starts', type=int, default=3,
+                        help='Agent starts timed until the first initialize response (default 3)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Seconds to wait for each response (default 30)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the request mix')
+    parser.add_argument('--json', help='Also write the load test results as JSON to this file')
+    parser.add_argument('--agent', default=AGENT_SCRIPT, help='Agent script to start')
+    parser.add_argument('--verbose', action='store_true', help="Show the agent's logs")
+    args = parser.parse_args(argv)
+    args.clients = max(1, args.clients)
+    args.cold_starts = max(1, args.cold_starts)
+    return args
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.transport == 'loopback' and not args.verbose:
+        logging.disable(logging.INFO)
+    return asyncio.run(load_test(args) if args.load else smoke_test(args))
 
 if __name__ == "__main__":
-    test_mcp_connection()
\ No newline at end of file
+    sys.exit(main())